@@ -1,7 +1,24 @@
 
 from functools import wraps
-from flask import request, jsonify
+from flask import g, request, jsonify
 from app.models.user import user_manager
+from app.security.audit_log import audit_logger
+from app.security.rate_limiting import rate_limiter
+from app.utils.tracing import span
+
+def _unauthorized(message):
+    """401 for a failed authentication. Failures count against the IP's
+    ``api`` limit, so guessing keys ends in 429s like any other flood."""
+    with span('rate_limit'):
+        state = rate_limiter.check(request.remote_addr, 'api')
+        g.rate_limit_headers = rate_limiter.headers(state)
+    if not state.allowed:
+        audit_logger.log_security_violation('RATE_LIMIT_EXCEEDED', {
+            'ip': request.remote_addr,
+            'endpoint': request.endpoint
+        })
+        return rate_limiter.rejection(state)
+    return jsonify({'error': message, 'status': 'unauthorized'}), 401
 
 def require_api_auth(f):
     """Decorator to require API authentication"""
@@ -12,18 +29,13 @@ def require_api_auth(f):
         api_token = request.headers.get('X-API-Token')
         
         if not api_key or not api_token:
-            return jsonify({
-                'error': 'API authentication required. Please provide X-API-Key and X-API-Token headers.',
-                'status': 'unauthorized'
-            }), 401
+            return _unauthorized('API authentication required. Please provide X-API-Key and X-API-Token headers.')
         
         # Validate credentials
-        user = user_manager.validate_api_credentials(api_key, api_token)
+        with span('auth'):
+            user = user_manager.validate_api_credentials(api_key, api_token)
         if not user:
-            return jsonify({
-                'error': 'Invalid API credentials.',
-                'status': 'unauthorized'
-            }), 401
+            return _unauthorized('Invalid API credentials.')
         
         # Add user to request context
         request.current_user = user
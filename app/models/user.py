@@ -1,10 +1,25 @@
 
-import json
 import os
 import hashlib
+import hmac
 import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from app.security.encryption import encryption
+from app.storage import storage
+from app.utils.metrics import metrics
+
+# Seconds between checks for user and API key changes made by other workers
+DIRECTORY_SYNC_INTERVAL = 1.0
+# Unknown API keys remembered so that repeated invalid keys skip storage
+UNKNOWN_KEYS_CACHE_SIZE = 10000
+
+AUTH_CACHE_LOOKUPS = metrics.counter(
+    'auth_cache_lookups_total',
+    'User directory lookups by index and result: hit, miss, or unknown_key for a remembered invalid API key',
+    ('lookup', 'result'))
 
 class User:
     def __init__(self, user_id, username, email, subscription_tier='free', api_access_enabled=False):
@@ -68,148 +83,269 @@ class User:
         user.account_locked = data.get('account_locked', False)
         return user
 
+class UserDirectory:
+    """In-memory indexes over the users and api_keys collections.
+
+    User records, including their API token hashes, are cached by user id,
+    username and API key on first lookup. Writes invalidate them: this
+    worker's at once, other workers' through the storage change feed,
+    checked at most every ``sync_interval`` seconds. API keys that do not
+    exist are remembered in a bounded LRU, so a client retrying a bad key
+    does not reach storage.
+    """
+
+    def __init__(self, users, api_keys, store, sync_interval=DIRECTORY_SYNC_INTERVAL,
+                 unknown_keys_size=UNKNOWN_KEYS_CACHE_SIZE):
+        self.users = users
+        self.api_keys = api_keys
+        self.store = store
+        self.sync_interval = sync_interval
+        self.unknown_keys_size = unknown_keys_size
+        self._records = {}          # user_id -> stored user
+        self._usernames = {}        # username -> user_id
+        self._keys = {}             # api_key -> user_id
+        self._unknown_keys = OrderedDict()
+        self._generation = 0        # Bumped whenever entries are invalidated
+        self._seen = None           # Last change seen; read on first use
+        self._synced_at = time.monotonic()
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def sync(self, force=False):
+        """Drop entries written since the last sync, by any worker"""
+        now = time.monotonic()
+        if self._seen is None:
+            # Nothing is cached yet, so there is nothing to drop
+            self._seen, self._synced_at = self.store.last_change(), now
+            return
+        if not force and now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+        last, changed = self.store.changes(self._seen)
+        with self._lock:
+            if last == self._seen:
+                return
+            self._seen = last
+            self._generation += 1
+            if changed is None:
+                self._records.clear()
+                self._usernames.clear()
+                self._keys.clear()
+                self._unknown_keys.clear()
+                return
+            for collection, key in changed:
+                if collection == self.users.name:
+                    record = self._records.pop(key, None)
+                    if record:
+                        self._usernames.pop(record['username'], None)
+                elif collection == self.api_keys.name:
+                    self._keys.pop(key, None)
+                    self._unknown_keys.pop(key, None)
+
+    def _cache(self, record, generation):
+        """Cache a record read from storage, unless entries were
+        invalidated while it was being read"""
+        if record and generation == self._generation:
+            self._records[record['user_id']] = record
+            self._usernames[record['username']] = record['user_id']
+
+    def get(self, user_id):
+        self.sync()
+        record = self._records.get(user_id)
+        AUTH_CACHE_LOOKUPS.inc(lookup='user_id', result='miss' if record is None else 'hit')
+        if record is None:
+            generation = self._generation
+            record = self.users.get(user_id)
+            with self._lock:
+                self._cache(record, generation)
+        return record
+
+    def by_username(self, username):
+        self.sync()
+        user_id = self._usernames.get(username)
+        AUTH_CACHE_LOOKUPS.inc(lookup='username', result='miss' if user_id is None else 'hit')
+        if user_id is not None:
+            return self.get(user_id)
+        generation = self._generation
+        record = self.users.find_one('username', username)
+        with self._lock:
+            self._cache(record, generation)
+        return record
+
+    def by_api_key(self, api_key):
+        self.sync()
+        user_id = self._keys.get(api_key)
+        if user_id is None:
+            with self._lock:
+                if api_key in self._unknown_keys:
+                    self._unknown_keys.move_to_end(api_key)
+                    AUTH_CACHE_LOOKUPS.inc(lookup='api_key', result='unknown_key')
+                    return None
+            AUTH_CACHE_LOOKUPS.inc(lookup='api_key', result='miss')
+            generation = self._generation
+            mapping = self.api_keys.get(api_key)
+            with self._lock:
+                if generation == self._generation:
+                    if mapping:
+                        self._keys[api_key] = mapping['user_id']
+                    else:
+                        self._unknown_keys[api_key] = True
+                        if len(self._unknown_keys) > self.unknown_keys_size:
+                            self._unknown_keys.popitem(last=False)
+            if not mapping:
+                return None
+            user_id = mapping['user_id']
+        else:
+            AUTH_CACHE_LOOKUPS.inc(lookup='api_key', result='hit')
+        return self.get(user_id)
+
+    def stats(self):
+        return {
+            "users": len(self._records),
+            "api_keys": len(self._keys),
+            "unknown_api_keys": len(self._unknown_keys)
+        }
+
+
 class UserManager:
     def __init__(self):
-        self.users_file = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'users.json')
-        self.api_keys_file = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'api_keys.json')
-        self._ensure_data_dir()
-        
-    def _ensure_data_dir(self):
         data_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
-        os.makedirs(data_dir, exist_ok=True)
-        
-        # Initialize files if they don't exist
-        if not os.path.exists(self.users_file):
-            with open(self.users_file, 'w') as f:
-                json.dump({}, f)
-                
-        if not os.path.exists(self.api_keys_file):
-            with open(self.api_keys_file, 'w') as f:
-                json.dump({}, f)
-    
+        self.users_file = os.path.join(data_dir, 'users.json')
+        self.api_keys_file = os.path.join(data_dir, 'api_keys.json')
+        self.users = storage.collection(
+            'users', 'user_id', indexes=('username',),
+            legacy_path=self.users_file, legacy_records=lambda data: data.values(),
+            track_changes=True
+        )
+        self.api_keys = storage.collection(
+            'api_keys', 'api_key', indexes=('user_id',),
+            legacy_path=self.api_keys_file,
+            legacy_records=lambda data: ({'api_key': key, 'user_id': uid} for key, uid in data.items()),
+            track_changes=True
+        )
+        self.storage = storage
+        self.directory = UserDirectory(self.users, self.api_keys, storage)
+
     def load_users(self):
-        try:
-            with open(self.users_file, 'r') as f:
-                users_data = json.load(f)
-                return {uid: User.from_dict(data) for uid, data in users_data.items()}
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
-    
-    def save_users(self, users):
-        users_data = {uid: user.to_dict() for uid, user in users.items()}
-        with open(self.users_file, 'w') as f:
-            json.dump(users_data, f, indent=2)
-    
-    def load_api_keys(self):
-        try:
-            with open(self.api_keys_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
-    
-    def save_api_keys(self, api_keys):
-        with open(self.api_keys_file, 'w') as f:
-            json.dump(api_keys, f, indent=2)
-    
+        return {data['user_id']: User.from_dict(data) for data in self.users.all()}
+
+    def save_user(self, user):
+        self.users.put(user.to_dict())
+        self.directory.sync(force=True)
+
+    def delete_user(self, user_id):
+        with self.storage.transaction():
+            self.api_keys.delete_where('user_id', user_id)
+            deleted = self.users.delete(user_id)
+        self.directory.sync(force=True)
+        return deleted
+
     def create_user(self, user_id, username, email, subscription_tier='free'):
-        users = self.load_users()
-        if user_id in users:
-            return users[user_id]
-        
         user = User(user_id, username, email, subscription_tier)
-        users[user_id] = user
-        self.save_users(users)
+        if not self.users.insert(user.to_dict()):
+            return self.get_user(user_id)
+        self.directory.sync(force=True)
         return user
-    
+
     def get_user(self, user_id):
-        users = self.load_users()
-        return users.get(user_id)
-    
+        data = self.directory.get(user_id)
+        return User.from_dict(data) if data else None
+
+    def get_user_by_username(self, username):
+        data = self.directory.by_username(username)
+        return User.from_dict(data) if data else None
+
+    def update_user(self, user_id, change):
+        """Atomically apply ``change`` to a User; it may return False to
+        leave the stored user unchanged. Returns the user, or None."""
+        user = self._update_user(user_id, change)
+        self.directory.sync(force=True)
+        return user
+
+    def _update_user(self, user_id, change):
+        result = {}
+
+        def apply(data):
+            user = User.from_dict(data)
+            result['user'] = user
+            if change(user) is False:
+                return False
+            data.update(user.to_dict())
+
+        self.users.update(user_id, apply)
+        return result.get('user')
+
     def update_subscription(self, user_id, subscription_tier):
-        users = self.load_users()
-        if user_id in users:
-            users[user_id].subscription_tier = subscription_tier
+        def change(user):
+            user.subscription_tier = subscription_tier
             # Enable API access for premium subscribers
             if subscription_tier in ['premium', 'enterprise']:
-                users[user_id].api_access_enabled = True
+                user.api_access_enabled = True
             else:
-                users[user_id].api_access_enabled = False
-                users[user_id].api_key = None
-                users[user_id].api_token = None
-            self.save_users(users)
-            return users[user_id]
-        return None
-    
+                user.api_access_enabled = False
+                user.api_key = None
+                user.api_token = None
+        return self.update_user(user_id, change)
+
     def toggle_api_access(self, user_id, enabled):
-        users = self.load_users()
-        if user_id in users:
-            user = users[user_id]
+        def change(user):
             # Only allow API access for premium/enterprise subscribers
-            if user.subscription_tier in ['premium', 'enterprise']:
-                user.api_access_enabled = enabled
-                if not enabled:
-                    user.api_key = None
-                    user.api_token = None
-                    # Remove from API keys mapping
-                    api_keys = self.load_api_keys()
-                    keys_to_remove = [k for k, v in api_keys.items() if v == user_id]
-                    for key in keys_to_remove:
-                        del api_keys[key]
-                    self.save_api_keys(api_keys)
-                self.save_users(users)
-                return user
+            if user.subscription_tier not in ['premium', 'enterprise']:
+                return False
+            user.api_access_enabled = enabled
+            if not enabled:
+                user.api_key = None
+                user.api_token = None
+                # Remove from API keys mapping
+                self.api_keys.delete_where('user_id', user_id)
+
+        with self.storage.transaction():
+            user = self._update_user(user_id, change)
+        self.directory.sync(force=True)
+        if user and user.subscription_tier in ['premium', 'enterprise']:
+            return user
         return None
-    
+
     def generate_api_credentials(self, user_id):
-        users = self.load_users()
-        if user_id not in users:
-            return None
-        
-        user = users[user_id]
-        if not user.api_access_enabled or user.subscription_tier not in ['premium', 'enterprise']:
-            return None
-        
         # Generate API key and token
         api_key = f"qr_{secrets.token_urlsafe(32)}"
         api_token = secrets.token_urlsafe(64)
-        
-        # Store credentials
-        user.api_key = api_key
-        user.api_token = hashlib.sha256(api_token.encode()).hexdigest()
-        
-        # Update API keys mapping
-        api_keys = self.load_api_keys()
-        api_keys[api_key] = user_id
-        
-        self.save_users(users)
-        self.save_api_keys(api_keys)
-        
+
+        def change(user):
+            if not user.api_access_enabled or user.subscription_tier not in ['premium', 'enterprise']:
+                return False
+            # Store credentials
+            user.api_key = api_key
+            user.api_token = hashlib.sha256(api_token.encode()).hexdigest()
+            # Update API keys mapping
+            self.api_keys.put({'api_key': api_key, 'user_id': user_id})
+
+        with self.storage.transaction():
+            user = self._update_user(user_id, change)
+        self.directory.sync(force=True)
+        if not user or user.api_key != api_key:
+            return None
+
         return {
             'api_key': api_key,
             'api_token': api_token,  # Return plain token only once
             'user_id': user_id
         }
-    
+
     def validate_api_credentials(self, api_key, api_token):
-        api_keys = self.load_api_keys()
-        if api_key not in api_keys:
-            return None
-        
-        user_id = api_keys[api_key]
-        users = self.load_users()
-        if user_id not in users:
-            return None
-        
-        user = users[user_id]
-        if not user.api_access_enabled:
+        data = self.directory.by_api_key(api_key)
+        if not data or not data.get('api_access_enabled'):
             return None
-        
-        # Validate token
+
+        # Validate token against the cached hash
         token_hash = hashlib.sha256(api_token.encode()).hexdigest()
-        if user.api_token != token_hash:
+        if not data.get('api_token') or not hmac.compare_digest(data['api_token'], token_hash):
             return None
-        
-        return user
+
+        return User.from_dict(data)
 
 # Global instance
 user_manager = UserManager()
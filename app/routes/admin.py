@@ -1,8 +1,6 @@
 
 from flask import Blueprint, render_template, jsonify, request
 from app.models.user import user_manager
-import json
-import os
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -12,33 +10,51 @@ def dashboard():
 
 @admin_bp.route('/rules')
 def rules():
-    rules_path = os.path.join(os.path.dirname(__file__), '..', 'rules', 'finance.json')
-    with open(rules_path) as f:
-        rules = json.load(f)
-    return render_template('admin/rules.html', rules=rules)
+    from app.utils.rules_registry import rules_registry
+    ruleset = rules_registry.current()
+    return render_template('admin/rules.html', rules=ruleset.rules, rules_version=ruleset.describe())
 
 @admin_bp.route('/logs')
 def logs():
-    """Return recent underwriting logs as JSON"""
+    """Query underwriting logs, newest first, one page at a time.
+
+    Filters: ``user_id``, ``source``, ``tier``, ``min_score``, ``max_score``,
+    ``industry`` and an ISO ``start``/``end`` window. Pass the returned
+    ``next_cursor`` as ``cursor`` for the next page.
+    """
+    from app.utils.log_query import DEFAULT_PAGE_SIZE, parse_filters, query_log
+    from app.utils.log_writer import underwriting_log
     try:
-        log_path = os.path.join(os.path.dirname(__file__), '..', '..', 'logs', 'underwriting_data.jsonl')
-        logs = []
-        
-        if os.path.exists(log_path):
-            with open(log_path, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:  # Skip empty lines
-                        try:
-                            log_entry = json.loads(line)
-                            logs.append(log_entry)
-                        except json.JSONDecodeError:
-                            continue  # Skip malformed lines
-        
-        # Return the most recent 50 logs
-        return jsonify(logs[-50:])
+        filters = parse_filters(request.args)
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        return jsonify(query_log(underwriting_log, filters, request.args.get('cursor'), limit))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify([]), 500
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/score-distribution')
+def score_distribution():
+    """p10/p50/p90, mean, range and histograms of scores, offer amounts and
+    key inputs, from rollups rather than the raw log.
+
+    Filters: ``tier``, ``industry``, ``user_id`` and an ISO ``start``/``end``
+    window; ``group_by`` one of tier, industry, user_id, hour or day;
+    ``metrics`` a comma-separated subset. Buckets older than a week are
+    daily, so hour-level windows and groups apply to the last week only.
+    """
+    from app.utils.score_rollups import parse_rollup_query, score_rollups
+    try:
+        filters, group_by, metrics = parse_rollup_query(request.args)
+        return jsonify({
+            'filters': {key: request.args.get(key) for key in filters},
+            'group_by': group_by,
+            'groups': score_rollups.query(filters, group_by, metrics)
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/ml-insights')
 def ml_insights():
@@ -69,6 +85,18 @@ def get_users():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/users/<user_id>/usage')
+def user_usage(user_id):
+    """API calls and cost billed to a user, optionally between ``start`` and ``end`` days"""
+    from app.utils.log_writer import log_writer
+    from app.utils.usage_ledger import parse_period, usage_ledger
+    try:
+        start, end = parse_period(request.args)
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates (YYYY-MM-DD)'}), 400
+    log_writer.flush()
+    return jsonify(usage_ledger.usage(user_id, start, end))
+
 @admin_bp.route('/users', methods=['POST'])
 def create_user():
     """Create a new user"""
@@ -104,14 +132,9 @@ def create_user():
 def delete_user(user_id):
     """Delete a user"""
     try:
-        users = user_manager.load_users()
-        
-        if user_id not in users:
+        if not user_manager.delete_user(user_id):
             return jsonify({'error': 'User not found'}), 404
         
-        del users[user_id]
-        user_manager.save_users(users)
-        
         return jsonify({'message': 'User deleted successfully'})
         
     except Exception as e:
@@ -122,24 +145,14 @@ def update_user(user_id):
     """Update a user"""
     try:
         data = request.json
-        users = user_manager.load_users()
-        
-        if user_id not in users:
-            return jsonify({'error': 'User not found'}), 404
-        
-        user = users[user_id]
         
         if 'subscription_tier' in data:
-            user.subscription_tier = data['subscription_tier']
-            # Enable API access for premium subscribers
-            if data['subscription_tier'] in ['premium', 'enterprise']:
-                user.api_access_enabled = True
-            else:
-                user.api_access_enabled = False
-                user.api_key = None
-                user.api_token = None
+            user = user_manager.update_subscription(user_id, data['subscription_tier'])
+        else:
+            user = user_manager.get_user(user_id)
         
-        user_manager.save_users(users)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
         
         return jsonify({
             'user_id': user.user_id,
@@ -1,48 +1,34 @@
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, Response, request, jsonify, render_template, stream_with_context
 import json
-import os
 from datetime import datetime
-from app.utils.scoring import calculate_score, classify_risk
+from app.utils.scoring import calculate_score, classify_risk, include_owner2
 from app.utils.offers import generate_loan_offers
+from app.utils.result_cache import assessment_cache
+from app.utils.contributions import contribution_store
+from app.utils.rules_registry import rules_registry
+from app.utils.log_writer import log_writer, UNDERWRITING_LOG, USAGE_LOG
 from app.auth.middleware import require_api_auth, require_subscription
 from app.security.rate_limiting import rate_limiter
 from app.security.input_validation import input_validator
 from app.security.audit_log import audit_logger
 from app.security.data_isolation import data_isolation
+from app.utils.tracing import span
 
 api_bp = Blueprint('api', __name__)
 
-def get_cached_rules():
-    """Import and use the cached rules function from main"""
-    from main import get_cached_rules
-    return get_cached_rules()
-
 # API Call pricing
 API_CALL_COST = 1.25  # $1.25 per API call
 
-def track_api_usage(user_id, endpoint, cost=API_CALL_COST):
-    """Track API usage and billing"""
+def track_api_usage(user_id, endpoint, cost=API_CALL_COST, calls=1):
+    """Append a billing record to the usage ledger"""
     usage_log = {
         "user_id": user_id,
         "endpoint": endpoint,
+        "calls": calls,
         "cost": cost,
         "timestamp": datetime.utcnow().isoformat()
     }
-
-    usage_path = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'api_usage.json')
-    os.makedirs(os.path.dirname(usage_path), exist_ok=True)
-
-    try:
-        with open(usage_path, 'r') as f:
-            usage_data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        usage_data = []
-
-    usage_data.append(usage_log)
-
-    with open(usage_path, 'w') as f:
-        json.dump(usage_data, f, indent=2)
-
+    log_writer.write(USAGE_LOG, usage_log)
     return usage_log
 
 
@@ -153,81 +139,49 @@ def sandbox_assess():
         }), 500
 
 
-@api_bp.route('/assess', methods=['POST'])
-@require_api_auth # Ensures authentication
-@rate_limiter.rate_limit('api')
-def api_assess():
-    """
-    REST API endpoint for risk assessment
-
-    Expected JSON payload with required fields:
-    - owner1_credit_score (number)
-    - intelliscore (number) 
-    - daily_average_balance (number)
-
-    Returns JSON response with score, risk tier, and loan offers
-    """
-    try:
-        # Authentication is handled by @require_api_auth decorator
-        user_id = request.headers.get('X-User-ID')
-        if not user_id: # Should not happen if @require_api_auth is working, but as a safeguard
-            return jsonify({"error": "Authentication required.", "status": "error"}), 401
-
-        # Check content type
-        if not request.is_json:
-            audit_logger.log_request_error(request, "/assess", "Invalid Content-Type")
-            return jsonify({
-                "error": "Content-Type must be application/json",
-                "status": "error"
-            }), 400
-
-        data = request.get_json()
+class AssessmentValidationError(ValueError):
+    """Raised when an application fails assessment input validation"""
 
-        if not isinstance(data, dict):
-            audit_logger.log_request_error(request, "/assess", "Invalid JSON payload")
-            return jsonify({
-                "error": "Request body must be a valid JSON object",
-                "status": "error"
-            }), 400
+    def __init__(self, message, **details):
+        super().__init__(message)
+        self.details = details
 
-        # Input validation for production API
-        # The input_validator should handle user-specific data validation based on user_id
-        if not input_validator.validate_production_input(data, user_id):
-             audit_logger.log_request_error(request, "/assess", "Input validation failed")
-             return jsonify({
-                "error": "Invalid input data for assessment. Please check the required fields and their formats.",
-                "status": "error"
-            }), 400
 
-        # Audit the request before processing
-        audit_logger.log_request(request, "/assess", user_id)
+def assess_application(data, user_id, ruleset):
+    """Validate, score and price a single application against a RuleSet.
 
-        # Data isolation: Ensure that the user can only access/process their own data context
-        # This example assumes 'data' itself contains user-specific context or that the rules/scoring functions
-        # implicitly use user_id for context. If data were stored in a database, isolation would be crucial there.
-        # For this endpoint, we ensure that any processing is done in a user-aware context.
-        # The 'data' passed to calculate_score and generate_loan_offers might need to be filtered or validated
-        # based on user_id if it contains sensitive cross-user information, which is not the case here
-        # as 'data' is the input payload.
-        # The data_isolation decorator or logic would typically wrap the core processing if needed.
-        # For this specific flow, validation and subsequent processing inherently respect the user context
-        # established by authentication and rate limiting.
+    Raises AssessmentValidationError when the application is rejected.
+    """
+    rules = ruleset.rules
+    if not isinstance(data, dict):
+        raise AssessmentValidationError("Request body must be a valid JSON object")
+
+    # Input validation for production API
+    # The input_validator should handle user-specific data validation based on user_id
+    with span('validate'):
+        valid = input_validator.validate_production_input(data, user_id)
+    if not valid:
+        raise AssessmentValidationError(
+            "Invalid input data for assessment. Please check the required fields and their formats."
+        )
 
+    with span('required_fields'):
         # Get required fields based on ownership structure and owner2 data presence
-        required_fields = []
-        owner1_pct = float(data.get("owner1_ownership_pct", 100))
+        try:
+            owner1_pct = float(data.get("owner1_ownership_pct", 100))
+        except (TypeError, ValueError):
+            raise AssessmentValidationError("Fields must be numeric: owner1_ownership_pct")
 
-        # Check if any owner2 data is actually provided (excluding just ownership percentage)
+        # Only include owner2 fields if owner1 owns less than 50% AND owner2 data is provided
+        include_owner2_fields = include_owner2(data)
         owner2_has_data = any(
             v is not None and str(v).strip() != ""
             for k, v in data.items()
             if k.startswith("owner2_") and k != "owner2_ownership_pct"
         )
 
-        # Only include owner2 fields if owner1 owns less than 50% AND owner2 data is provided
-        include_owner2_fields = owner1_pct < 50 and owner2_has_data
-
-        for section_fields in RULES.values():
+        required_fields = []
+        for section_fields in rules.values():
             for field_name in section_fields.keys():
                 # Skip underwriter_adjustment (not required)
                 if field_name == "underwriter_adjustment":
@@ -241,79 +195,141 @@ def api_assess():
 
         missing_fields = [field for field in required_fields if field not in data or data[field] is None]
         if missing_fields:
-            audit_logger.log_request_error(request, "/assess", f"Missing fields: {', '.join(missing_fields)}")
-            return jsonify({
-                "error": f"Missing required fields: {', '.join(missing_fields)}",
-                "status": "error",
-                "required_fields": required_fields
-            }), 400
+            raise AssessmentValidationError(
+                f"Missing required fields: {', '.join(missing_fields)}",
+                required_fields=required_fields
+            )
 
         # Validate numeric fields (only check fields that are actually required)
         non_numeric = []
         for field in required_fields:
-            if field in data and data[field] is not None:
-                try:
-                    float(data[field])
-                except (TypeError, ValueError):
-                    non_numeric.append(field)
+            try:
+                float(data[field])
+            except (TypeError, ValueError):
+                non_numeric.append(field)
 
         if non_numeric:
-            audit_logger.log_request_error(request, "/assess", f"Non-numeric fields: {', '.join(non_numeric)}")
-            return jsonify({
-                "error": f"Fields must be numeric: {', '.join(non_numeric)}",
-                "status": "error"
-            }), 400
+            raise AssessmentValidationError(f"Fields must be numeric: {', '.join(non_numeric)}")
 
-        # Calculate score
-        # Ensure that calculate_score respects user context if necessary
-        result = calculate_score(data, RULES)
+    with span('score'):
+        result = calculate_score(data, rules)
+    with span('contributions'):
+        contribution_store.record(data, rules)
+    with span('classify'):
         tier = classify_risk(result['total_score'])
-        offers = generate_loan_offers(result['total_score']) # Assuming generate_loan_offers also respects context if needed
+    with span('offers'):
+        offers = generate_loan_offers(result['total_score'], data)
+
+    return {
+        "score": result,
+        "risk_tier": tier,
+        "offers": offers,
+        "owner_structure": {
+            "single_owner": owner1_pct >= 50 or not owner2_has_data,
+            "owner1_percentage": owner1_pct,
+            "owner2_data_provided": owner2_has_data
+        },
+        "rules_version": ruleset.label
+    }
 
-        # Log the assessment securely
-        log_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "user_id": user_id,
-            "source": "api",
-            "endpoint": "/assess",
-            "input": data, # Consider redacting sensitive PII if logging all input is not desired/secure
-            "score": result,
-            "offers": offers,
-            "tier": tier,
-        }
 
-        log_path = os.path.join(os.path.dirname(__file__), '..', '..', 'logs', 'underwriting_data.jsonl')
-        os.makedirs(os.path.dirname(log_path), exist_ok=True)
-        # Use a secure file append mechanism, potentially with file locking if concurrent writes are expected beyond Flask's request handling
-        with open(log_path, 'a') as f:
-            f.write(json.dumps(log_entry) + '\n')
+def build_log_entry(user_id, endpoint, data, assessment):
+    """Underwriting log entry for an API assessment"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "user_id": user_id,
+        "source": "api",
+        "endpoint": endpoint,
+        "input": data, # Consider redacting sensitive PII if logging all input is not desired/secure
+        "score": assessment["score"],
+        "offers": assessment["offers"],
+        "tier": assessment["risk_tier"],
+        "rules_version": assessment["rules_version"],
+    }
+
 
-        # Track API usage and billing
-        billing_log = track_api_usage(user_id, '/assess', API_CALL_COST)
+def append_underwriting_logs(entries):
+    """Queue log entries for the underwriting log"""
+    log_writer.write_many(UNDERWRITING_LOG, entries)
 
-        # Determine if single owner logic was used
-        single_owner_logic = owner1_pct >= 50 or not owner2_has_data
 
-        # Return response
-        return jsonify({
-            "status": "success",
-            "assessment": {
-                "score": result,
-                "risk_tier": tier,
-                "offers": offers,
-                "owner_structure": {
-                    "single_owner": single_owner_logic,
-                    "owner1_percentage": owner1_pct,
-                    "owner2_data_provided": owner2_has_data
+@api_bp.route('/assess', methods=['POST'])
+@require_api_auth # Ensures authentication
+@rate_limiter.rate_limit('api')
+def api_assess():
+    """
+    REST API endpoint for risk assessment
+
+    Expected JSON payload with required fields:
+    - owner1_credit_score (number)
+    - intelliscore (number) 
+    - daily_average_balance (number)
+
+    Returns JSON response with score, risk tier, and loan offers
+    """
+    try:
+        # Authentication is handled by @require_api_auth decorator
+        user_id = request.headers.get('X-User-ID')
+        if not user_id: # Should not happen if @require_api_auth is working, but as a safeguard
+            return jsonify({"error": "Authentication required.", "status": "error"}), 401
+
+        # Check content type
+        if not request.is_json:
+            audit_logger.log_request_error(request, "/assess", "Invalid Content-Type")
+            return jsonify({
+                "error": "Content-Type must be application/json",
+                "status": "error"
+            }), 400
+
+        with span('parse'):
+            data = request.get_json()
+        with span('rules'):
+            ruleset = rules_registry.current()
+
+        def assess():
+            assessment = assess_application(data, user_id, ruleset)
+
+            # Log the assessment securely
+            with span('log_append'):
+                append_underwriting_logs([build_log_entry(user_id, "/assess", data, assessment)])
+
+            # Track API usage and billing
+            with span('usage'):
+                billing_log = track_api_usage(user_id, '/assess', API_CALL_COST)
+            return {
+                "assessment": assessment,
+                "billing": {
+                    "cost": API_CALL_COST,
+                    "call_id": billing_log.get("timestamp")
                 }
-            },
-            "input_data": data, # Consider redacting sensitive PII before returning if necessary
-            "timestamp": datetime.utcnow().isoformat(),
-            "billing": {
-                "cost": API_CALL_COST,
-                "call_id": billing_log.get("timestamp")
             }
-        })
+
+        # Retries of an identical payload replay the original result and
+        # billing record instead of being scored, logged and billed again;
+        # they have already counted against the quota. The API docs say so.
+        with span('cache_key'):
+            cache_key = assessment_cache.make_key(data, ruleset.hash, user_id)
+        try:
+            result, cached = assessment_cache.get_or_compute(cache_key, assess)
+        except AssessmentValidationError as e:
+            audit_logger.log_request_error(request, "/assess", str(e))
+            return jsonify({"error": str(e), "status": "error", **e.details}), 400
+
+        # Audit every accepted request, including replays
+        with span('audit'):
+            audit_logger.log_request(request, "/assess", user_id)
+
+        # Return response
+        with span('jsonify'):
+            response = jsonify({
+                "status": "success",
+                "assessment": result["assessment"],
+                "input_data": data, # Consider redacting sensitive PII before returning if necessary
+                "timestamp": datetime.utcnow().isoformat(),
+                "billing": result["billing"]
+            })
+        response.headers['X-Cache'] = 'HIT' if cached else 'MISS'
+        return response
 
     except Exception as e:
         # Audit the error
@@ -324,8 +340,119 @@ def api_assess():
         }), 500
 
 
+# Largest number of applications accepted by a single batch request
+MAX_BATCH_SIZE = 5000
+
+
+def parse_batch_body(req):
+    """Split a batch request body into ``(index, application, error)`` items.
+
+    Accepts either a JSON array or NDJSON (one application per line). A line
+    that is not valid JSON becomes an item error instead of failing the batch.
+    """
+    if req.is_json:
+        applications = req.get_json(silent=True)
+        if not isinstance(applications, list):
+            raise AssessmentValidationError("Request body must be a JSON array of applications")
+        return [(index, application, None) for index, application in enumerate(applications)]
+
+    items = []
+    for line in req.get_data(as_text=True).splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append((len(items), json.loads(line), None))
+        except json.JSONDecodeError as e:
+            items.append((len(items), None, f"Invalid JSON: {e.msg}"))
+    return items
+
+
+@api_bp.route('/assess/batch', methods=['POST'])
+@require_api_auth
+@rate_limiter.rate_limit('api')
+def api_assess_batch():
+    """
+    Bulk risk assessment endpoint
+
+    Accepts a JSON array (application/json) or NDJSON body (application/x-ndjson)
+    of up to MAX_BATCH_SIZE applications. Authenticates and bills once per batch
+    and streams one NDJSON result line per application, followed by a summary
+    line. Applications that fail validation return an error line without
+    failing the rest of the batch.
+    """
+    user_id = request.headers.get('X-User-ID')
+    if not user_id:
+        return jsonify({"error": "Authentication required.", "status": "error"}), 401
+
+    try:
+        items = parse_batch_body(request)
+    except AssessmentValidationError as e:
+        audit_logger.log_request_error(request, "/assess/batch", str(e))
+        return jsonify({"error": str(e), "status": "error"}), 400
+
+    if not items:
+        audit_logger.log_request_error(request, "/assess/batch", "Empty batch")
+        return jsonify({"error": "Batch contains no applications", "status": "error"}), 400
+
+    if len(items) > MAX_BATCH_SIZE:
+        audit_logger.log_request_error(request, "/assess/batch", f"Batch of {len(items)} exceeds limit")
+        return jsonify({
+            "error": f"Batch exceeds the maximum of {MAX_BATCH_SIZE} applications",
+            "status": "error"
+        }), 413
+
+    audit_logger.log_request(request, "/assess/batch", user_id)
+    ruleset = rules_registry.current()
+    api_key = request.current_user.api_key
+
+    def generate():
+        log_entries = []
+        failed = 0
+        try:
+            for index, data, error in items:
+                if error is None:
+                    try:
+                        assessment = assess_application(data, user_id, ruleset)
+                    except AssessmentValidationError as e:
+                        error = str(e)
+                    except Exception as e:
+                        error = f"Internal server error: {str(e)}"
+
+                if error is not None:
+                    failed += 1
+                    yield json.dumps({"index": index, "status": "error", "error": error}) + '\n'
+                    continue
+
+                log_entries.append(build_log_entry(user_id, "/assess/batch", data, assessment))
+                yield json.dumps({"index": index, "status": "success", "assessment": assessment}) + '\n'
+        finally:
+            # Log and bill whatever was scored, even if the client disconnected
+            append_underwriting_logs(log_entries)
+            billing_log = None
+            if log_entries:
+                billing_log = track_api_usage(user_id, '/assess/batch', API_CALL_COST * len(log_entries),
+                                              len(log_entries))
+                # The request itself counted one call against the monthly quota
+                rate_limiter.quotas.record(api_key, len(log_entries) - 1)
+
+        yield json.dumps({
+            "status": "complete",
+            "processed": len(items),
+            "succeeded": len(log_entries),
+            "failed": failed,
+            "timestamp": datetime.utcnow().isoformat(),
+            "billing": {
+                "cost": round(API_CALL_COST * len(log_entries), 2),
+                "call_id": billing_log.get("timestamp") if billing_log else None
+            }
+        }) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @api_bp.route('/rules', methods=['GET'])
 @require_api_auth
+@rate_limiter.rate_limit('api')
 def api_rules():
     """
     Get the current scoring rules configuration
@@ -342,9 +469,36 @@ def api_rules():
     # although for GETting rules, it's usually broad access. If rules were user-specific, this would be critical.
     # For now, assuming rules are global.
 
+    ruleset = rules_registry.current()
+    return jsonify({
+        "status": "success",
+        "rules": ruleset.rules,
+        "rules_version": ruleset.label,
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+
+@api_bp.route('/usage', methods=['GET'])
+@require_api_auth
+@rate_limiter.rate_limit('api')
+def api_usage():
+    """
+    Calls and cost billed to the authenticated user, per day and in total,
+    for the optional ``start``/``end`` days (YYYY-MM-DD, inclusive)
+    """
+    from app.utils.usage_ledger import parse_period, usage_ledger
+    user_id = request.current_user.user_id
+    try:
+        start, end = parse_period(request.args)
+    except ValueError:
+        return jsonify({"error": "start and end must be dates (YYYY-MM-DD)", "status": "error"}), 400
+
+    audit_logger.log_request(request, "/usage", user_id)
+    # Include this worker's billing records still waiting in the writer queue
+    log_writer.flush()
     return jsonify({
         "status": "success",
-        "rules": RULES,
+        "usage": usage_ledger.usage(user_id, start, end),
         "timestamp": datetime.utcnow().isoformat()
     })
 
@@ -1,12 +1,28 @@
 
 from flask import Blueprint, render_template, request, jsonify
-import json
 import os
+import secrets
 from datetime import datetime
-import random
+from app.storage import storage
 
 ml_bp = Blueprint('ml', __name__)
 
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+
+loan_outcomes = storage.collection(
+    'loan_outcomes', 'id', indexes=('assessment_id',),
+    legacy_path=os.path.join(DATA_DIR, 'loan_outcomes.json')
+)
+training_jobs = storage.collection(
+    'training_jobs', 'id',
+    legacy_path=os.path.join(DATA_DIR, 'training_jobs.json')
+)
+
+def save_new_job(job):
+    """Store a new training job, keeping its id unique within the second"""
+    while not training_jobs.insert(job):
+        job['id'] = f"{job['id'].rsplit('~', 1)[0]}~{secrets.token_hex(2)}"
+
 @ml_bp.route('/')
 def ml_dashboard():
     return render_template('ml/dashboard.html')
@@ -41,20 +57,8 @@ def start_training():
             'started_at': datetime.now().isoformat()
         }
         
-        # Save job to file
-        jobs_path = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'training_jobs.json')
-        os.makedirs(os.path.dirname(jobs_path), exist_ok=True)
-        
-        try:
-            with open(jobs_path, 'r') as f:
-                jobs = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            jobs = []
-        
-        jobs.append(job)
-        
-        with open(jobs_path, 'w') as f:
-            json.dump(jobs, f, indent=2)
+        # Save job
+        save_new_job(job)
         
         return jsonify({
             'status': 'success',
@@ -72,15 +76,7 @@ def start_training():
 def training_status(job_id):
     """Get training job status"""
     try:
-        jobs_path = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'training_jobs.json')
-        
-        try:
-            with open(jobs_path, 'r') as f:
-                jobs = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            jobs = []
-        
-        job = next((j for j in jobs if j['id'] == job_id), None)
+        job = training_jobs.get(job_id)
         if not job:
             return jsonify({'status': 'error', 'message': 'Job not found'}), 404
         
@@ -143,13 +139,7 @@ def feedback_dashboard():
 def get_loan_outcomes():
     """Get loan outcomes for feedback training"""
     try:
-        outcomes_path = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'loan_outcomes.json')
-        
-        try:
-            with open(outcomes_path, 'r') as f:
-                outcomes = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            outcomes = []
+        outcomes = loan_outcomes.all()
         
         return jsonify({
             'status': 'success',
@@ -191,20 +181,8 @@ def record_loan_outcome():
             'updated_at': datetime.now().isoformat()
         }
         
-        # Save to file
-        outcomes_path = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'loan_outcomes.json')
-        os.makedirs(os.path.dirname(outcomes_path), exist_ok=True)
-        
-        try:
-            with open(outcomes_path, 'r') as f:
-                outcomes = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            outcomes = []
-        
-        outcomes.append(outcome)
-        
-        with open(outcomes_path, 'w') as f:
-            json.dump(outcomes, f, indent=2)
+        # Save outcome
+        loan_outcomes.put(outcome)
         
         return jsonify({
             'status': 'success',
@@ -223,36 +201,22 @@ def update_loan_outcome(outcome_id):
     """Update existing loan outcome"""
     try:
         data = request.get_json()
-        outcomes_path = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'loan_outcomes.json')
-        
-        try:
-            with open(outcomes_path, 'r') as f:
-                outcomes = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            outcomes = []
         
         # Find and update outcome
-        outcome_found = False
-        for outcome in outcomes:
-            if outcome['id'] == outcome_id:
-                outcome.update({
-                    'payment_performance': data.get('payment_performance', outcome.get('payment_performance')),
-                    'loan_status': data.get('loan_status', outcome.get('loan_status')),
-                    'notes': data.get('notes', outcome.get('notes')),
-                    'updated_at': datetime.now().isoformat()
-                })
-                outcome_found = True
-                break
-        
-        if not outcome_found:
+        def change(outcome):
+            outcome.update({
+                'payment_performance': data.get('payment_performance', outcome.get('payment_performance')),
+                'loan_status': data.get('loan_status', outcome.get('loan_status')),
+                'notes': data.get('notes', outcome.get('notes')),
+                'updated_at': datetime.now().isoformat()
+            })
+        
+        if loan_outcomes.update(outcome_id, change) is None:
             return jsonify({
                 'status': 'error',
                 'message': 'Outcome not found'
             }), 404
         
-        with open(outcomes_path, 'w') as f:
-            json.dump(outcomes, f, indent=2)
-        
         return jsonify({
             'status': 'success',
             'message': 'Outcome updated successfully'
@@ -272,13 +236,7 @@ def retrain_with_feedback():
         model_type = data.get('model_type', 'feedback_enhanced')
         
         # Load outcomes for training
-        outcomes_path = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'loan_outcomes.json')
-        
-        try:
-            with open(outcomes_path, 'r') as f:
-                outcomes = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            outcomes = []
+        outcomes = loan_outcomes.all()
         
         # Filter outcomes with payment performance data
         training_outcomes = [o for o in outcomes if o.get('payment_performance')]
@@ -308,19 +266,7 @@ def retrain_with_feedback():
         }
         
         # Save training job
-        jobs_path = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'training_jobs.json')
-        os.makedirs(os.path.dirname(jobs_path), exist_ok=True)
-        
-        try:
-            with open(jobs_path, 'r') as f:
-                jobs = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            jobs = []
-        
-        jobs.append(job)
-        
-        with open(jobs_path, 'w') as f:
-            json.dump(jobs, f, indent=2)
+        save_new_job(job)
         
         return jsonify({
             'status': 'success',
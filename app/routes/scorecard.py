@@ -1,12 +1,19 @@
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, request, jsonify, render_template, session
 import json
 import os
 from datetime import datetime
 from app.utils.scoring import calculate_score, classify_risk
 from app.utils.offers import generate_loan_offers
+from app.utils.incremental import RevisionConflict, ScoringStateStore
+from app.utils.rules_registry import rules_registry
+from app.utils.contributions import contribution_store
+from app.utils.log_writer import log_writer, UNDERWRITING_LOG
 
 scorecard_bp = Blueprint('scorecard', __name__)
 
+# Live scoring state for questionnaires being edited, keyed by session
+scoring_states = ScoringStateStore()
+
 def get_cached_rules():
     """Import and use the cached rules function from main"""
     from main import get_cached_rules
@@ -58,20 +65,68 @@ def calculate():
         msg = ", ".join(non_numeric)
         return jsonify({"error": f"Fields must be numeric: {msg}"}), 400
 
-    result = calculate_score(data, RULES)
+    ruleset = rules_registry.current()
+    result = calculate_score(data, ruleset.rules)
+    contribution_store.record(data, ruleset.rules)
     tier = classify_risk(result['total_score'])
     offers = generate_loan_offers(result['total_score'], data)
 
     log = {
         "timestamp": datetime.utcnow().isoformat(),
+        "source": "scorecard",
         "input": data,
         "score": result,
         "offers": offers,
         "tier": tier,
+        "rules_version": ruleset.label,
     }
 
-    # Use buffered logging from main.py
-    from main import add_to_log_buffer
-    add_to_log_buffer(log)
+    log_writer.write(UNDERWRITING_LOG, log)
+
+    return jsonify({"score": result, "offers": offers, "tier": tier, "input": data,
+                    "rules_version": ruleset.label})
+
+
+@scorecard_bp.route('/finance/delta', methods=['POST'])
+def calculate_delta():
+    """Rescore only the fields that changed since the last call in this session.
+
+    Expects ``{"revision": <last revision or null>, "changes": {...}}``. A null
+    revision starts a new state from ``changes``; a field set to null is
+    removed. If the server no longer holds the revision the client last saw,
+    it answers 409 and the client should resend the full form with a null
+    revision.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("changes"), dict):
+        return jsonify({"error": "Invalid JSON payload"}), 400
+
+    ruleset = rules_registry.current()
+    rules = ruleset.rules
+    revision = payload.get("revision")
+    state_id = session.get("scoring_state_id")
+    state = scoring_states.get(state_id) if state_id else None
+
+    if revision is None:
+        if state_id:
+            scoring_states.discard(state_id)
+        state_id, state = scoring_states.create(rules)
+        session["scoring_state_id"] = state_id
+        revision = state.revision
+    elif state is None:
+        return jsonify({"error": "Scoring state out of date", "resync": True}), 409
+
+    try:
+        update = state.update(payload["changes"], rules, revision)
+    except RevisionConflict:
+        return jsonify({"error": "Scoring state out of date", "resync": True}), 409
+    except Exception:
+        scoring_states.discard(state_id)
+        return jsonify({"error": "Unable to score changes", "resync": True}), 409
+
+    result = update.result
+    tier = classify_risk(result['total_score'])
+    offers = generate_loan_offers(result['total_score'], update.inputs)
 
-    return jsonify({"score": result, "offers": offers, "tier": tier, "input": data})
+    return jsonify({"score": result, "offers": offers, "tier": tier, "revision": update.revision,
+                    "rules_version": ruleset.label})
@@ -1,4 +1,5 @@
 
+from datetime import datetime
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, session, flash
 from app.models.user import user_manager
 from app.security.session import session_manager
@@ -82,12 +83,7 @@ def login():
         password = request.validated_data.get('password')
         
         # Find user by username
-        users = user_manager.load_users()
-        user = None
-        for uid, u in users.items():
-            if u.username == username:
-                user = u
-                break
+        user = user_manager.get_user_by_username(username)
         
         if not user:
             audit_logger.log_login_attempt(username, False, 'User not found')
@@ -102,19 +98,21 @@ def login():
         
         # Verify password
         if not user.verify_password(password):
-            user.failed_login_attempts += 1
-            if user.failed_login_attempts >= 5:
-                user.account_locked = True
-            user_manager.save_users(users)
+            def record_failure(stored):
+                stored.failed_login_attempts += 1
+                if stored.failed_login_attempts >= 5:
+                    stored.account_locked = True
+            user_manager.update_user(user.user_id, record_failure)
             
             audit_logger.log_login_attempt(username, False, 'Invalid password')
             flash('Invalid username or password', 'error')
             return render_template('user/login.html')
         
         # Successful login
-        user.failed_login_attempts = 0
-        user.last_login = datetime.utcnow().isoformat()
-        user_manager.save_users(users)
+        def record_login(stored):
+            stored.failed_login_attempts = 0
+            stored.last_login = datetime.utcnow().isoformat()
+        user_manager.update_user(user.user_id, record_login)
         
         # Create secure session
         session_id = session_manager.create_session(
@@ -1,16 +1,11 @@
 
-import json
-import os
 from datetime import datetime
 from flask import request, session
+from app.utils.log_writer import log_writer, AUDIT_LOG, AUDIT_LOG_PATH
 
 class AuditLogger:
     def __init__(self):
-        self.audit_file = os.path.join(os.path.dirname(__file__), '..', '..', 'logs', 'audit.log')
-        self._ensure_log_dir()
-    
-    def _ensure_log_dir(self):
-        os.makedirs(os.path.dirname(self.audit_file), exist_ok=True)
+        self.audit_file = AUDIT_LOG_PATH
     
     def log_event(self, event_type, user_id=None, details=None, severity='INFO'):
         """Log security and access events"""
@@ -26,8 +21,8 @@ class AuditLogger:
             'details': details or {}
         }
         
-        with open(self.audit_file, 'a') as f:
-            f.write(json.dumps(log_entry) + '\n')
+        # Queued: the writer thread appends it to audit_file
+        log_writer.write(AUDIT_LOG, log_entry)
     
     def log_login_attempt(self, user_id, success=True, reason=None):
         """Log login attempts"""
@@ -46,6 +41,32 @@ class AuditLogger:
             {'data_type': data_type, 'action': action}
         )
     
+    def log_request(self, req, endpoint, user_id):
+        """Log an API request"""
+        self.log_event(
+            'API_REQUEST',
+            user_id,
+            {'endpoint': endpoint, 'path': req.path}
+        )
+    
+    def log_request_error(self, req, endpoint, reason):
+        """Log a rejected API request"""
+        self.log_event(
+            'API_REQUEST_ERROR',
+            req.headers.get('X-User-ID'),
+            {'endpoint': endpoint, 'reason': reason},
+            'WARNING'
+        )
+    
+    def log_error(self, req, endpoint, error):
+        """Log an unexpected API error"""
+        self.log_event(
+            'API_ERROR',
+            req.headers.get('X-User-ID'),
+            {'endpoint': endpoint, 'error': error},
+            'ERROR'
+        )
+    
     def log_security_violation(self, violation_type, details):
         """Log security violations"""
         self.log_event(
@@ -1,19 +1,37 @@
 
 import os
 import base64
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+import hashlib
+import threading
 import secrets
 
 class DataEncryption:
+    """Fernet encryption of PII with a key derived from ENCRYPTION_PASSWORD.
+
+    The 100,000-round key derivation runs on the first encrypt or decrypt,
+    not at import, and its result is kept in memory only.
+    """
+
     def __init__(self):
         self.key_file = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'encryption_key.key')
         self.salt_file = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'salt.key')
-        self._ensure_encryption_key()
+        self._cipher = None
+        self._lock = threading.Lock()
+    
+    @property
+    def cipher(self):
+        if self._cipher is None:
+            with self._lock:
+                if self._cipher is None:
+                    self._cipher = self._ensure_encryption_key()
+        return self._cipher
     
     def _ensure_encryption_key(self):
-        """Generate or load encryption key"""
+        """Generate or load the salt and derive the cipher"""
+        from cryptography.fernet import Fernet
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+        
         if not os.path.exists(self.key_file) or not os.path.exists(self.salt_file):
             self._generate_new_key()
         
@@ -29,7 +47,7 @@ class DataEncryption:
             iterations=100000,
         )
         key = base64.urlsafe_b64encode(kdf.derive(password))
-        self.cipher = Fernet(key)
+        return Fernet(key)
     
     def _generate_new_key(self):
         """Generate new encryption components"""
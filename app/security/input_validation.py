@@ -65,6 +65,23 @@ class InputValidator:
         
         return True
     
+    def validate_assessment_input(self, data):
+        """Check every string value of an assessment payload for dangerous input"""
+        try:
+            for value in data.values():
+                self.sanitize_input(value)
+        except ValueError:
+            return False
+        return True
+    
+    def validate_sandbox_input(self, data):
+        """Validate a sandbox assessment payload"""
+        return self.validate_assessment_input(data)
+    
+    def validate_production_input(self, data, user_id):
+        """Validate a production assessment payload submitted by ``user_id``"""
+        return self.validate_assessment_input(data)
+    
     def validate_request_data(self, validation_rules):
         """Decorator to validate request data"""
         def decorator(f):
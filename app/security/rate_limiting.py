@@ -1,79 +1,334 @@
-
+import atexit
+import math
 import time
-import json
 import os
-from collections import defaultdict
-from flask import request, jsonify
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+from functools import wraps
+from flask import g, request, jsonify
+from app.storage import DATA_DIR, storage
+from app.storage.sqlite import SQLiteStorage
+from app.utils.metrics import metrics
+from app.utils.tracing import span
+
+RATE_LIMIT_DB_PATH = os.path.join(DATA_DIR, 'rate_limits.db')
+# Seconds between evictions of idle counters by each worker
+EVICT_INTERVAL = 60.0
+
+# Per-API-key quotas by subscription tier: a bucket of ``burst`` calls
+# refilled at ``rate`` calls per second, and a calendar month ceiling
+TIER_QUOTAS = {
+    'free': {'rate': 10 / 60, 'burst': 10, 'monthly': 1000},
+    'premium': {'rate': 1.0, 'burst': 60, 'monthly': 100000},
+    'enterprise': {'rate': 20.0, 'burst': 600, 'monthly': 5000000},
+}
+# Seconds between merges of each worker's monthly counts into the shared ones
+QUOTA_FLUSH_INTERVAL = 5.0
+
+# ``count`` includes the request just counted; ``reset`` is the number of
+# seconds until the current fixed window ends
+WindowState = namedtuple('WindowState', 'allowed count limit reset')
+
+REJECTIONS = metrics.counter(
+    'rate_limit_rejections_total',
+    'Requests refused by limit type and reason: blocked IP, window, burst or monthly quota',
+    ('limit_type', 'reason'))
+
+
+class SlidingWindowCounter:
+    """Request counters shared by every worker through a SQLite database.
+
+    Each key keeps the counts of the current and the previous fixed window.
+    The sliding count is the current count plus the previous one weighted
+    by how much of the previous window the sliding window still covers, so
+    the state per key is constant whatever the traffic. Counters idle for
+    two windows are evicted.
+    """
+
+    def __init__(self, store, evict_interval=EVICT_INTERVAL):
+        self.store = store
+        self.evict_interval = evict_interval
+        self._evicted_at = 0.0
+        store.setup(self._create_table)
+
+    @staticmethod
+    def _create_table(connection):
+        connection.execute("CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, "
+                           "window_start INTEGER, current INTEGER, previous INTEGER, expires INTEGER)")
+        connection.execute("CREATE INDEX IF NOT EXISTS rate_limits_expires ON rate_limits (expires)")
+
+    def hit(self, key, limit, window, now=None):
+        """Count one request for ``key`` unless it is over ``limit`` per
+        ``window`` seconds; return the resulting WindowState"""
+        now = time.time() if now is None else now
+        start = int(now // window) * window
+        with self.store.transaction() as connection:
+            row = connection.execute("SELECT window_start, current, previous FROM rate_limits WHERE key = ?",
+                                     (key,)).fetchone()
+            current = previous = 0
+            if row and row[0] == start:
+                _, current, previous = row
+            elif row and row[0] == start - window:
+                previous = row[1]
+            count = previous * (1 - (now - start) / window) + current
+            allowed = count < limit
+            if allowed:
+                current += 1
+                count += 1
+            connection.execute(
+                "INSERT INTO rate_limits VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "window_start = excluded.window_start, current = excluded.current, "
+                "previous = excluded.previous, expires = excluded.expires",
+                (key, start, current, previous, start + 2 * window)
+            )
+        if now - self._evicted_at >= self.evict_interval:
+            self.evict(now)
+        return WindowState(allowed, count, limit, start + window - now)
+
+    def evict(self, now=None):
+        """Delete counters whose windows have all passed"""
+        now = time.time() if now is None else now
+        self._evicted_at = now
+        with self.store.transaction() as connection:
+            connection.execute("DELETE FROM rate_limits WHERE expires <= ?", (now,))
+
+
+# What a client may still call: ``reset`` is the number of seconds until
+# the limit is fully available again, ``retry_after`` until the next call
+# is, and the monthly fields are None for limits without a ceiling
+LimitState = namedtuple('LimitState', 'allowed limit remaining reset retry_after monthly_limit monthly_remaining')
+
+
+def _month(now):
+    return datetime.fromtimestamp(now, timezone.utc).strftime('%Y-%m')
+
+
+def _month_end(now):
+    moment = datetime.fromtimestamp(now, timezone.utc)
+    if moment.month == 12:
+        return datetime(moment.year + 1, 1, 1, tzinfo=timezone.utc).timestamp()
+    return datetime(moment.year, moment.month + 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+class QuotaManager:
+    """Per-API-key quotas configured per subscription tier.
+
+    Token buckets and monthly counts live in memory, so checking a call
+    touches no disk. Each worker refills its buckets at its share of the
+    tier's rate, ``WEB_CONCURRENCY`` being the number of workers. Monthly
+    counts are merged into the shared ``quota_usage`` table every
+    ``flush_interval`` seconds, which also brings in the other workers'
+    counts; a ceiling can thus be overrun by the calls of one interval.
+    """
+
+    def __init__(self, store, tiers=TIER_QUOTAS, flush_interval=QUOTA_FLUSH_INTERVAL, workers=None):
+        self.store = store
+        self.tiers = tiers
+        self.flush_interval = flush_interval
+        self.workers = max(1, workers or int(os.environ.get('WEB_CONCURRENCY', 1)))
+        self._buckets = {}  # api_key -> [tokens, updated, rate, burst]
+        self._pending = {}  # (api_key, month) -> calls not flushed yet
+        self._totals = {}   # (api_key, month) -> shared calls as of the last flush
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushed_at = time.time()
+        store.setup(lambda connection: connection.execute(
+            "CREATE TABLE IF NOT EXISTS quota_usage "
+            "(api_key TEXT, month TEXT, calls INTEGER, PRIMARY KEY (api_key, month))"))
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # The parent's unflushed counts are the parent's to flush
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buckets, self._pending, self._totals = {}, {}, {}
+
+    def quota(self, tier):
+        return self.tiers.get(tier, self.tiers['free'])
+
+    def _shared_total(self, api_key, month):
+        row = self.store.connection().execute(
+            "SELECT calls FROM quota_usage WHERE api_key = ? AND month = ?", (api_key, month)).fetchone()
+        return row[0] if row else 0
+
+    def check(self, api_key, tier, now=None):
+        """Count one call for ``api_key`` unless its bucket is empty or its
+        month's ceiling is reached; return the resulting LimitState"""
+        now = time.time() if now is None else now
+        quota = self.quota(tier)
+        rate = quota['rate'] / self.workers
+        burst = max(1.0, quota['burst'] / self.workers)
+        month = _month(now)
+        if (api_key, month) not in self._totals:
+            total = self._shared_total(api_key, month)
+            with self._lock:
+                self._totals.setdefault((api_key, month), total)
+        with self._lock:
+            bucket = self._buckets.get(api_key)
+            if bucket is None:
+                bucket = self._buckets[api_key] = [burst, now, rate, burst]
+            # A tier change takes effect on the next call
+            bucket[2], bucket[3] = rate, burst
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            used = self._totals[(api_key, month)] + self._pending.get((api_key, month), 0)
+            if used >= quota['monthly']:
+                allowed, retry_after = False, _month_end(now) - now
+                REJECTIONS.inc(limit_type='api_key', reason='monthly')
+            elif tokens < 1:
+                allowed, retry_after = False, (1 - tokens) / rate
+                REJECTIONS.inc(limit_type='api_key', reason='burst')
+            else:
+                allowed, retry_after = True, 0.0
+                tokens -= 1
+                used += 1
+                self._pending[(api_key, month)] = self._pending.get((api_key, month), 0) + 1
+            bucket[0], bucket[1] = tokens, now
+        if now - self._flushed_at >= self.flush_interval:
+            self.flush(now)
+        return LimitState(allowed, int(burst), int(tokens), (burst - tokens) / rate, retry_after,
+                          quota['monthly'], max(0, quota['monthly'] - used))
+
+    def record(self, api_key, calls, now=None):
+        """Count ``calls`` more against the month of ``api_key`` only, for
+        requests that bill more than one call"""
+        if calls <= 0:
+            return
+        month = _month(time.time() if now is None else now)
+        with self._lock:
+            self._pending[(api_key, month)] = self._pending.get((api_key, month), 0) + calls
+
+    def flush(self, now=None):
+        """Merge this worker's monthly counts into the shared ones and
+        refresh its view of them; drop buckets idle long enough to be full"""
+        now = time.time() if now is None else now
+        if not self._flush_lock.acquire(blocking=False):
+            return  # Another thread is flushing
+        try:
+            self._flushed_at = now
+            month = _month(now)
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                keys = {key for key, key_month in self._totals if key_month == month}
+                self._buckets = {
+                    key: bucket for key, bucket in self._buckets.items()
+                    if bucket[0] + (now - bucket[1]) * bucket[2] < bucket[3]
+                }
+            if not pending and not keys:
+                return  # No API calls seen; don't open the database
+            try:
+                with self.store.transaction() as connection:
+                    for (key, key_month), calls in pending.items():
+                        connection.execute(
+                            "INSERT INTO quota_usage VALUES (?, ?, ?) ON CONFLICT (api_key, month) "
+                            "DO UPDATE SET calls = calls + excluded.calls", (key, key_month, calls))
+                    totals = {(key, month): self._shared_total(key, month) for key in keys}
+            except Exception:
+                with self._lock:
+                    for item, calls in pending.items():
+                        self._pending[item] = self._pending.get(item, 0) + calls
+                raise
+            with self._lock:
+                # Counts of past months are no longer checked
+                self._totals = totals
+        finally:
+            self._flush_lock.release()
+
 
 class RateLimiter:
     def __init__(self):
-        self.requests = defaultdict(list)
-        self.blocked_ips = set()
+        self.blocked_ips = None  # Loaded on the first check
         self.rate_limits = {
             'api': {'calls': 100, 'window': 3600},  # 100 calls per hour for API
             'login': {'calls': 5, 'window': 300},   # 5 login attempts per 5 minutes
             'general': {'calls': 1000, 'window': 3600}  # 1000 general requests per hour
         }
+        # Counters churn on every request, so they get their own database
+        counters = SQLiteStorage(RATE_LIMIT_DB_PATH)
+        self.counter = SlidingWindowCounter(counters)
+        self.quotas = QuotaManager(counters)
         self.blocked_file = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'blocked_ips.json')
-        self._load_blocked_ips()
+        self.blocked = storage.collection(
+            'blocked_ips', 'ip',
+            legacy_path=self.blocked_file,
+            legacy_records=lambda data: ({'ip': ip} for ip in data.get('blocked_ips', []))
+        )
     
     def _load_blocked_ips(self):
         """Load permanently blocked IPs"""
-        try:
-            with open(self.blocked_file, 'r') as f:
-                data = json.load(f)
-                self.blocked_ips = set(data.get('blocked_ips', []))
-        except:
-            self.blocked_ips = set()
+        self.blocked_ips = {entry['ip'] for entry in self.blocked.all()}
     
-    def _save_blocked_ips(self):
-        """Save blocked IPs to file"""
-        os.makedirs(os.path.dirname(self.blocked_file), exist_ok=True)
-        with open(self.blocked_file, 'w') as f:
-            json.dump({'blocked_ips': list(self.blocked_ips)}, f)
-    
-    def is_rate_limited(self, identifier, limit_type='general'):
-        """Check if identifier is rate limited"""
+    def check(self, identifier, limit_type='general'):
+        """Count one request from identifier; return its LimitState"""
+        if self.blocked_ips is None:
+            self._load_blocked_ips()
         if identifier in self.blocked_ips:
-            return True
-        
-        current_time = time.time()
+            REJECTIONS.inc(limit_type=limit_type, reason='blocked')
+            return LimitState(False, 0, 0, 0.0, 0.0, None, None)
+
         limit_config = self.rate_limits.get(limit_type, self.rate_limits['general'])
-        
-        # Clean old requests
-        self.requests[identifier] = [
-            req_time for req_time in self.requests[identifier]
-            if current_time - req_time < limit_config['window']
-        ]
-        
-        # Check if limit exceeded
-        if len(self.requests[identifier]) >= limit_config['calls']:
-            # Block IP if excessive requests
-            if len(self.requests[identifier]) > limit_config['calls'] * 2:
-                self.blocked_ips.add(identifier)
-                self._save_blocked_ips()
-            return True
-        
-        # Record this request
-        self.requests[identifier].append(current_time)
-        return False
-    
+        state = self.counter.hit(f"{limit_type}:{identifier}", limit_config['calls'], limit_config['window'])
+        if not state.allowed:
+            REJECTIONS.inc(limit_type=limit_type, reason='window')
+        return LimitState(state.allowed, state.limit, max(0, int(state.limit - state.count)), state.reset,
+                          0.0 if state.allowed else state.reset, None, None)
+
+    def is_rate_limited(self, identifier, limit_type='general'):
+        """Count one request from identifier; True if it is over its limit"""
+        return not self.check(identifier, limit_type).allowed
+
+    def headers(self, state):
+        """``X-RateLimit-*`` response headers describing ``state``"""
+        headers = {
+            'X-RateLimit-Limit': str(state.limit),
+            'X-RateLimit-Remaining': str(state.remaining),
+            'X-RateLimit-Reset': str(math.ceil(state.reset)),
+        }
+        if state.monthly_limit is not None:
+            headers['X-RateLimit-Monthly-Limit'] = str(state.monthly_limit)
+            headers['X-RateLimit-Monthly-Remaining'] = str(state.monthly_remaining)
+        if not state.allowed:
+            headers['Retry-After'] = str(math.ceil(state.retry_after))
+        return headers
+
+    def rejection(self, state):
+        """The 429 response for a request ``state`` does not allow"""
+        return jsonify({
+            'error': 'Rate limit exceeded',
+            'status': 'rate_limited',
+            'retry_after': math.ceil(state.retry_after)
+        }), 429
+
     def rate_limit(self, limit_type='general'):
-        """Decorator for rate limiting"""
+        """Decorator for rate limiting.
+
+        API calls authenticated by ``require_api_auth`` count against the
+        quota of their API key's subscription tier, other requests against
+        their IP's limit; ``require_api_auth`` counts failed authentications
+        against the IP's ``api`` limit itself. The view is tagged with its limit type so the
+        app-wide check in ``main.check_rate_limit`` skips it and each
+        request counts once. The state is left in ``g.rate_limit_headers``
+        for ``main.add_rate_limit_headers``.
+        """
         def decorator(f):
+            @wraps(f)
             def decorated_function(*args, **kwargs):
-                identifier = request.remote_addr
-                
-                if self.is_rate_limited(identifier, limit_type):
-                    return jsonify({
-                        'error': 'Rate limit exceeded',
-                        'status': 'rate_limited',
-                        'retry_after': self.rate_limits[limit_type]['window']
-                    }), 429
-                
+                user = getattr(request, 'current_user', None)
+                with span('rate_limit'):
+                    if limit_type == 'api' and user is not None and user.api_key:
+                        state = self.quotas.check(user.api_key, user.subscription_tier)
+                    else:
+                        state = self.check(request.remote_addr, limit_type)
+                    g.rate_limit_headers = self.headers(state)
+
+                if not state.allowed:
+                    return self.rejection(state)
+
                 return f(*args, **kwargs)
-            decorated_function.__name__ = f.__name__
+            decorated_function.rate_limit_type = limit_type
             return decorated_function
         return decorator
 
 rate_limiter = RateLimiter()
+atexit.register(rate_limiter.quotas.flush)
@@ -1,21 +1,184 @@
 
+import atexit
+import heapq
+import logging
 import os
 import secrets
 import hashlib
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from flask import session, request
-import json
+from app.storage import storage
+
+# Seconds between write-behind flushes of active sessions and expiry sweeps
+FLUSH_INTERVAL = 5.0
+# Seconds a cached session is trusted before it is read again, so a session
+# destroyed by another worker stops validating here too
+REVALIDATE_INTERVAL = 30.0
+# Seconds past a flush interval an expired session is kept in storage, so
+# one extended by another worker that has not flushed it yet is not swept
+SWEEP_GRACE = 30.0
+
+
+def _unix_time(timestamp):
+    return datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
+
+
+class SessionCache:
+    """This worker's sessions in memory, in front of the sessions collection.
+
+    Lookups are dictionary reads. Activity updates only mark a session
+    dirty; a background thread writes each dirty session once per
+    ``flush_interval``, however often it was used, and sweeps sessions
+    past their expiry, taken from a heap ordered by expiry, out of memory
+    and storage. New and destroyed sessions are written through so other
+    workers see them at once.
+    """
+
+    def __init__(self, store, storage, flush_interval=FLUSH_INTERVAL, revalidate_interval=REVALIDATE_INTERVAL,
+                 sweep_grace=SWEEP_GRACE):
+        self.store = store
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.revalidate_interval = revalidate_interval
+        self.sweep_grace = sweep_grace
+        # session_id -> (session data, monotonic time it was read from storage)
+        self._sessions = {}
+        # (expiry, session_id), pushed once per cached session
+        self._expiry = []
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The parent flushes its own dirty sessions
+        self._lock = threading.Lock()
+        self._sessions, self._expiry, self._dirty = {}, [], set()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name="session-cache", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                self.sweep()
+            except Exception:
+                logging.exception("Error flushing sessions")
+
+    def _cache(self, session_id, data):
+        if session_id not in self._sessions:
+            heapq.heappush(self._expiry, (_unix_time(data['expires_at']), session_id))
+        self._sessions[session_id] = (data, time.monotonic())
+
+    def get(self, session_id, refresh=False):
+        """The session, from memory unless it is due for revalidation or
+        ``refresh`` is set; None if it does not exist"""
+        self._ensure_thread()
+        with self._lock:
+            cached = self._sessions.get(session_id)
+        if cached and not refresh and time.monotonic() - cached[1] < self.revalidate_interval:
+            return cached[0]
+
+        data = self.store.get(session_id)
+        with self._lock:
+            if data is None:
+                # Destroyed, by this worker or another
+                self._sessions.pop(session_id, None)
+                self._dirty.discard(session_id)
+                return None
+            current = self._sessions.get(session_id)
+            if current and session_id in self._dirty and current[0]['expires_at'] > data['expires_at']:
+                data = current[0]  # Activity here not flushed yet
+            self._cache(session_id, data)
+            return data
+
+    def put(self, session_id, data):
+        """Store a new session now and cache it"""
+        self._ensure_thread()
+        self.store.put({**data, 'session_id': session_id})
+        with self._lock:
+            self._cache(session_id, data)
+
+    def touch(self, session_id, data):
+        """Replace a cached session's data; written by the next flush"""
+        with self._lock:
+            if session_id in self._sessions:
+                self._sessions[session_id] = (data, self._sessions[session_id][1])
+                self._dirty.add(session_id)
+
+    def remove(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._dirty.discard(session_id)
+        self.store.delete(session_id)
+
+    def flush(self):
+        """Write every session touched since the last flush, once"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            pending = {sid: self._sessions[sid][0] for sid in dirty if sid in self._sessions}
+        if not pending:
+            return
+        with self.storage.transaction():
+            for session_id, data in pending.items():
+                # Update rather than put, so a session destroyed elsewhere stays gone
+                self.store.update(session_id, lambda stored, data=data: stored.update(
+                    last_activity=max(stored.get('last_activity') or '', data['last_activity']),
+                    expires_at=max(stored['expires_at'], data['expires_at'])
+                ))
+
+    def sweep(self):
+        """Drop expired sessions from memory and storage.
+
+        Storage only loses sessions expired for longer than a flush interval
+        and ``sweep_grace``: every worker writes its extensions within a flush
+        interval, so by then none can be waiting in another worker's memory.
+        """
+        now = time.time()
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                _, session_id = heapq.heappop(self._expiry)
+                cached = self._sessions.get(session_id)
+                if cached is None:
+                    continue
+                expires = _unix_time(cached[0]['expires_at'])
+                if expires > now:
+                    heapq.heappush(self._expiry, (expires, session_id))  # Extended since
+                else:
+                    del self._sessions[session_id]
+                    self._dirty.discard(session_id)
+        # Includes sessions of other workers and of users who never came back
+        cutoff = datetime.utcnow() - timedelta(seconds=self.flush_interval + self.sweep_grace)
+        self.store.delete_below('expires_at', cutoff.isoformat())
+
+    def __len__(self):
+        return len(self._sessions)
+
 
 class SecureSessionManager:
     def __init__(self):
         self.session_timeout = 30  # 30 minutes
         self.sessions_file = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'active_sessions.json')
-        self._ensure_sessions_file()
-    
-    def _ensure_sessions_file(self):
-        if not os.path.exists(self.sessions_file):
-            with open(self.sessions_file, 'w') as f:
-                json.dump({}, f)
+        self.sessions = storage.collection(
+            'sessions', 'session_id', indexes=('user_id', 'expires_at'),
+            legacy_path=self.sessions_file,
+            legacy_records=lambda data: ({**stored, 'session_id': sid} for sid, stored in data.items())
+        )
+        self.cache = SessionCache(self.sessions, storage)
+        atexit.register(self.cache.flush)
     
     def create_session(self, user_id, user_agent, ip_address):
         """Create a secure session with token and metadata"""
@@ -62,18 +225,24 @@ class SecureSessionManager:
         # Check expiration
         expires_at = datetime.fromisoformat(stored_session['expires_at'])
         if datetime.utcnow() > expires_at:
-            self.destroy_session(session_id)
-            return False
+            # Another worker may have extended it since it was cached here
+            stored_session = self.cache.get(session_id, refresh=True)
+            if not stored_session or datetime.utcnow() > datetime.fromisoformat(stored_session['expires_at']):
+                self.destroy_session(session_id)
+                return False
         
         # Check for session hijacking
         if stored_session['user_agent'] != request.headers.get('User-Agent', ''):
             self.destroy_session(session_id)
             return False
         
-        # Update last activity
-        stored_session['last_activity'] = datetime.utcnow().isoformat()
-        stored_session['expires_at'] = (datetime.utcnow() + timedelta(minutes=self.session_timeout)).isoformat()
-        self._store_session(session_id, stored_session)
+        # Update last activity; persisted by the cache's next flush
+        now = datetime.utcnow()
+        self.cache.touch(session_id, {
+            **stored_session,
+            'last_activity': now.isoformat(),
+            'expires_at': (now + timedelta(minutes=self.session_timeout)).isoformat()
+        })
         
         return True
     
@@ -88,36 +257,12 @@ class SecureSessionManager:
         session.clear()
     
     def _store_session(self, session_id, session_data):
-        try:
-            with open(self.sessions_file, 'r') as f:
-                sessions = json.load(f)
-        except:
-            sessions = {}
-        
-        sessions[session_id] = session_data
-        
-        with open(self.sessions_file, 'w') as f:
-            json.dump(sessions, f, indent=2)
+        self.cache.put(session_id, session_data)
     
     def _get_session(self, session_id):
-        try:
-            with open(self.sessions_file, 'r') as f:
-                sessions = json.load(f)
-            return sessions.get(session_id)
-        except:
-            return None
+        return self.cache.get(session_id)
     
     def _remove_session(self, session_id):
-        try:
-            with open(self.sessions_file, 'r') as f:
-                sessions = json.load(f)
-            
-            if session_id in sessions:
-                del sessions[session_id]
-                
-                with open(self.sessions_file, 'w') as f:
-                    json.dump(sessions, f, indent=2)
-        except:
-            pass
+        self.cache.remove(session_id)
 
 session_manager = SecureSessionManager()
@@ -0,0 +1,23 @@
+# Storage package: collections shared by every thread and worker
+import os
+
+from app.storage.sqlite import SQLiteStorage
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+DEFAULT_STORAGE_URL = 'sqlite:///' + os.path.join(DATA_DIR, 'qarari.db')
+
+STORAGE_BACKENDS = {
+    'sqlite': SQLiteStorage,
+}
+
+
+def create_storage(url):
+    """A Storage for ``url``, ``<backend>:///<location>``"""
+    backend, separator, location = url.partition(':///')
+    if not separator or backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unsupported storage URL '{url}'")
+    return STORAGE_BACKENDS[backend](location)
+
+
+# Global instance; STORAGE_URL in the environment selects another store
+storage = create_storage(os.environ.get('STORAGE_URL', DEFAULT_STORAGE_URL))
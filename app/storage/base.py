@@ -0,0 +1,96 @@
+from abc import ABC, abstractmethod
+
+
+class Collection(ABC):
+    """Documents of one kind, keyed by their ``key`` field and looked up
+    by any of their ``indexes`` fields.
+
+    Documents are JSON-serializable dicts. Index fields hold scalars.
+    """
+
+    def __init__(self, name, key, indexes=()):
+        self.name = name
+        self.key = key
+        self.indexes = tuple(indexes)
+
+    @abstractmethod
+    def get(self, key):
+        """The document stored under ``key``, or None"""
+
+    @abstractmethod
+    def find(self, field, value):
+        """Documents whose indexed ``field`` equals ``value``, in insertion order"""
+
+    def find_one(self, field, value):
+        found = self.find(field, value)
+        return found[0] if found else None
+
+    @abstractmethod
+    def all(self):
+        """Every document, in insertion order"""
+
+    @abstractmethod
+    def count(self):
+        """Number of documents"""
+
+    @abstractmethod
+    def put(self, doc):
+        """Insert ``doc`` or replace the document with its key"""
+
+    @abstractmethod
+    def insert(self, doc):
+        """Insert ``doc`` unless its key exists; return whether it was inserted"""
+
+    @abstractmethod
+    def update(self, key, change):
+        """Atomically apply ``change`` to the document under ``key``.
+
+        ``change`` mutates the document in place; returning False leaves
+        the stored document unchanged. Returns the document, or None if
+        there is none.
+        """
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove the document under ``key``; return whether there was one"""
+
+    @abstractmethod
+    def delete_where(self, field, value):
+        """Remove the documents whose indexed ``field`` equals ``value``; return how many"""
+
+    @abstractmethod
+    def delete_below(self, field, value):
+        """Remove the documents whose indexed ``field`` is less than ``value``; return how many"""
+
+
+class Storage(ABC):
+    """A store of collections shared by every thread and worker process"""
+
+    @abstractmethod
+    def collection(self, name, key, indexes=(), legacy_path=None, legacy_records=None,
+                   track_changes=False):
+        """The ``name`` collection, created on first use.
+
+        On creation, the documents ``legacy_records(data)`` yields for the
+        JSON file at ``legacy_path`` are imported once. The file is left in
+        place. With ``track_changes``, every write to the collection, from
+        any process, is reported by ``changes``.
+        """
+
+    @abstractmethod
+    def last_change(self):
+        """Number of the latest change to a tracked collection"""
+
+    @abstractmethod
+    def changes(self, since):
+        """``(last, changed)``: the ``(collection, key)`` pairs written after
+        change number ``since`` and the number of the latest change.
+        ``changed`` is None when some of those changes were already pruned.
+        """
+
+    @abstractmethod
+    def transaction(self):
+        """Context manager grouping collection writes into one transaction"""
+
+    def close(self):
+        pass
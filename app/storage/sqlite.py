@@ -0,0 +1,249 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from app.storage.base import Collection, Storage
+
+# Seconds a writer waits for another connection's write lock
+BUSY_TIMEOUT = 30.0
+# Prepared statements kept per connection; every query below is a fixed string
+CACHED_STATEMENTS = 256
+# Changes to tracked collections kept for workers catching up
+KEPT_CHANGES = 10000
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _identifier(name):
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid storage identifier '{name}'")
+    return name
+
+
+class SQLiteCollection(Collection):
+    """A table with the key as primary key, one indexed column per index
+    field and the whole document as JSON"""
+
+    def __init__(self, storage, name, key, indexes=()):
+        super().__init__(_identifier(name), _identifier(key), [_identifier(field) for field in indexes])
+        self.storage = storage
+        columns = [self.key, *self.indexes]
+        placeholders = ', '.join('?' * (len(columns) + 1))
+        assignments = ', '.join(f"{column} = excluded.{column}" for column in ['data', *self.indexes])
+        self._create = [
+            f"CREATE TABLE IF NOT EXISTS {name} ({key} TEXT PRIMARY KEY, data TEXT NOT NULL"
+            + ''.join(f", {field}" for field in self.indexes) + ")",
+            *(f"CREATE INDEX IF NOT EXISTS {name}_{field} ON {name} ({field})" for field in self.indexes),
+        ]
+        self._get = f"SELECT data FROM {name} WHERE {key} = ?"
+        self._find = {field: f"SELECT data FROM {name} WHERE {field} = ? ORDER BY rowid" for field in self.indexes}
+        self._all = f"SELECT data FROM {name} ORDER BY rowid"
+        self._count = f"SELECT COUNT(*) FROM {name}"
+        self._put = (f"INSERT INTO {name} ({', '.join(columns)}, data) VALUES ({placeholders}) "
+                     f"ON CONFLICT ({key}) DO UPDATE SET {assignments}")
+        self._insert = f"INSERT OR IGNORE INTO {name} ({', '.join(columns)}, data) VALUES ({placeholders})"
+        self._delete = f"DELETE FROM {name} WHERE {key} = ?"
+        self._delete_where = {field: f"DELETE FROM {name} WHERE {field} = ?" for field in self.indexes}
+        self._delete_below = {field: f"DELETE FROM {name} WHERE {field} < ?" for field in self.indexes}
+
+    def _row(self, doc):
+        return (str(doc[self.key]), *(doc.get(field) for field in self.indexes), json.dumps(doc))
+
+    def _query(self, sql, params=()):
+        return [json.loads(data) for data, in self.storage.connection().execute(sql, params)]
+
+    def get(self, key):
+        row = self.storage.connection().execute(self._get, (str(key),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self, field, value):
+        return self._query(self._find[field], (value,))
+
+    def all(self):
+        return self._query(self._all)
+
+    def count(self):
+        return self.storage.connection().execute(self._count).fetchone()[0]
+
+    def put(self, doc):
+        self.storage.connection().execute(self._put, self._row(doc))
+
+    def insert(self, doc):
+        return self.storage.connection().execute(self._insert, self._row(doc)).rowcount == 1
+
+    def update(self, key, change):
+        with self.storage.transaction():
+            doc = self.get(key)
+            if doc is not None and change(doc) is not False:
+                self.put(doc)
+            return doc
+
+    def delete(self, key):
+        return self.storage.connection().execute(self._delete, (str(key),)).rowcount == 1
+
+    def delete_where(self, field, value):
+        return self.storage.connection().execute(self._delete_where[field], (value,)).rowcount
+
+    def delete_below(self, field, value):
+        return self.storage.connection().execute(self._delete_below[field], (value,)).rowcount
+
+
+class SQLiteStorage(Storage):
+    """Collections in one SQLite database in WAL mode.
+
+    Each thread of each process gets its own connection, so readers never
+    block on a writer and workers forked from a preloaded app never share
+    one. Writes from all workers are serialized by SQLite's write lock
+    instead of overwriting each other's files.
+    """
+
+    def __init__(self, path, busy_timeout=BUSY_TIMEOUT):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._collections = {}
+        # Schema steps run on first use, so importing the app opens no database
+        self._setup = [self._create_tables]
+        self._prepared = False
+        self._preparing = False
+        self._prepare_lock = threading.RLock()
+
+    def _create_tables(self, connection):
+        connection.execute("CREATE TABLE IF NOT EXISTS migrations "
+                           "(name TEXT PRIMARY KEY, source TEXT, records INTEGER, migrated_at TEXT)")
+        connection.execute("CREATE TABLE IF NOT EXISTS changes "
+                           "(seq INTEGER PRIMARY KEY AUTOINCREMENT, collection TEXT, key TEXT)")
+
+    def connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                         cached_statements=CACHED_STATEMENTS)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Durable at checkpoints; a power loss can only lose the last commits
+            connection.execute("PRAGMA synchronous=NORMAL")
+            local.connection, local.pid, local.depth = connection, os.getpid(), 0
+        if not self._prepared:
+            self._prepare()
+        return local.connection
+
+    def _prepare(self):
+        """Run the schema steps registered so far, once per process"""
+        with self._prepare_lock:
+            if self._prepared or self._preparing:
+                return  # Done by another thread, or a step of ours is using the connection
+            self._preparing = True
+            try:
+                with self.transaction() as connection:
+                    for step in self._setup:
+                        step(connection)
+                self._prepared = True
+            finally:
+                self._preparing = False
+
+    def setup(self, step):
+        """Run ``step(connection)`` in a transaction before the database is
+        first used, or at once if it already is"""
+        with self._prepare_lock:
+            if not self._prepared:
+                self._setup.append(step)
+                return
+        with self.transaction() as connection:
+            step(connection)
+
+    @contextmanager
+    def transaction(self):
+        connection = self.connection()
+        local = self._local
+        if local.depth:
+            local.depth += 1
+            try:
+                yield connection
+            finally:
+                local.depth -= 1
+            return
+        # Take the write lock up front so read-modify-write cannot interleave
+        connection.execute("BEGIN IMMEDIATE")
+        local.depth = 1
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        else:
+            connection.execute("COMMIT")
+        finally:
+            local.depth = 0
+
+    def collection(self, name, key, indexes=(), legacy_path=None, legacy_records=None,
+                   track_changes=False):
+        if name in self._collections:
+            return self._collections[name]
+        collection = SQLiteCollection(self, name, key, indexes)
+
+        def create(connection):
+            for statement in collection._create:
+                connection.execute(statement)
+            if track_changes:
+                # Triggers record writes from every process and code path
+                for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+                    connection.execute(
+                        f"CREATE TRIGGER IF NOT EXISTS {name}_{event.lower()}_changes AFTER {event} ON {name} "
+                        f"BEGIN INSERT INTO changes (collection, key) VALUES ('{name}', {row}.{key}); END"
+                    )
+            if legacy_path:
+                self._migrate(collection, legacy_path, legacy_records)
+
+        self.setup(create)
+        self._collections[name] = collection
+        return collection
+
+    def _migrate(self, collection, path, records):
+        """Import a JSON file into a new collection, once"""
+        connection = self.connection()
+        if connection.execute("SELECT 1 FROM migrations WHERE name = ?", (collection.name,)).fetchone():
+            return
+        count = 0
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = None
+        except ValueError:
+            logging.warning("Not migrating unreadable %s", path)
+            data = None
+        if data:
+            for doc in (records(data) if records else data):
+                count += collection.insert(doc)
+        connection.execute("INSERT INTO migrations VALUES (?, ?, ?, ?)",
+                           (collection.name, os.path.normpath(path), count, datetime.utcnow().isoformat()))
+        if count:
+            logging.info("Migrated %d %s from %s", count, collection.name, path)
+
+    def last_change(self):
+        return self.connection().execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def changes(self, since):
+        connection = self.connection()
+        rows = connection.execute("SELECT seq, collection, key FROM changes WHERE seq > ? ORDER BY seq",
+                                  (since,)).fetchall()
+        oldest = connection.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+        if not rows:
+            return since, []
+        last = rows[-1][0]
+        if last - oldest > 2 * KEPT_CHANGES:
+            connection.execute("DELETE FROM changes WHERE seq <= ?", (last - KEPT_CHANGES,))
+        if since < oldest - 1:
+            return last, None
+        return last, [(collection, key) for _, collection, key in rows]
+
+    def close(self):
+        if getattr(self._local, 'pid', None) == os.getpid():
+            self._local.connection.close()
+            self._local.pid = None
@@ -0,0 +1,296 @@
+import json
+import os
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.utils.log_writer import underwriting_log
+from app.utils.offers import generate_loan_offers
+from app.utils.scoring import (
+    calculate_score,
+    calculate_score_batch,
+    classify_risk,
+    field_contributions,
+    to_columns,
+)
+
+TIERS = ("low", "moderate", "high", "super_high")
+
+# Bytes of log handed to a worker per task
+CHUNK_BYTES = 8 * 1024 * 1024
+
+# Applications scored together with calculate_score_batch
+BATCH_SIZE = 2000
+
+# Number of fields listed in the "driving_fields" report
+TOP_FIELDS = 10
+
+# Rule sets for the current worker process, set once by _init_worker
+_worker_rules = None
+
+
+def _init_worker(baseline_rules, candidate_rules):
+    global _worker_rules
+    _worker_rules = (baseline_rules, candidate_rules)
+
+
+def chunk_offsets(path, chunk_bytes=CHUNK_BYTES):
+    """Split ``path`` into ``(start, end)`` byte ranges that begin on line boundaries"""
+    size = os.path.getsize(path)
+    offsets = []
+    start = 0
+    with open(path, 'rb') as f:
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()  # Finish the line the boundary falls in
+            end = min(f.tell(), size)
+            offsets.append((start, end))
+            start = end
+    return offsets
+
+
+def _new_totals():
+    return {
+        "entries": 0,
+        "skipped": 0,
+        "score_changed": 0,
+        "migration": Counter(),
+        "approved": Counter(),
+        "volume": Counter(),
+        "score_sum": Counter(),
+        "field_delta": defaultdict(float),
+        "field_abs_delta": defaultdict(float),
+        "field_changed": Counter()
+    }
+
+
+def offered_volume(total_score, input_data):
+    """Largest loan offered at ``total_score``, 0 when declined"""
+    offers = generate_loan_offers(total_score, input_data)
+    return max((offer["amount"] for offer in offers), default=0)
+
+
+def _assess(input_data, rules):
+    result = calculate_score(input_data, rules)
+    return result, classify_risk(result["total_score"]), offered_volume(result["total_score"], input_data)
+
+
+def _count_outcome(totals, base_score, cand_score, base_tier, cand_tier, base_volume, cand_volume):
+    totals["entries"] += 1
+    totals["migration"][(base_tier, cand_tier)] += 1
+    totals["approved"]["baseline"] += base_volume > 0
+    totals["approved"]["candidate"] += cand_volume > 0
+    totals["volume"]["baseline"] += base_volume
+    totals["volume"]["candidate"] += cand_volume
+    totals["score_sum"]["baseline"] += base_score
+    totals["score_sum"]["candidate"] += cand_score
+    totals["score_changed"] += base_score != cand_score
+
+
+def _shares(input_data, rules, max_score):
+    """Each field's share of the normalized score, in score points"""
+    return {
+        key: points / max_score * 100
+        for key, (points, _) in field_contributions(input_data, rules).items()
+    }
+
+
+def replay_entry(input_data, baseline_rules, candidate_rules, totals):
+    """Score one historical input under both rule sets and add it to ``totals``"""
+    base, base_tier, base_volume = _assess(input_data, baseline_rules)
+    cand, cand_tier, cand_volume = _assess(input_data, candidate_rules)
+    _count_outcome(totals, base["total_score"], cand["total_score"],
+                   base_tier, cand_tier, base_volume, cand_volume)
+
+    if base["total_score"] == cand["total_score"]:
+        return
+
+    # Auto-declined applications score 0 under both rule sets, so a change
+    # always has a non-zero maximum on both sides to attribute against
+    if base["max_possible"] and cand["max_possible"]:
+        base_shares = _shares(input_data, baseline_rules, base["max_possible"])
+        cand_shares = _shares(input_data, candidate_rules, cand["max_possible"])
+        for key in base_shares.keys() | cand_shares.keys():
+            delta = cand_shares.get(key, 0) - base_shares.get(key, 0)
+            if delta:
+                totals["field_delta"][key] += delta
+                totals["field_abs_delta"][key] += abs(delta)
+                totals["field_changed"][key] += 1
+
+
+def replay_batch(inputs, baseline_rules, candidate_rules, totals):
+    """Vectorized :func:`replay_entry` over a list of inputs"""
+    columns, _ = to_columns(inputs)
+    base = calculate_score_batch(columns, baseline_rules, contributions=True)
+    cand = calculate_score_batch(columns, candidate_rules, contributions=True)
+    base_scores = base["total_score"].tolist()
+    cand_scores = cand["total_score"].tolist()
+
+    for input_data, base_score, cand_score in zip(inputs, base_scores, cand_scores):
+        cand_volume = offered_volume(cand_score, input_data)
+        base_volume = cand_volume if base_score == cand_score else offered_volume(base_score, input_data)
+        _count_outcome(totals, base_score, cand_score, classify_risk(base_score),
+                       classify_risk(cand_score), base_volume, cand_volume)
+
+    attributable = (
+        (base["total_score"] != cand["total_score"])
+        & (base["max_possible"] > 0) & (cand["max_possible"] > 0)
+    )
+    if not attributable.any():
+        return
+    base_max = base["max_possible"][attributable]
+    cand_max = cand["max_possible"][attributable]
+    base_points, cand_points = base["field_points"], cand["field_points"]
+    for key in base_points.keys() | cand_points.keys():
+        delta = np.zeros(len(base_max))
+        if key in cand_points:
+            delta += cand_points[key][attributable] / cand_max * 100
+        if key in base_points:
+            delta -= base_points[key][attributable] / base_max * 100
+        changed = int(np.count_nonzero(delta))
+        if changed:
+            totals["field_delta"][key] += float(delta.sum())
+            totals["field_abs_delta"][key] += float(np.abs(delta).sum())
+            totals["field_changed"][key] += changed
+
+
+def _replay_inputs(inputs, baseline_rules, candidate_rules, totals):
+    batch_totals = _new_totals()
+    try:
+        replay_batch(inputs, baseline_rules, candidate_rules, batch_totals)
+        merge_totals(totals, batch_totals)
+    except Exception:
+        # One input the scorer rejects fails the whole batch, so fall back
+        # to scoring this batch one entry at a time
+        for input_data in inputs:
+            try:
+                replay_entry(input_data, baseline_rules, candidate_rules, totals)
+            except Exception:
+                totals["skipped"] += 1
+
+
+def replay_range(path, start, end, baseline_rules=None, candidate_rules=None):
+    """Replay the log entries in bytes ``[start, end)`` of ``path``"""
+    if baseline_rules is None:
+        baseline_rules, candidate_rules = _worker_rules
+    totals = _new_totals()
+    inputs = []
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                input_data = json.loads(line).get("input")
+            except (ValueError, AttributeError):
+                input_data = None
+            if not isinstance(input_data, dict):
+                # Malformed lines are counted, not fatal
+                totals["skipped"] += 1
+                continue
+            inputs.append(input_data)
+            if len(inputs) >= BATCH_SIZE:
+                _replay_inputs(inputs, baseline_rules, candidate_rules, totals)
+                inputs = []
+    if inputs:
+        _replay_inputs(inputs, baseline_rules, candidate_rules, totals)
+    return totals
+
+
+def _replay_task(task):
+    return replay_range(*task)
+
+
+def merge_totals(into, totals):
+    into["entries"] += totals["entries"]
+    into["skipped"] += totals["skipped"]
+    into["score_changed"] += totals["score_changed"]
+    for name in ("migration", "approved", "volume", "score_sum", "field_changed"):
+        into[name].update(totals[name])
+    for name in ("field_delta", "field_abs_delta"):
+        for key, value in totals[name].items():
+            into[name][key] += value
+    return into
+
+
+def build_report(totals):
+    """Turn merged replay totals into the JSON-serializable report"""
+    entries = totals["entries"]
+
+    def rate(count):
+        return round(count / entries * 100, 2) if entries else 0
+
+    def compare(baseline, candidate, digits=2):
+        return {
+            "baseline": round(baseline, digits),
+            "candidate": round(candidate, digits),
+            "delta": round(candidate - baseline, digits)
+        }
+
+    migration = {
+        base: {cand: totals["migration"][(base, cand)] for cand in TIERS}
+        for base in TIERS
+    }
+    driving = sorted(totals["field_abs_delta"].items(), key=lambda item: item[1], reverse=True)
+
+    return {
+        "entries": entries,
+        "skipped": totals["skipped"],
+        "score_changed": totals["score_changed"],
+        "tier_migration": migration,
+        "tier_changed": entries - sum(migration[tier][tier] for tier in TIERS),
+        "approval_rate": compare(rate(totals["approved"]["baseline"]), rate(totals["approved"]["candidate"])),
+        "offered_volume": compare(totals["volume"]["baseline"], totals["volume"]["candidate"], 0),
+        "average_score": compare(
+            totals["score_sum"]["baseline"] / entries if entries else 0,
+            totals["score_sum"]["candidate"] / entries if entries else 0
+        ),
+        "driving_fields": [
+            {
+                "field": key,
+                "applications": totals["field_changed"][key],
+                "average_delta": round(totals["field_delta"][key] / totals["field_changed"][key], 3),
+                "total_abs_delta": round(abs_delta, 2)
+            }
+            for key, abs_delta in driving[:TOP_FIELDS]
+        ]
+    }
+
+
+def run_backtest(candidate_rules, baseline_rules, log_paths=None, workers=None,
+                 chunk_bytes=CHUNK_BYTES):
+    """Re-score every logged application under two rule sets and compare them.
+
+    ``log_paths`` defaults to the segments of the underwriting log. Each
+    file is split into byte ranges that worker processes read and score
+    in batches of ``BATCH_SIZE``, so only one batch per worker is held in
+    memory.
+    ``driving_fields`` ranks fields by how far they moved normalized scores.
+    """
+    totals = _new_totals()
+    if log_paths is None:
+        log_paths = underwriting_log.segment_paths()
+    tasks = [
+        (path, start, end)
+        for path in log_paths if os.path.exists(path)
+        for start, end in chunk_offsets(path, chunk_bytes)
+    ]
+    if not tasks:
+        return build_report(totals)
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+
+    if workers <= 1:
+        for task in tasks:
+            merge_totals(totals, replay_range(*task, baseline_rules, candidate_rules))
+        return build_report(totals)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(baseline_rules, candidate_rules)) as pool:
+        for chunk_totals in pool.map(_replay_task, tasks):
+            merge_totals(totals, chunk_totals)
+    return build_report(totals)
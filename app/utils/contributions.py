@@ -0,0 +1,325 @@
+import atexit
+import fcntl
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from app.utils.scoring import calculate_score_batch, get_scoring_plan
+
+STORE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'contributions')
+
+# Pending assessments are written by a background thread once this many are
+# buffered, and at least every FLUSH_INTERVAL seconds. Other workers' rows
+# reach weight_impact within FLUSH_INTERVAL.
+FLUSH_SIZE = 500
+FLUSH_INTERVAL = 5
+# Unix time the store was last rebuilt from the log; rows buffered before
+# then are in the rebuilt store already
+REBUILT_AT_FILE = 'rebuilt_at'
+
+# Rows scored per block when evaluating weights, bounding temporary memory
+EVAL_BLOCK_ROWS = 65536
+
+# Tier cut-offs used by classify_risk, ascending
+TIER_CUTOFFS = (50, 60, 80)
+TIER_NAMES = ("super_high", "high", "moderate", "low")
+SCORE_BINS = (0, 10, 20, 30, 40, 50, 60, 70, 80, 90, math.inf)
+
+
+def rule_weights(rules):
+    """``{field: weight}`` for every field in ``rules``"""
+    return {key: rule.get("weight", 0) for fields in rules.values() for key, rule in fields.items()}
+
+
+def structure_hash(rules):
+    """Hash of ``rules`` with weights removed: rules that differ only in
+    weight produce identical multipliers"""
+    stripped = {
+        section: {key: {k: v for k, v in rule.items() if k != "weight"} for key, rule in fields.items()}
+        for section, fields in rules.items()
+    }
+    canonical = json.dumps(stripped, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def row_dtype(field_count):
+    import numpy as np
+    return np.dtype([
+        ("multiplier", "<f8", (field_count,)),
+        ("count", "u1", (field_count,)),
+        ("declined", "?")
+    ])
+
+
+class ContributionStore:
+    """Append-only store of per-field multipliers and counts for every assessment.
+
+    Rows live in one segment per rule structure (rules with weights
+    removed), as fixed-size binary records memory-mapped for reading. Since
+    a score is ``sum(w * multiplier) / sum(w * count)``, any weight vector can
+    be re-applied to all stored assessments with two matrix-vector products.
+    Results match ``calculate_score`` up to the last cent of rounding.
+    """
+
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        # (unix time recorded, input, rules) awaiting the flusher thread
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        # Serializes this process's writers; the flock serializes processes
+        self._write_lock = threading.Lock()
+        self._lock_fd = None
+        self._lock_pid = None
+        self._layout = None  # (rules, segment name, fields) of the last rules seen
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A forked worker inherits the buffer and locks but not the flusher thread
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._write_lock = threading.Lock()
+
+    def _segment_layout(self, rules):
+        """``(segment name, fields)`` for ``rules``, cached per rules object"""
+        layout = self._layout
+        if layout is None or layout[0] is not rules:
+            fields = [step[0] for step in get_scoring_plan(rules).steps]
+            layout = self._layout = (rules, structure_hash(rules), fields)
+        return layout[1], layout[2]
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive access to the store across threads and worker processes.
+        The lock file sits beside the store so a rebuild can replace it."""
+        with self._write_lock:
+            if self._lock_pid != os.getpid():
+                # flock belongs to the open file, which a forked child shares
+                parent = os.path.dirname(os.path.abspath(self.store_dir))
+                os.makedirs(parent, exist_ok=True)
+                self._lock_fd = os.open(os.path.abspath(self.store_dir) + '.lock',
+                                        os.O_RDWR | os.O_CREAT, 0o644)
+                self._lock_pid = os.getpid()
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def record(self, input_data, rules):
+        """Buffer one scored application for the flusher thread"""
+        with self._lock:
+            self._pending.append((time.time(), input_data, rules))
+            full = len(self._pending) >= FLUSH_SIZE
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name="contribution-flusher", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Error writing contributions")
+
+    def flush(self):
+        """Score and write everything buffered in this process"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        with self._locked():
+            rebuilt_at = self._rebuilt_at()
+            groups = {}
+            for recorded, input_data, rules in pending:
+                # The rebuild replayed these from the log already
+                if recorded >= rebuilt_at:
+                    groups.setdefault(id(rules), (rules, []))[1].append(input_data)
+            for rules, inputs in groups.values():
+                self._write_valid(inputs, rules, self.store_dir)
+
+    def _rebuilt_at(self):
+        try:
+            with open(os.path.join(self.store_dir, REBUILT_AT_FILE)) as f:
+                return float(f.read())
+        except (FileNotFoundError, ValueError):
+            return 0.0
+
+    def _write(self, inputs, rules, store_dir):
+        """Append rows for ``inputs``; callers hold ``_locked``"""
+        import numpy as np
+
+        name, fields = self._segment_layout(rules)
+        directory = os.path.join(store_dir, name)
+        result = calculate_score_batch(inputs, rules, contributions=True)
+
+        rows = np.zeros(len(inputs), dtype=row_dtype(len(fields)))
+        for column, key in enumerate(fields):
+            rows["multiplier"][:, column] = result["field_multipliers"][key]
+            rows["count"][:, column] = result["field_counts"][key]
+        rows["declined"] = result["auto_decline"]
+
+        os.makedirs(directory, exist_ok=True)
+        fields_path = os.path.join(directory, 'fields.json')
+        if not os.path.exists(fields_path):
+            with open(fields_path, 'w') as f:
+                json.dump(fields, f)
+        # One append per batch keeps records whole for lock-free readers
+        with open(os.path.join(directory, 'rows.bin'), 'ab') as f:
+            f.write(rows.tobytes())
+
+    def segments(self):
+        """Yield ``(fields, rows)`` for each segment, ``rows`` memory-mapped read-only"""
+        import numpy as np
+
+        if not os.path.isdir(self.store_dir):
+            return
+        for name in sorted(os.listdir(self.store_dir)):
+            directory = os.path.join(self.store_dir, name)
+            try:
+                with open(os.path.join(directory, 'fields.json')) as f:
+                    fields = json.load(f)
+                size = os.path.getsize(os.path.join(directory, 'rows.bin'))
+            except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+                continue
+            dtype = row_dtype(len(fields))
+            count = size // dtype.itemsize  # Ignore a partially written trailing row
+            if count:
+                yield fields, np.memmap(os.path.join(directory, 'rows.bin'), dtype=dtype,
+                                        mode='r', shape=(count,))
+
+    def scores(self, weights):
+        """Normalized scores of every stored assessment under ``weights``"""
+        import numpy as np
+
+        blocks = []
+        for fields, rows in self.segments():
+            vector = np.array([weights.get(key, 0) for key in fields], dtype=float)
+            count_vector = vector
+            if np.array_equal(vector, np.round(vector)) and np.abs(vector).sum() * 2 < 2 ** 24:
+                # Integer weights times counts of at most 2 sum exactly in
+                # float32, which is much cheaper than widening the counts
+                count_vector = vector.astype(np.float32)
+            for start in range(0, len(rows), EVAL_BLOCK_ROWS):
+                block = rows[start:start + EVAL_BLOCK_ROWS]
+                raw = block["multiplier"] @ vector
+                possible = (block["count"].astype(count_vector.dtype) @ count_vector).astype(float)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    normalized = np.where(possible != 0, np.round(raw / possible * 100, 2), 0.0)
+                blocks.append(np.where(block["declined"], 0.0, normalized))
+        return np.concatenate(blocks) if blocks else np.zeros(0)
+
+    def known_fields(self):
+        fields = set()
+        for segment_fields, _ in self.segments():
+            fields.update(segment_fields)
+        return fields
+
+    def weight_impact(self, current_rules, proposed_rules):
+        """Score distribution and tier counts under the current and proposed weights"""
+        self.flush()
+        known = self.known_fields()
+        current_weights = rule_weights(current_rules)
+        proposed_weights = rule_weights(proposed_rules)
+        return {
+            "applications": int(sum(len(rows) for _, rows in self.segments())),
+            "current": summarize_scores(self.scores(current_weights)),
+            "proposed": summarize_scores(self.scores(proposed_weights)),
+            # Only weights can be re-applied; other edits need a full backtest
+            "non_weight_changes": structure_hash(current_rules) != structure_hash(proposed_rules),
+            "unavailable_fields": sorted(
+                key for key, weight in proposed_weights.items() if weight and key not in known
+            )
+        }
+
+    def rebuild_from_log(self, log, rules, batch_size=2000):
+        """Replace the store with every input in ``log`` (a SegmentedLog), scored under ``rules``.
+
+        The new store is built beside the old one and swapped in, so
+        readers never see it half built. Other workers' writes wait on the
+        lock meanwhile; rows they buffered before the rebuild started are
+        dropped, since the log replay covers them.
+        """
+        with self._locked():
+            started = time.time()
+            building = os.path.abspath(self.store_dir) + '.rebuild'
+            shutil.rmtree(building, ignore_errors=True)
+            os.makedirs(building)
+
+            written = 0
+            inputs = []
+            for entry in log.iter_range(end=datetime.utcfromtimestamp(started)):
+                input_data = entry.get("input")
+                if isinstance(input_data, dict):
+                    inputs.append(input_data)
+                if len(inputs) >= batch_size:
+                    written += self._write_valid(inputs, rules, building)
+                    inputs = []
+            if inputs:
+                written += self._write_valid(inputs, rules, building)
+            with open(os.path.join(building, REBUILT_AT_FILE), 'w') as f:
+                f.write(repr(started))
+
+            retired = os.path.abspath(self.store_dir) + '.old'
+            shutil.rmtree(retired, ignore_errors=True)
+            if os.path.exists(self.store_dir):
+                os.replace(self.store_dir, retired)
+            os.replace(building, self.store_dir)
+            shutil.rmtree(retired, ignore_errors=True)
+        return written
+
+    def _write_valid(self, inputs, rules, store_dir):
+        try:
+            self._write(inputs, rules, store_dir)
+            return len(inputs)
+        except Exception:
+            # A single input the scorer rejects fails the batch; retry one by one
+            written = 0
+            for input_data in inputs:
+                try:
+                    self._write([input_data], rules, store_dir)
+                    written += 1
+                except Exception:
+                    continue
+            return written
+
+
+def summarize_scores(scores):
+    import numpy as np
+
+    tiers = np.bincount(np.searchsorted(TIER_CUTOFFS, scores, side='right'), minlength=len(TIER_NAMES))
+    histogram, _ = np.histogram(scores, bins=SCORE_BINS)
+    labels = [f"{int(low)}-{int(high)}" for low, high in zip(SCORE_BINS[:-2], SCORE_BINS[1:-1])] + ["90+"]
+    return {
+        "tiers": {name: int(count) for name, count in zip(TIER_NAMES, tiers)},
+        "distribution": [{"range": label, "count": int(count)} for label, count in zip(labels, histogram)],
+        "average_score": round(float(scores.mean()), 2) if len(scores) else 0
+    }
+
+
+# Global instance
+contribution_store = ContributionStore()
+atexit.register(contribution_store.flush)
@@ -0,0 +1,181 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from app.utils.scoring import (
+    auto_decline_reasons,
+    calculate_years_in_business,
+    get_scoring_plan,
+    include_owner2,
+)
+
+# Inputs that decide whether owner 2 fields are scored
+OWNER2_TRIGGER_FIELD = "owner1_ownership_pct"
+# Inputs checked by the automatic decline rules
+AUTO_DECLINE_FIELDS = ("monthly_deposits", "deposit_frequency")
+
+# What one update produced: the new revision, the score dict and a copy of
+# the inputs it was computed from, for pricing offers outside the lock
+ScoringUpdate = namedtuple('ScoringUpdate', 'revision result inputs')
+
+
+class RevisionConflict(Exception):
+    """Raised when an update is based on a revision that is no longer current"""
+
+    def __init__(self, expected, current):
+        super().__init__(f"Update based on revision {expected}, state is at {current}")
+        self.expected = expected
+        self.current = current
+
+
+class ScoringState:
+    """Cached per-field contributions for one application being edited.
+
+    ``update`` takes only the fields that changed and re-scores just those
+    fields, re-evaluating owner 2 inclusion and the auto-decline rules only
+    when their inputs change. Results match ``calculate_score`` on the full
+    input.
+    """
+
+    def __init__(self, rules):
+        self.inputs = {}
+        self.revision = 0
+        self._lock = threading.Lock()
+        self._build(get_scoring_plan(rules))
+
+    def _build(self, plan):
+        """Index ``plan`` and score every field from the current inputs"""
+        self.plan = plan
+        self.steps_by_key = {}
+        self.owner2_steps = []
+        self.years_steps = []
+        for index, (key, weight, is_owner2, derives_years, score_field) in enumerate(plan.steps):
+            self.steps_by_key.setdefault(key, []).append(index)
+            if is_owner2:
+                self.owner2_steps.append(index)
+            if derives_years:
+                self.years_steps.append(index)
+
+        self.owner2_included = include_owner2(self.inputs)
+        self.decline_reasons = auto_decline_reasons(self.inputs)
+        self.points = [0] * len(plan.steps)
+        self.possible = [0] * len(plan.steps)
+        self._rescore(range(len(plan.steps)))
+
+    def update(self, changes, rules, revision=None):
+        """Apply changed fields and return a ScoringUpdate. ``None`` removes a field.
+
+        With ``revision``, the changes apply only if the state is still at
+        that revision; otherwise RevisionConflict is raised and nothing
+        changes. The check and the update are one step under the lock, so
+        of two updates based on the same revision exactly one applies.
+        """
+        with self._lock:
+            if revision is not None and revision != self.revision:
+                raise RevisionConflict(revision, self.revision)
+            plan = get_scoring_plan(rules)
+            if plan is not self.plan:
+                # Rules were reloaded, so every cached contribution is stale
+                self._build(plan)
+
+            dirty = set()
+            owner2_changed = decline_changed = False
+            for key, value in changes.items():
+                if value is None:
+                    self.inputs.pop(key, None)
+                else:
+                    self.inputs[key] = value
+                dirty.update(self.steps_by_key.get(key, ()))
+                if key == OWNER2_TRIGGER_FIELD or key.startswith("owner2_"):
+                    owner2_changed = True
+                if key in AUTO_DECLINE_FIELDS:
+                    decline_changed = True
+                if key == "business_start_date":
+                    dirty.update(self.years_steps)
+
+            if owner2_changed:
+                owner2_included = include_owner2(self.inputs)
+                if owner2_included != self.owner2_included:
+                    self.owner2_included = owner2_included
+                    dirty.update(self.owner2_steps)
+
+            if decline_changed:
+                self.decline_reasons = auto_decline_reasons(self.inputs)
+
+            self._rescore(sorted(dirty))
+            self.revision += 1
+            return ScoringUpdate(self.revision, self.result(), dict(self.inputs))
+
+    def _rescore(self, indexes):
+        steps = self.plan.steps
+        inputs = self.inputs
+        for index in indexes:
+            key, weight, is_owner2, derives_years, score_field = steps[index]
+            if is_owner2 and not self.owner2_included:
+                self.points[index] = 0
+                self.possible[index] = 0
+                continue
+
+            value = inputs.get(key)
+            if derives_years and not value and "business_start_date" in inputs:
+                value = calculate_years_in_business(inputs["business_start_date"])
+
+            multiplier, count = score_field(value)
+            self.points[index] = weight * multiplier
+            self.possible[index] = weight * count
+
+    def result(self):
+        """Score dict in the same shape as ``calculate_score``"""
+        # Re-summing in plan order keeps totals identical to a full rescore
+        score = sum(self.points)
+        max_score = sum(self.possible)
+        reasons = list(self.decline_reasons)
+
+        normalized = round((score / max_score) * 100, 2) if max_score else 0
+        if reasons:
+            normalized = 0
+
+        return {
+            "total_score": normalized,
+            "raw_score": round(score, 2),
+            "max_possible": max_score,
+            "auto_decline": len(reasons) > 0,
+            "decline_reasons": reasons
+        }
+
+
+class ScoringStateStore:
+    """Bounded, expiring in-process store of ScoringState objects"""
+
+    def __init__(self, max_states=1000, ttl=1800):
+        self.max_states = max_states
+        self.ttl = ttl
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, state_id):
+        with self._lock:
+            entry = self._states.get(state_id)
+            if entry is None:
+                return None
+            state, touched = entry
+            if time.time() - touched > self.ttl:
+                del self._states[state_id]
+                return None
+            self._states[state_id] = (state, time.time())
+            self._states.move_to_end(state_id)
+            return state
+
+    def create(self, rules):
+        state_id = secrets.token_urlsafe(16)
+        state = ScoringState(rules)
+        with self._lock:
+            self._states[state_id] = (state, time.time())
+            while len(self._states) > self.max_states:
+                self._states.popitem(last=False)
+        return state_id, state
+
+    def discard(self, state_id):
+        with self._lock:
+            self._states.pop(state_id, None)
@@ -0,0 +1,225 @@
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+
+from app.utils.log_writer import DATA_DIR, underwriting_log
+
+ANALYTICS_PATH = os.path.join(DATA_DIR, 'underwriting_analytics.json')
+# Save the statistics after this many new log entries
+CHECKPOINT_EVERY = 1000
+
+
+def _empty_stats():
+    return {
+        "entries": 0,
+        "score_sum": 0.0,
+        "score_squares": 0.0,
+        "score_min": None,
+        "score_max": None,
+        # field -> entries with a non-blank string value
+        "field_frequency": {},
+        # field -> sum and number of its numeric values
+        "field_totals": {},
+        "field_counts": {},
+    }
+
+
+class IncrementalLogReader:
+    """Base for state folded in from the underwriting log as it grows.
+
+    Entries appended by any worker are passed to ``_add`` once, in order,
+    and the state is checkpointed with the ``(segment, byte offset)`` it
+    covers, so each read decodes only what was appended since the last one.
+    Subclasses provide ``_reset``, ``_add``, ``_state`` and ``_restore``.
+    """
+
+    def __init__(self, log=underwriting_log, checkpoint_path=None,
+                 checkpoint_every=CHECKPOINT_EVERY):
+        self.log = log
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        # (segment base, offset) of the first byte not yet folded in
+        self._position = None
+        self._loaded = False
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """Clear the folded-in state"""
+        raise NotImplementedError
+
+    def _add(self, entry, segment):
+        """Fold in one log entry, read from ``segment``"""
+        raise NotImplementedError
+
+    def _state(self):
+        """The folded-in state as a JSON-serializable dict"""
+        raise NotImplementedError
+
+    def _restore(self, state):
+        """Load a dict saved by ``_state``; raise on anything unexpected"""
+        raise NotImplementedError
+
+    def _caught_up(self):
+        """Called with the lock held after each catch-up"""
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            base, offset = checkpoint["position"]
+            self._restore(checkpoint)
+            self._position = (int(base), int(offset))
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError, AttributeError):
+            logging.warning("Ignoring unreadable checkpoint %s", self.checkpoint_path)
+            self._position = None
+            self._reset()
+
+    def _consume(self, segment, offset, last):
+        """Fold in the complete lines of ``segment`` from ``offset``;
+        return the offset reached"""
+        try:
+            f = open(segment.path, 'rb')
+        except FileNotFoundError:
+            return offset
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    if last:
+                        break  # An entry still being written
+                    # A line cut short by a crash; the writer has moved on
+                else:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        entry = None
+                    if isinstance(entry, dict):
+                        self._add(entry, segment)
+                        self._pending += 1
+                offset += len(line)
+        return offset
+
+    def catch_up(self):
+        """Fold in the entries appended to the log since the last read"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            segments = self.log.segments()
+            if self._position is not None:
+                base, offset = self._position
+                current = next((segment for segment in segments if segment.base == base), None)
+                try:
+                    replaced = current is None or os.path.getsize(current.path) < offset
+                except FileNotFoundError:
+                    replaced = True
+                if replaced:
+                    # The log was replaced; rebuild from its start
+                    self._position = None
+                    self._reset()
+            for position, segment in enumerate(segments):
+                if self._position is not None and segment.base < self._position[0]:
+                    continue
+                offset = self._position[1] if self._position and segment.base == self._position[0] else 0
+                offset = self._consume(segment, offset, last=position == len(segments) - 1)
+                self._position = (segment.base, offset)
+            self._caught_up()
+            if self._pending >= self.checkpoint_every:
+                self._checkpoint()
+
+    def _checkpoint(self):
+        temp_path = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        # dumps, unlike dump, encodes in C
+        data = json.dumps({"position": list(self._position), **self._state()})
+        with open(temp_path, 'w') as f:
+            f.write(data)
+        os.replace(temp_path, self.checkpoint_path)
+        self._pending = 0
+
+    def checkpoint(self):
+        with self._lock:
+            if self._pending and self._position is not None:
+                self._checkpoint()
+
+
+class LogAnalytics(IncrementalLogReader):
+    """Running statistics over the underwriting log.
+
+    The statistics (entry count, score moments, per-field string
+    frequencies and numeric sums) are folded in as entries are appended, so
+    reports cost the same however large the log grows.
+    """
+
+    def __init__(self, log=underwriting_log, checkpoint_path=ANALYTICS_PATH,
+                 checkpoint_every=CHECKPOINT_EVERY):
+        super().__init__(log, checkpoint_path, checkpoint_every)
+
+    def _reset(self):
+        self._stats = _empty_stats()
+
+    def _state(self):
+        return {"stats": self._stats}
+
+    def _restore(self, state):
+        stats = state["stats"]
+        if set(stats) != set(_empty_stats()):
+            raise KeyError("stats")
+        self._stats = stats
+
+    def _add(self, entry, segment):
+        stats = self._stats
+        score = entry.get("score")
+        total = score.get("total_score", 0) if isinstance(score, dict) else 0
+        if not isinstance(total, (int, float)) or not math.isfinite(total):
+            total = 0
+        stats["entries"] += 1
+        stats["score_sum"] += total
+        stats["score_squares"] += total * total
+        stats["score_min"] = total if stats["score_min"] is None else min(stats["score_min"], total)
+        stats["score_max"] = total if stats["score_max"] is None else max(stats["score_max"], total)
+
+        input_data = entry.get("input")
+        if not isinstance(input_data, dict):
+            return
+        frequency, totals, counts = stats["field_frequency"], stats["field_totals"], stats["field_counts"]
+        for key, value in input_data.items():
+            if isinstance(value, (int, float)):
+                totals[key] = totals.get(key, 0.0) + float(value)
+                counts[key] = counts.get(key, 0) + 1
+            elif isinstance(value, str) and value.strip():
+                frequency[key] = frequency.get(key, 0) + 1
+
+    def snapshot(self):
+        """Entry count, score mean, deviation and range, per-field string
+        frequencies and numeric averages, over the whole log"""
+        self.catch_up()
+        with self._lock:
+            stats = self._stats
+            entries = stats["entries"]
+            mean = stats["score_sum"] / entries if entries else 0
+            variance = max(0.0, stats["score_squares"] / entries - mean * mean) if entries else 0
+            return {
+                "entries": entries,
+                "average_score": mean,
+                "score_std_dev": math.sqrt(variance),
+                "score_min": stats["score_min"],
+                "score_max": stats["score_max"],
+                "field_frequency": dict(stats["field_frequency"]),
+                "field_averages": {
+                    field: total / stats["field_counts"][field] if stats["field_counts"][field] else 0
+                    for field, total in stats["field_totals"].items()
+                },
+            }
+
+
+# Global instance
+log_analytics = LogAnalytics()
+atexit.register(log_analytics.checkpoint)
@@ -0,0 +1,229 @@
+import base64
+import hashlib
+import json
+import math
+import os
+import struct
+from datetime import datetime, timezone
+from functools import cached_property
+
+# Tiers as stored in field records; anything else is NO_TIER
+TIERS = ("low", "moderate", "high", "super_high")
+NO_TIER = 255
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Entries are timestamped before they are written, so a segment can hold
+# entries up to this many seconds older than the ones before it
+CLOCK_SLACK = 120
+
+
+def field_hash(value):
+    """64-bit hash of a string field; 0 stands for a missing value"""
+    if value is None or value == "":
+        return 0
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'little') or 1
+
+
+def _normalize(value):
+    return str(value).strip().lower() if value is not None else None
+
+
+def _unix_time(value):
+    """Unix time of an ISO timestamp; naive timestamps are UTC, as in the log"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class UnderwritingFields:
+    """Per-entry field records kept next to each underwriting log segment.
+
+    A record is the entry's byte offset, unix time, total score, tier and
+    hashes of its user, source and industry. Entries logged before
+    scorecard entries carried a ``source`` are recorded as ``"scorecard"``.
+    """
+
+    record = struct.Struct('<QdfBQQQ')
+
+    @cached_property
+    def dtype(self):
+        # Built on the first query; writing records needs only ``record``
+        import numpy as np
+        return np.dtype([
+            ('offset', '<u8'),
+            ('time', '<f8'),
+            ('score', '<f4'),
+            ('tier', 'u1'),
+            ('user', '<u8'),
+            ('source', '<u8'),
+            ('industry', '<u8'),
+        ])
+
+    def summarize(self, entry):
+        """Every field of the record but the offset"""
+        try:
+            unix_time = _unix_time(entry["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            unix_time = math.nan
+        score = entry.get("score")
+        total = score.get("total_score") if isinstance(score, dict) else None
+        try:
+            total = float(total)
+        except (TypeError, ValueError):
+            total = math.nan
+        tier = entry.get("tier")
+        data = entry.get("input")
+        industry = data.get("industry_type") if isinstance(data, dict) else None
+        return (
+            unix_time,
+            total,
+            TIERS.index(tier) if tier in TIERS else NO_TIER,
+            field_hash(entry.get("user_id")),
+            field_hash(_normalize(entry.get("source") or "scorecard")),
+            field_hash(_normalize(industry)),
+        )
+
+    def read(self, segment):
+        """The segment's records as a structured array, complete records only"""
+        import numpy as np
+
+        try:
+            size = os.path.getsize(segment.fields_path)
+        except FileNotFoundError:
+            return np.empty(0, self.dtype)
+        count = size // self.dtype.itemsize
+        if not count:
+            return np.empty(0, self.dtype)
+        return np.memmap(segment.fields_path, self.dtype, 'r', shape=(count,))
+
+
+underwriting_fields = UnderwritingFields()
+
+
+def parse_filters(args):
+    """Validated filters from request arguments; raises ValueError"""
+    filters = {}
+    for key in ("user_id", "source", "industry"):
+        value = args.get(key)
+        if value not in (None, ""):
+            filters[key] = value if key == "user_id" else _normalize(value)
+    tier = args.get("tier")
+    if tier:
+        if tier not in TIERS:
+            raise ValueError(f"tier must be one of: {', '.join(TIERS)}")
+        filters["tier"] = tier
+    for key in ("min_score", "max_score"):
+        value = args.get(key)
+        if value not in (None, ""):
+            try:
+                filters[key] = float(value)
+            except ValueError:
+                raise ValueError(f"{key} must be a number")
+    for key in ("start", "end"):
+        value = args.get(key)
+        if value:
+            try:
+                filters[key] = _unix_time(value)
+            except ValueError:
+                raise ValueError(f"{key} must be an ISO 8601 timestamp")
+    return filters
+
+
+def _fingerprint(filters):
+    return hashlib.blake2b(json.dumps(filters, sort_keys=True).encode(), digest_size=6).hexdigest()
+
+
+def encode_cursor(before, filters):
+    token = json.dumps([before, _fingerprint(filters)]).encode()
+    return base64.urlsafe_b64encode(token).decode().rstrip('=')
+
+
+def decode_cursor(cursor, filters):
+    """The entry number a cursor continues before; raises ValueError"""
+    try:
+        before, fingerprint = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        before = int(before)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if fingerprint != _fingerprint(filters):
+        raise ValueError("Cursor was issued for different filters")
+    return before
+
+
+def _match(records, filters):
+    import numpy as np
+
+    mask = np.ones(len(records), bool)
+    if "user_id" in filters:
+        mask &= records['user'] == field_hash(filters["user_id"])
+    if "source" in filters:
+        mask &= records['source'] == field_hash(filters["source"])
+    if "industry" in filters:
+        mask &= records['industry'] == field_hash(filters["industry"])
+    if "tier" in filters:
+        mask &= records['tier'] == TIERS.index(filters["tier"])
+    if "min_score" in filters:
+        mask &= records['score'] >= filters["min_score"]
+    if "max_score" in filters:
+        mask &= records['score'] <= filters["max_score"]
+    if "start" in filters:
+        mask &= records['time'] >= filters["start"]
+    if "end" in filters:
+        mask &= records['time'] < filters["end"]
+    return mask
+
+
+def query_log(log, filters, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of matching entries, newest first.
+
+    Filters are applied to the segments' field records, newest segment
+    first, and only the entries on the page are read and decoded. Returns
+    ``{"entries", "count", "next_cursor"}``; each entry gets its entry
+    number as ``log_id``. ``next_cursor`` is None on the last page.
+    """
+    import numpy as np
+
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    before = decode_cursor(cursor, filters) if cursor else None
+    fields = log.fields
+    segments = log.segments()
+    log.ensure_fields(segments)
+
+    # (segment, numbers, offsets) of the hits, newest first; one hit more
+    # than the page tells whether another page follows
+    hits, found = [], 0
+    for segment in reversed(segments):
+        if found > limit:
+            break
+        if before is not None and segment.base >= before:
+            continue
+        records = fields.read(segment)
+        if before is not None:
+            records = records[:before - segment.base]
+        if not len(records):
+            continue
+        positions = np.flatnonzero(_match(records, filters))[::-1][:limit + 1 - found]
+        if len(positions):
+            hits.append((segment, positions + segment.base, records['offset'][positions]))
+            found += len(positions)
+        times = records['time']
+        if "start" in filters and times[~np.isnan(times)].max(initial=-np.inf) < filters["start"] - CLOCK_SLACK:
+            break  # Older segments were all written before the window
+
+    entries, last = [], None
+    for segment, numbers, offsets in hits:
+        take = min(len(numbers), limit - len(entries))
+        if take <= 0:
+            break
+        for number, entry in zip(numbers[:take], segment.read_at(offsets[:take].tolist())):
+            if entry is not None:
+                entry["log_id"] = int(number)
+                entries.append(entry)
+            last = int(number)
+    return {
+        "entries": entries,
+        "count": len(entries),
+        "next_cursor": encode_cursor(last, filters) if found > limit else None,
+    }
@@ -0,0 +1,387 @@
+import atexit
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from app.utils.log_query import underwriting_fields
+from app.utils.metrics import metrics
+from app.utils.segmented_log import SegmentedLog
+
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'logs')
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+
+UNDERWRITING_LOG_DIR = os.path.join(LOG_DIR, 'underwriting')
+# The single-file log used before segmentation; adopted as the first segment
+LEGACY_UNDERWRITING_LOG_PATH = os.path.join(LOG_DIR, 'underwriting_data.jsonl')
+AUDIT_LOG_PATH = os.path.join(LOG_DIR, 'audit.log')
+USAGE_LOG_PATH = os.path.join(DATA_DIR, 'api_usage.jsonl')
+# The JSON array of billing records used before the usage ledger; imported once
+LEGACY_USAGE_PATH = os.path.join(DATA_DIR, 'api_usage.json')
+TRACE_LOG_PATH = os.path.join(LOG_DIR, 'traces.jsonl')
+
+# Sink names
+UNDERWRITING_LOG = "underwriting"
+AUDIT_LOG = "audit"
+USAGE_LOG = "usage"
+TRACE_LOG = "traces"
+
+# fsync policies, weakest first: never (leave it to the OS), at most every
+# ``fsync_interval`` seconds, or after every batch written
+FSYNC_NONE = "none"
+FSYNC_INTERVAL = "interval"
+FSYNC_BATCH = "batch"
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_INTERVAL, FSYNC_BATCH)
+
+# What write() does when the queue is full: count the entries as dropped,
+# or write them from the calling thread so none are lost
+DROP = "drop"
+WRITE_THROUGH = "write_through"
+
+_STOP = object()
+
+FLUSH_SECONDS = metrics.histogram(
+    'log_writer_flush_seconds', 'Time to append one batch of queued entries to a log', ('sink',))
+
+
+def adopt_legacy_json(path, legacy_path):
+    """Append the records of ``legacy_path``, a JSON array the JSONL file at
+    ``path`` replaced, then rename it to ``*.migrated``.
+
+    Records are appended rather than prepended so offsets already read by
+    incremental readers stay valid. A ``flock`` on ``path`` makes sure only
+    one process imports them. Returns the number of records imported.
+    """
+    if not os.path.exists(legacy_path):
+        return 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            with open(legacy_path) as f:
+                records = json.load(f)
+        except FileNotFoundError:
+            return 0  # Another process imported it first
+        except ValueError:
+            logging.warning("Not migrating unreadable %s", legacy_path)
+            return 0
+        if not isinstance(records, list):
+            logging.warning("Not migrating %s: not a JSON array", legacy_path)
+            return 0
+        records = [record for record in records if isinstance(record, dict)]
+        view = memoryview(''.join(json.dumps(record) + '\n' for record in records).encode())
+        while view:
+            view = view[os.write(fd, view):]
+        os.fsync(fd)
+        os.replace(legacy_path, legacy_path + '.migrated')
+        if records:
+            logging.info("Migrated %d records from %s", len(records), legacy_path)
+        return len(records)
+    finally:
+        os.close(fd)
+
+
+class LogSink:
+    """One append-only JSONL file. Written by the writer thread, or by a
+    request thread when the queue is full and the sink is write-through."""
+
+    def __init__(self, name, path, fsync=FSYNC_INTERVAL, on_full=DROP, legacy_path=None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}' for log '{name}'")
+        self.name = name
+        self.path = path
+        # A JSON array file this sink replaced, imported before the first write
+        self.legacy_path = legacy_path
+        self.fsync = fsync
+        self.on_full = on_full
+        self.written = 0
+        self.written_through = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self._fd = None
+        self._dirty = False
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def encode(self, entries):
+        """``(data, summaries)`` for ``entries``; plain files keep no summaries"""
+        return ''.join(json.dumps(entry) + '\n' for entry in entries).encode(), None
+
+    def _write(self, data, count, summaries):
+        """Append encoded lines with a single write so concurrent writers,
+        including other worker processes, never interleave inside a line"""
+        if self._fd is None:
+            if self.legacy_path:
+                adopt_legacy_json(self.path, self.legacy_path)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._fd, view):]
+
+    def _fsync(self):
+        os.fsync(self._fd)
+
+    def _close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def append(self, data, count, summaries=None):
+        with self._lock:
+            self._write(data, count, summaries)
+            self.written += count
+            self.batches += 1
+            self._dirty = True
+            if self.fsync == FSYNC_BATCH:
+                self._sync()
+
+    def sync_if_due(self, interval):
+        with self._lock:
+            if self.fsync == FSYNC_INTERVAL and time.monotonic() - self._last_sync >= interval:
+                self._sync()
+
+    def _sync(self):
+        if self._dirty:
+            self._fsync()
+            self.fsyncs += 1
+            self._dirty = False
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self.fsync != FSYNC_NONE:
+                self._sync()
+            self._close()
+
+    def stats(self):
+        return {
+            "path": os.path.normpath(self.path),
+            "fsync": self.fsync,
+            "written": self.written,
+            "written_through": self.written_through,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "batches": self.batches,
+            "fsyncs": self.fsyncs
+        }
+
+
+class SegmentedLogSink(LogSink):
+    """A sink appending to a rotated, indexed SegmentedLog"""
+
+    def __init__(self, name, log, fsync=FSYNC_INTERVAL, on_full=DROP):
+        super().__init__(name, log.directory, fsync, on_full)
+        self.log = log
+
+    def encode(self, entries):
+        """Summarize the entries for the log's field records while the
+        request thread still has them, so the writer never decodes"""
+        data, _ = super().encode(entries)
+        if not self.log.fields:
+            return data, None
+        return data, [self.log.fields.summarize(entry) for entry in entries]
+
+    def _write(self, data, count, summaries):
+        self.log.append(data, count, summaries)
+
+    def _fsync(self):
+        self.log.fsync()
+
+    def _close(self):
+        self.log.close()
+
+
+class LogWriter:
+    """Asynchronous writer shared by every JSONL log.
+
+    ``write`` encodes entries in the calling thread and puts them on a
+    bounded queue. A single writer thread takes everything queued at once
+    and commits it with one write per sink, then fsyncs according to each
+    sink's policy, so many requests share one disk write (group commit).
+    """
+
+    def __init__(self, max_queue=10000, max_batch=2000, fsync_interval=1.0):
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.fsync_interval = fsync_interval
+        self._sinks = {}
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A forked worker inherits the queue and locks but not the writer
+        # thread; the lock may even have been held at the moment of the fork
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(self.max_queue)
+        self._thread = None
+        self._pid = None
+        for sink in self._sinks.values():
+            sink._lock = threading.Lock()
+
+    def register(self, name, path, fsync=FSYNC_INTERVAL, on_full=DROP, legacy_path=None):
+        """Add a sink writing to ``path``, a file or a SegmentedLog.
+
+        ``LOG_FSYNC_POLICY_<NAME>`` in the environment overrides ``fsync``
+        for this sink. ``LOG_FSYNC_POLICY`` applies to every sink but only
+        where it is stricter, so it never weakens the billing sink. The
+        records of a JSON array file at ``legacy_path`` are imported into a
+        file sink once, before its first write.
+        """
+        if 'LOG_FSYNC_POLICY' in os.environ:
+            fsync = max(fsync, os.environ['LOG_FSYNC_POLICY'], key=FSYNC_POLICIES.index)
+        fsync = os.environ.get(f'LOG_FSYNC_POLICY_{name.upper()}', fsync)
+        if isinstance(path, SegmentedLog):
+            sink = SegmentedLogSink(name, path, fsync, on_full)
+        else:
+            sink = LogSink(name, path, fsync, on_full, legacy_path)
+        self._sinks[name] = sink
+        return sink
+
+    def write(self, name, entry):
+        self.write_many(name, [entry])
+
+    def write_many(self, name, entries):
+        """Queue ``entries`` for the ``name`` sink without touching the disk"""
+        if not entries:
+            return
+        sink = self._sinks[name]
+        data, summaries = sink.encode(entries)
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((sink, data, len(entries), summaries))
+        except queue.Full:
+            if sink.on_full == WRITE_THROUGH:
+                try:
+                    sink.append(data, len(entries), summaries)
+                    sink.written_through += len(entries)
+                    return
+                except Exception:
+                    logging.exception("Error writing %s log", name)
+            with self._lock:
+                sink.dropped += len(entries)
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        pending = self._queue
+        while True:
+            try:
+                item = pending.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                self._sync_due()
+                continue
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self._commit(batch):
+                    return
+            except Exception:
+                # Whatever went wrong, the thread must live on for the next batch
+                logging.exception("Log writer failed to commit a batch")
+
+    def _commit(self, batch):
+        """Write one batch; return True if it asked the writer to stop"""
+        grouped = {}
+        waiters = []
+        stop = False
+        for item in batch:
+            if item is _STOP:
+                stop = True
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            else:
+                sink, data, count, summaries = item
+                grouped.setdefault(sink, []).append((data, count, summaries))
+
+        try:
+            for sink, parts in grouped.items():
+                count = sum(part[1] for part in parts)
+                start = time.perf_counter()
+                try:
+                    summaries = None
+                    if parts[0][2] is not None:
+                        summaries = [summary for part in parts for summary in part[2]]
+                    sink.append(b''.join(part[0] for part in parts), count, summaries)
+                    FLUSH_SECONDS.observe(time.perf_counter() - start, sink=sink.name)
+                except Exception:
+                    sink.errors += count
+                    logging.exception("Error writing %s log", sink.name)
+            self._sync_due()
+        finally:
+            for waiter in waiters:
+                waiter.set()
+        return stop
+
+    def _sync_due(self):
+        for sink in self._sinks.values():
+            try:
+                sink.sync_if_due(self.fsync_interval)
+            except Exception:
+                logging.exception("Error syncing %s log", sink.name)
+
+    def flush(self, timeout=5.0):
+        """Wait until everything queued before this call has been written"""
+        if self._pid != os.getpid():
+            return True
+        # Entries may be waiting behind a writer thread that has died
+        self._ensure_thread()
+        done = threading.Event()
+        self._queue.put(done, timeout=timeout)
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Write everything queued, stop the writer thread and sync every sink"""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.put(_STOP, timeout=timeout)
+            self._thread.join(timeout)
+            self._pid = None
+        for sink in self._sinks.values():
+            try:
+                sink.close()
+            except OSError:
+                logging.exception("Error closing %s log", sink.name)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "running": self._pid == os.getpid() and self._thread.is_alive(),
+            "sinks": {name: sink.stats() for name, sink in self._sinks.items()}
+        }
+
+
+# Global instances
+underwriting_log = SegmentedLog(UNDERWRITING_LOG_DIR, legacy_path=LEGACY_UNDERWRITING_LOG_PATH,
+                                fields=underwriting_fields)
+
+log_writer = LogWriter()
+log_writer.register(UNDERWRITING_LOG, underwriting_log, FSYNC_INTERVAL, WRITE_THROUGH)
+log_writer.register(AUDIT_LOG, AUDIT_LOG_PATH, FSYNC_INTERVAL, DROP)
+# Billing records are never dropped and reach the disk with every batch
+log_writer.register(USAGE_LOG, USAGE_LOG_PATH, FSYNC_BATCH, WRITE_THROUGH, legacy_path=LEGACY_USAGE_PATH)
+# Sampled request traces are diagnostics: never synced, dropped when behind
+log_writer.register(TRACE_LOG, TRACE_LOG_PATH, FSYNC_NONE, DROP)
+atexit.register(log_writer.close)
+metrics.gauge('log_writer_queue_depth', 'Writes queued for the log writer thread',
+              function=lambda: log_writer._queue.qsize())
@@ -0,0 +1,409 @@
+"""In-process metrics exported in the Prometheus text format.
+
+Each worker process keeps its counters, gauges and histograms in memory.
+Once the app calls ``enable_persistence``, it also writes a snapshot of them
+to ``METRICS_DIR`` at most every ``flush_interval`` seconds and at exit.
+``render``, served on ``/metrics``, merges the snapshots of every worker:
+counters and histograms are summed, over exited workers too, and gauges
+over the live ones. Without persistence, as for scripts and tests that
+only import instrumented modules, nothing is written and ``render`` shows
+this process alone.
+
+    python -m app.utils.metrics http://127.0.0.1:5000/metrics  # scrape and check
+"""
+import atexit
+import fcntl
+import json
+import math
+import os
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR', os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'metrics'))
+# Seconds between snapshots of a worker's metrics
+METRICS_FLUSH_INTERVAL = 5.0
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds in seconds: request latencies, and calls taking microseconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CALL_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+ARCHIVE_FILE = 'archive.json'
+LOCK_FILE = '.lock'
+
+
+class Metric:
+    """One named metric; its samples are keyed by label values"""
+
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {', '.join(self.labelnames) or '(none)'}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def samples(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def describe(self):
+        return {"type": self.kind, "help": self.help, "labels": list(self.labelnames)}
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down; ``function``, if given, is called
+    for the value when a snapshot is taken"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, labelnames=(), function=None):
+        super().__init__(name, help, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.function is not None:
+            return [[[], self.function()]]
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._values.get(key)
+            if sample is None:
+                # Per-bucket counts (the last one is +Inf), sum
+                sample = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            sample[0][index] += 1
+            sample[1] += value
+
+    def samples(self):
+        with self._lock:
+            return [[list(key), [list(counts), total]] for key, (counts, total) in self._values.items()]
+
+    def describe(self):
+        return {**super().describe(), "buckets": list(self.buckets)}
+
+    def time(self, **labels):
+        """Decorator observing the duration of each call, in seconds"""
+        def decorator(f):
+            @wraps(f)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            return timed
+        return decorator
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _add(kind, into, value):
+    """Sum a sample value into another of the same metric"""
+    if kind == 'histogram':
+        counts, total = into
+        return [[a + b for a, b in zip(counts, value[0])], total + value[1]]
+    return into + value
+
+
+def _merge(merged, snapshot, gauges):
+    """Sum the samples of ``snapshot`` into ``merged``, gauges only if asked"""
+    for name, metric in snapshot.items():
+        if metric["type"] == 'gauge' and not gauges:
+            continue
+        target = merged.setdefault(name, {**metric, "samples": {}})
+        if target["type"] != metric["type"] or target.get("buckets") != metric.get("buckets"):
+            continue  # Redefined since that snapshot was taken
+        for labels, value in metric["samples"]:
+            key = tuple(labels)
+            existing = target["samples"].get(key)
+            target["samples"][key] = value if existing is None else _add(metric["type"], existing, value)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render_text(merged):
+    """Prometheus text exposition of merged snapshots"""
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        names = metric["labels"]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for key in sorted(metric["samples"]):
+            value = metric["samples"][key]
+            if metric["type"] != 'histogram':
+                lines.append(f"{name}{_labels(names, key)} {_format_value(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(list(metric["buckets"]) + [math.inf], counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(names, key, [('le', _format_value(float(bound)))])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, key)} {_format_value(total)}")
+            lines.append(f"{name}_count{_labels(names, key)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsRegistry:
+    """The metrics of this process, and their merge across processes"""
+
+    def __init__(self, directory=METRICS_DIR, flush_interval=METRICS_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushed_at = 0.0
+        self._file = None
+        self._persistent = False
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A worker counts from zero; the parent's values are the parent's
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._file = None
+        self._flushed_at = 0.0
+        for metric in self._metrics.values():
+            metric._reset()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already a {metric.kind}")
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=(), function=None):
+        return self._register(Gauge, name, help, labelnames, function)
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help, labelnames, buckets)
+
+    def snapshot(self):
+        return {
+            name: {**metric.describe(), "samples": metric.samples()}
+            for name, metric in list(self._metrics.items())
+        }
+
+    def _snapshot_path(self):
+        if self._file is None:
+            # The token keeps a reused pid from overwriting an exited
+            # worker's snapshot before it is archived
+            self._file = f"{os.getpid()}-{secrets.token_hex(4)}.json"
+        return os.path.join(self.directory, self._file)
+
+    def enable_persistence(self):
+        """Write snapshots from now on, and a last one at exit"""
+        if not self._persistent:
+            self._persistent = True
+            atexit.register(self.close)
+
+    def flush(self):
+        """Write this process's snapshot, if persistence is enabled"""
+        with self._flush_lock:
+            self._flushed_at = time.monotonic()
+            if not self._persistent or not self._metrics:
+                return
+            path = self._snapshot_path()
+            data = json.dumps({"pid": os.getpid(), "metrics": self.snapshot()})
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'w') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+    def maybe_flush(self):
+        """Flush if the last snapshot is older than ``flush_interval``"""
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def close(self):
+        """Write the final snapshot of this process"""
+        try:
+            self.flush()
+        except OSError:
+            pass
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_archive(self, archive):
+        path = os.path.join(self.directory, ARCHIVE_FILE)
+        with open(f"{path}.tmp", 'w') as f:
+            f.write(json.dumps(archive))
+        os.replace(f"{path}.tmp", path)
+
+    def collect(self):
+        """Merged metrics of every process, as rendered by ``render_text``.
+
+        Snapshots of exited processes are folded into the archive, so their
+        counts outlive them; the archive lists the snapshots it holds until
+        they are deleted, so a crash between the two counts nothing twice.
+        """
+        merged = {}
+        if not self._persistent:
+            _merge(merged, self.snapshot(), gauges=True)
+            return merged
+        self.flush()
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive = self._read(os.path.join(self.directory, ARCHIVE_FILE)) or {"folded": [], "metrics": {}}
+            names = sorted(name for name in os.listdir(self.directory)
+                           if name.endswith('.json') and name != ARCHIVE_FILE)
+            folded = set(archive["folded"]) & set(names)
+            exited = []
+            for name in names:
+                if name in folded:
+                    continue
+                snapshot = self._read(os.path.join(self.directory, name))
+                if snapshot is None:
+                    continue
+                if _pid_alive(snapshot["pid"]):
+                    _merge(merged, snapshot["metrics"], gauges=True)
+                else:
+                    exited.append((name, snapshot))
+            if exited:
+                totals = {}
+                _merge(totals, archive["metrics"], gauges=False)
+                for name, snapshot in exited:
+                    _merge(totals, snapshot["metrics"], gauges=False)
+                archive = {
+                    "folded": sorted(folded | {name for name, _ in exited}),
+                    "metrics": {
+                        name: {**metric, "samples": [[list(key), value] for key, value in metric["samples"].items()]}
+                        for name, metric in totals.items()
+                    },
+                }
+                self._write_archive(archive)
+                for name, _ in exited:
+                    os.unlink(os.path.join(self.directory, name))
+            _merge(merged, archive["metrics"], gauges=False)
+        # Metrics with no samples yet are still listed
+        for name, metric in self._metrics.items():
+            merged.setdefault(name, {**metric.describe(), "samples": {}})
+        return merged
+
+    def render(self):
+        """All processes' metrics in the Prometheus text format"""
+        return render_text(self.collect())
+
+
+def parse_text(text):
+    """``{(name, labels): value}`` from a Prometheus text exposition; raises
+    ValueError on a malformed line or a sample of an undeclared metric"""
+    types = {}
+    samples = {}
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line or line.startswith('# HELP '):
+            continue
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ', 3)
+            types[name] = kind
+            continue
+        if line.startswith('#'):
+            continue
+        series, _, value = line.rpartition(' ')
+        name, _, labels = series.partition('{')
+        family = name
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and types.get(name[:-len(suffix)]) == 'histogram':
+                family = name[:-len(suffix)]
+        if family not in types:
+            raise ValueError(f"line {number}: sample of undeclared metric {name}")
+        try:
+            samples[(name, '{' + labels if labels else '')] = float(value)
+        except ValueError:
+            raise ValueError(f"line {number}: bad value {value!r}")
+    return samples
+
+
+# Global instance; the app enables its persistence
+metrics = MetricsRegistry()
+
+
+if __name__ == "__main__":
+    import sys
+    from urllib.request import urlopen
+
+    with urlopen(sys.argv[1] if len(sys.argv) > 1 else 'http://127.0.0.1:5000/metrics') as response:
+        scraped = parse_text(response.read().decode())
+    for (name, labels), value in sorted(scraped.items()):
+        print(f"{name}{labels} {_format_value(value)}")
@@ -1,3 +1,10 @@
+from app.utils.metrics import CALL_BUCKETS, metrics
+
+OFFERS_SECONDS = metrics.histogram(
+    'generate_loan_offers_seconds', 'Time spent pricing the offers of one application', buckets=CALL_BUCKETS)
+
+
+@OFFERS_SECONDS.time()
 def generate_loan_offers(score: float, input_data: dict = None) -> list[dict]:
     """
     Generate a list of recommended loan offers based on the applicant's
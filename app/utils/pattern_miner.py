@@ -0,0 +1,280 @@
+import atexit
+import heapq
+import os
+import time
+
+from app.utils.log_analytics import CHECKPOINT_EVERY, IncrementalLogReader
+from app.utils.log_writer import DATA_DIR, underwriting_log
+from app.utils.segmented_log import _unix_time
+
+PATTERNS_PATH = os.path.join(DATA_DIR, 'underwriting_patterns.json')
+# Entries scoring at least HIGH_SCORE are low risk, below LOW_SCORE high risk
+HIGH_SCORE = 70
+LOW_SCORE = 50
+# Counters per Space-Saving summary; any pattern in more than 1/SKETCH_CAPACITY
+# of the high- or low-scoring entries is guaranteed to be tracked
+SKETCH_CAPACITY = 256
+# Segments (one per day) kept apart for windowed queries; older ones are
+# merged into a single summary of the rest of history
+RECENT_DAYS = 30
+TOP_PATTERNS = 5
+# Fields blank in more than this share of entries are reported as missing
+MISSING_SHARE = 0.3
+
+
+class SpaceSaving:
+    """Frequent items of a stream in at most ``capacity`` counters.
+
+    Space-Saving (Metwally et al.): a new item beyond capacity takes over
+    the smallest counter and inherits its count as possible overestimate,
+    so each count is an upper bound at most ``error`` too high, and every
+    item seen more than ``total / capacity`` times holds a counter.
+    Summaries of different parts of a stream merge into a summary of the
+    whole with the same guarantee (Agarwal et al., Mergeable Summaries).
+    """
+
+    def __init__(self, capacity=SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.total = 0
+        # item -> [count, error]
+        self.counters = {}
+        # (count, item) heap over the counters, built on the first eviction.
+        # Increments do not update it, so an entry may be below its count.
+        self._heap = None
+
+    def add(self, item, count=1):
+        self.total += count
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+            if self._heap is not None:
+                heapq.heappush(self._heap, (count, item))
+        else:
+            minimum, victim = self._pop_min()
+            del self.counters[victim]
+            self.counters[item] = [minimum + count, minimum]
+            heapq.heappush(self._heap, (minimum + count, item))
+
+    def _pop_min(self):
+        if self._heap is None or len(self._heap) > 2 * self.capacity:
+            self._heap = [(counter[0], item) for item, counter in self.counters.items()]
+            heapq.heapify(self._heap)
+        heap = self._heap
+        while True:
+            count, item = heapq.heappop(heap)
+            counter = self.counters.get(item)
+            if counter is None:
+                continue
+            if counter[0] == count:
+                return count, item
+            # Stale: the item was counted since; requeue at its count
+            heapq.heappush(heap, (counter[0], item))
+
+    def _floor(self):
+        """Most an untracked item can have occurred"""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+
+    def merge(self, other):
+        """A summary of both streams, of the larger capacity"""
+        merged = SpaceSaving(max(self.capacity, other.capacity))
+        merged.total = self.total + other.total
+        floors = (self._floor(), other._floor())
+        combined = {}
+        for item in self.counters.keys() | other.counters.keys():
+            count = error = 0
+            for summary, floor in zip((self, other), floors):
+                counter = summary.counters.get(item)
+                if counter is None:
+                    count += floor
+                    error += floor
+                else:
+                    count += counter[0]
+                    error += counter[1]
+            combined[item] = [count, error]
+        kept = heapq.nlargest(merged.capacity, combined.items(), key=lambda pair: pair[1][0])
+        merged.counters = dict(kept)
+        return merged
+
+    def top(self, n):
+        """The ``n`` items with the highest counts, as ``(item, count)``"""
+        return [(item, counter[0]) for item, counter in
+                heapq.nlargest(n, self.counters.items(), key=lambda pair: (pair[1][0], -pair[1][1]))]
+
+    def to_dict(self):
+        return {
+            "capacity": self.capacity,
+            "total": self.total,
+            "counters": [[item, count, error] for item, (count, error) in self.counters.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls(int(data["capacity"]))
+        summary.total = int(data["total"])
+        summary.counters = {str(item): [int(count), int(error)] for item, count, error in data["counters"]}
+        return summary
+
+
+class PatternSummary:
+    """High- and low-score patterns and blank fields of a run of entries"""
+
+    def __init__(self, capacity=SKETCH_CAPACITY):
+        self.entries = 0
+        self.high = SpaceSaving(capacity)
+        self.low = SpaceSaving(capacity)
+        self.high_entries = 0
+        self.low_entries = 0
+        # field -> entries in which it was blank
+        self.missing = {}
+        # Timestamp of the newest entry
+        self.last_time = None
+
+    def add(self, entry):
+        try:
+            score = entry.get('score', {}).get('total_score', 0)
+            input_data = entry.get('input', {})
+            items = input_data.items()
+            high, low = score >= HIGH_SCORE, score < LOW_SCORE
+        except (AttributeError, TypeError):
+            return
+        self.entries += 1
+        timestamp = entry.get('timestamp')
+        if isinstance(timestamp, str) and (self.last_time is None or timestamp > self.last_time):
+            self.last_time = timestamp
+        missing = self.missing
+        for field, value in items:
+            if not value:
+                missing[field] = missing.get(field, 0) + 1
+        if high:
+            self.high_entries += 1
+            sketch = self.high
+        elif low:
+            self.low_entries += 1
+            sketch = self.low
+        else:
+            return
+        for field, value in items:
+            if value and isinstance(value, (str, int, float)):
+                sketch.add(f"{field}:{value}")
+
+    def merge(self, other):
+        merged = PatternSummary()
+        merged.entries = self.entries + other.entries
+        merged.high = self.high.merge(other.high)
+        merged.low = self.low.merge(other.low)
+        merged.high_entries = self.high_entries + other.high_entries
+        merged.low_entries = self.low_entries + other.low_entries
+        merged.missing = dict(self.missing)
+        for field, count in other.missing.items():
+            merged.missing[field] = merged.missing.get(field, 0) + count
+        times = [t for t in (self.last_time, other.last_time) if t is not None]
+        merged.last_time = max(times) if times else None
+        return merged
+
+    def to_dict(self):
+        return {
+            "entries": self.entries,
+            "high": self.high.to_dict(),
+            "low": self.low.to_dict(),
+            "high_entries": self.high_entries,
+            "low_entries": self.low_entries,
+            "missing": self.missing,
+            "last_time": self.last_time,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls()
+        summary.entries = int(data["entries"])
+        summary.high = SpaceSaving.from_dict(data["high"])
+        summary.low = SpaceSaving.from_dict(data["low"])
+        summary.high_entries = int(data["high_entries"])
+        summary.low_entries = int(data["low_entries"])
+        summary.missing = {str(field): int(count) for field, count in data["missing"].items()}
+        summary.last_time = data["last_time"]
+        return summary
+
+
+class PatternMiner(IncrementalLogReader):
+    """Most frequent field values of high- and low-scoring applications.
+
+    Each log segment (a day of entries) gets a fixed-size
+    ``PatternSummary``; segments older than ``recent_days`` are merged into
+    one summary of the rest of history, so memory stays bounded however
+    long the log grows. Queries merge the summaries of the window asked for.
+    """
+
+    def __init__(self, log=underwriting_log, checkpoint_path=PATTERNS_PATH,
+                 checkpoint_every=CHECKPOINT_EVERY, recent_days=RECENT_DAYS):
+        self.recent_days = recent_days
+        super().__init__(log, checkpoint_path, checkpoint_every)
+
+    def _reset(self):
+        # segment base -> summary of its entries, oldest first
+        self._segments = {}
+        self._history = PatternSummary()
+
+    def _state(self):
+        return {
+            "segments": [[base, summary.to_dict()] for base, summary in self._segments.items()],
+            "history": self._history.to_dict(),
+        }
+
+    def _restore(self, state):
+        self._segments = {int(base): PatternSummary.from_dict(summary) for base, summary in state["segments"]}
+        self._history = PatternSummary.from_dict(state["history"])
+
+    def _add(self, entry, segment):
+        summary = self._segments.get(segment.base)
+        if summary is None:
+            summary = self._segments[segment.base] = PatternSummary()
+        summary.add(entry)
+
+    def _caught_up(self):
+        # Fold segments that left the recent window into the history,
+        # always keeping the one being written
+        cutoff = time.time() - self.recent_days * 86400
+        for base in list(self._segments)[:-1]:
+            summary = self._segments[base]
+            if summary.last_time is None or _unix_time(summary.last_time) < cutoff:
+                self._history = self._history.merge(self._segments.pop(base))
+                self._pending += 1
+
+    def summary(self, window_days=None):
+        """Merged summary of the last ``window_days`` days (at segment
+        granularity, at most ``recent_days``), or of all history"""
+        self.catch_up()
+        with self._lock:
+            if window_days is None:
+                merged = self._history
+                summaries = self._segments.values()
+            else:
+                cutoff = time.time() - min(window_days, self.recent_days) * 86400
+                merged = PatternSummary()
+                summaries = [summary for summary in self._segments.values()
+                             if summary.last_time is not None and _unix_time(summary.last_time) >= cutoff]
+            for summary in summaries:
+                merged = merged.merge(summary)
+            return merged
+
+    def patterns(self, window_days=None, top=TOP_PATTERNS):
+        """Risk indicators and frequently blank fields, in the shape
+        ``generate_smart_questions`` takes"""
+        summary = self.summary(window_days)
+        threshold = summary.entries * MISSING_SHARE
+        return {
+            'high_risk_indicators': [item for item, _ in summary.low.top(top)],
+            'low_risk_indicators': [item for item, _ in summary.high.top(top)],
+            'missing_data_points': [field for field, count in summary.missing.items() if count > threshold],
+            'score_correlations': {},
+            'entries': summary.entries,
+        }
+
+
+# Global instance
+pattern_miner = PatternMiner()
+atexit.register(pattern_miner.checkpoint)
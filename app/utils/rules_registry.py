@@ -0,0 +1,201 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from app.utils.metrics import metrics
+from app.utils.scoring import get_scoring_plan, validate_rules
+
+RULES_PATH = os.path.join(os.path.dirname(__file__), '..', 'rules', 'finance.json')
+
+# Served if the rules file is missing or corrupt and nothing was loaded before
+FALLBACK_RULES = {
+    "Personal Credit Information": {},
+    "Business Information": {},
+    "Bank Analysis": {},
+    "Background & Verification": {},
+    "Online Presence & Digital Footprint": {},
+    "Collateral & Assets": {}
+}
+
+RULES_RELOADS = metrics.counter(
+    'rules_reloads_total', 'Loads of the rules file by outcome: loaded, invalid or unreadable', ('outcome',))
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+class RuleSet:
+    """An immutable, compiled snapshot of one published rules file"""
+
+    def __init__(self, rules, version, digest, published_at=None):
+        self.rules = rules
+        self.version = version
+        self.hash = digest
+        self.published_at = published_at
+        # Compile now so the first request after a swap does not pay for it
+        self.plan = get_scoring_plan(rules)
+
+    @property
+    def label(self):
+        """Version tag recorded on assessments, e.g. ``v3-1a2b3c4d5e6f``"""
+        return f"v{self.version}-{self.hash[:12]}"
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "hash": self.hash,
+            "label": self.label,
+            "published_at": self.published_at
+        }
+
+
+class RulesRegistry:
+    """Versioned access to the scoring rules file.
+
+    ``publish`` writes the rules and a ``.meta.json`` sidecar holding the
+    version number and content hash, each through a temp file and an atomic
+    rename, under a ``flock`` on a ``.lock`` file beside the rules so that
+    concurrent publishes from different workers get distinct versions.
+    ``current`` notices a new publish from any worker by comparing
+    the files' ``stat`` signatures, checked at most every ``check_interval``
+    seconds, and swaps in a freshly compiled RuleSet.
+    """
+
+    def __init__(self, rules_path=RULES_PATH, check_interval=1.0):
+        self.rules_path = rules_path
+        self.meta_path = os.path.splitext(rules_path)[0] + '.meta.json'
+        self.lock_path = os.path.splitext(rules_path)[0] + '.lock'
+        self.check_interval = check_interval
+        self._ruleset = None
+        self._signature = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def _stat_signature(self):
+        signature = []
+        for path in (self.rules_path, self.meta_path):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def current(self):
+        """Return the current RuleSet, reloading it if a new version was published"""
+        ruleset = self._ruleset
+        now = time.monotonic()
+        if ruleset is not None and now - self._checked_at < self.check_interval:
+            return ruleset
+
+        with self._lock:
+            self._checked_at = now
+            signature = self._stat_signature()
+            if self._ruleset is None or signature != self._signature:
+                self._load(signature)
+            return self._ruleset
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _load(self, signature):
+        try:
+            with open(self.rules_path, 'rb') as f:
+                content = f.read()
+            rules = json.loads(content)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logging.error("Error loading rules: %s", e)
+            RULES_RELOADS.inc(outcome='unreadable')
+            if self._ruleset is None:
+                self._ruleset = RuleSet(FALLBACK_RULES, 0, content_hash(b''))
+            self._signature = signature
+            return
+
+        digest = content_hash(content)
+        meta = self._read_meta()
+        if meta.get("hash") == digest:
+            version, published_at = meta.get("version", 0), meta.get("published_at")
+        else:
+            # Edited outside publish(): still identified by its hash
+            version, published_at = 0, None
+
+        try:
+            validate_rules(rules)
+            self._ruleset = RuleSet(rules, version, digest, published_at)
+            RULES_RELOADS.inc(outcome='loaded')
+        except ValueError:
+            RULES_RELOADS.inc(outcome='invalid')
+            logging.exception("Rules file failed to compile; keeping previous version")
+            if self._ruleset is None:
+                self._ruleset = RuleSet(FALLBACK_RULES, 0, content_hash(b''))
+        self._signature = signature
+
+    def publish(self, rules):
+        """Validate and atomically publish ``rules`` as the next version.
+
+        Raises ValueError if the rules do not compile. Returns the new RuleSet.
+        """
+        validate_rules(rules)
+        content = json.dumps(rules, indent=2).encode()
+        digest = content_hash(content)
+
+        with self._lock, self._publish_lock():
+            meta = self._read_meta()
+            meta = {
+                "version": meta.get("version", 0) + 1,
+                "hash": digest,
+                "published_at": datetime.utcnow().isoformat()
+            }
+            # Rules first: a reader that sees new rules with the old sidecar
+            # falls back to the hash, never to a wrong version number
+            self._atomic_write(self.rules_path, content)
+            self._atomic_write(self.meta_path, json.dumps(meta, indent=2).encode())
+
+            self._ruleset = RuleSet(rules, meta["version"], digest, meta["published_at"])
+            self._signature = self._stat_signature()
+            self._checked_at = time.monotonic()
+            return self._ruleset
+
+    @contextmanager
+    def _publish_lock(self):
+        """Serialize publishes across worker processes"""
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _atomic_write(path, content):
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+        try:
+            os.fchmod(fd, 0o644)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+
+# Global instance
+rules_registry = RulesRegistry()
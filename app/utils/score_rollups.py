@@ -0,0 +1,432 @@
+import atexit
+import math
+import os
+import time
+from bisect import bisect_right
+
+from app.utils.log_analytics import CHECKPOINT_EVERY, IncrementalLogReader
+from app.utils.log_query import TIERS, _normalize, _unix_time
+from app.utils.log_writer import DATA_DIR, underwriting_log
+
+ROLLUPS_PATH = os.path.join(DATA_DIR, 'score_rollups.json')
+
+HOUR = 3600
+DAY = 86400
+# Hourly buckets older than this many days are merged into daily ones
+HOURLY_DAYS = 7
+
+# Histogram bin edges per metric; values below the first edge or at or
+# above the last fall into the open-ended first and last bins
+METRIC_BINS = {
+    "total_score": (0, 10, 20, 30, 40, 50, 60, 70, 80, 90),
+    "offer_amount": (0, 5000, 10000, 25000, 50000, 100000, 250000, 500000),
+    "owner1_credit_score": (300, 500, 550, 600, 650, 700, 750, 800, 850),
+    "intelliscore": (0, 10, 20, 30, 40, 50, 60, 70, 80, 90),
+    "daily_average_balance": (0, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000),
+}
+# Metrics read from the application input
+INPUT_METRICS = ("owner1_credit_score", "intelliscore", "daily_average_balance")
+QUANTILES = (0.1, 0.5, 0.9)
+GROUP_BY = ("tier", "industry", "user_id", "hour", "day")
+
+TDIGEST_COMPRESSION = 100
+
+
+class TDigest:
+    """Mergeable quantile sketch (Dunning's merging t-digest).
+
+    Values are clustered into weighted centroids, small near the tails and
+    large in the middle, so extreme quantiles stay accurate. Up to about
+    ``compression`` values are kept exactly; digests of separate streams
+    merge into a digest of both.
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        # [mean, weight] in ascending order of mean
+        self.centroids = []
+        self._buffer = []
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value, weight=1):
+        self._buffer.append([value, weight])
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= 5 * self.compression:
+            self._compress()
+
+    def _weight_limit(self, before, total):
+        """Most weight a centroid starting after ``before`` of ``total`` may
+        hold: it may span one unit of the k1 scale function
+        ``k(q) = compression / 2pi * asin(2q - 1)``"""
+        scale = 2 * math.pi / self.compression
+        k = math.asin(2 * before / total - 1) / scale + 1
+        if k * scale >= math.pi / 2:
+            return total
+        return total * (math.sin(k * scale) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(self.centroids + self._buffer)
+        self._buffer = []
+        total = sum(weight for _, weight in points)
+        merged = []
+        mean, weight = points[0]
+        before = 0
+        limit = self._weight_limit(0, total)
+        for point_mean, point_weight in points[1:]:
+            if before + weight + point_weight <= limit:
+                weight += point_weight
+                mean += (point_mean - mean) * point_weight / weight
+            else:
+                merged.append([mean, weight])
+                before += weight
+                limit = self._weight_limit(before, total)
+                mean, weight = point_mean, point_weight
+        merged.append([mean, weight])
+        self.centroids = merged
+
+    def merge(self, other):
+        return TDigest.merge_all([self, other])
+
+    @classmethod
+    def merge_all(cls, digests):
+        """One digest of all of ``digests``, compressed once"""
+        merged = cls(max(digest.compression for digest in digests))
+        for digest in digests:
+            # _compress builds new centroids; these lists are only read
+            merged._buffer.extend(digest.centroids)
+            merged._buffer.extend(digest._buffer)
+            merged.count += digest.count
+            merged.min = min(merged.min, digest.min)
+            merged.max = max(merged.max, digest.max)
+        merged._compress()
+        return merged
+
+    def quantile(self, q):
+        """Estimated value at quantile ``q`` (0-1); None when empty"""
+        self._compress()
+        centroids = self.centroids
+        if not centroids:
+            return None
+        if len(centroids) == 1:
+            return centroids[0][0]
+        target = q * self.count
+        # Interpolate between centroid centers, and toward min/max at the ends
+        previous_center, previous_mean = 0.0, self.min
+        cumulative = 0.0
+        for mean, weight in centroids:
+            center = cumulative + weight / 2
+            if target < center:
+                if center == previous_center:
+                    return mean
+                share = (target - previous_center) / (center - previous_center)
+                return previous_mean + share * (mean - previous_mean)
+            previous_center, previous_mean = center, mean
+            cumulative += weight
+        if self.count == previous_center:
+            return self.max
+        share = (target - previous_center) / (self.count - previous_center)
+        return previous_mean + min(share, 1.0) * (self.max - previous_mean)
+
+    def to_list(self):
+        """``[compression, min, max, mean, weight, mean, weight, ...]``"""
+        self._compress()
+        flat = [self.compression, self.min, self.max] if self.count else [self.compression, None, None]
+        for mean, weight in self.centroids:
+            flat += (mean, weight)
+        return flat
+
+    @classmethod
+    def from_list(cls, flat):
+        digest = cls(flat[0])
+        digest.centroids = [[float(flat[i]), flat[i + 1]] for i in range(3, len(flat), 2)]
+        digest.count = sum(weight for _, weight in digest.centroids)
+        if digest.count:
+            digest.min, digest.max = float(flat[1]), float(flat[2])
+        return digest
+
+
+class Distribution:
+    """Fixed-bin histogram, moments and a t-digest of one metric"""
+
+    def __init__(self, edges):
+        self.edges = edges
+        self.histogram = [0] * (len(edges) + 1)
+        self.total = 0.0
+        self.digest = TDigest()
+
+    def add(self, value):
+        self.histogram[bisect_right(self.edges, value)] += 1
+        self.total += value
+        self.digest.add(value)
+
+    def merge(self, other):
+        return Distribution.merge_all([self, other])
+
+    @classmethod
+    def merge_all(cls, distributions):
+        merged = cls(distributions[0].edges)
+        merged.histogram = [sum(bins) for bins in zip(*(d.histogram for d in distributions))]
+        merged.total = sum(d.total for d in distributions)
+        merged.digest = TDigest.merge_all([d.digest for d in distributions])
+        return merged
+
+    def describe(self, quantiles=QUANTILES):
+        count = self.digest.count
+        bounds = (None,) + tuple(self.edges) + (None,)
+        return {
+            "count": int(count),
+            "mean": self.total / count if count else None,
+            "min": self.digest.min if count else None,
+            "max": self.digest.max if count else None,
+            **{f"p{round(q * 100)}": self.digest.quantile(q) for q in quantiles},
+            "histogram": [
+                {"lower": bounds[i], "upper": bounds[i + 1], "count": n}
+                for i, n in enumerate(self.histogram)
+            ],
+        }
+
+    def to_list(self):
+        """``[total, histogram, digest]``"""
+        return [self.total, self.histogram, self.digest.to_list()]
+
+    @classmethod
+    def from_list(cls, edges, data):
+        total, histogram, digest = data
+        if len(histogram) != len(edges) + 1:
+            raise ValueError("histogram bins changed")
+        distribution = cls(edges)
+        distribution.histogram = [int(n) for n in histogram]
+        distribution.total = float(total)
+        distribution.digest = TDigest.from_list(digest)
+        return distribution
+
+
+def entry_metrics(entry):
+    """``{metric: value}`` of the finite numeric metrics of a log entry"""
+    values = {}
+    score = entry.get("score")
+    if isinstance(score, dict):
+        values["total_score"] = score.get("total_score")
+    offers = entry.get("offers")
+    if isinstance(offers, list):
+        amounts = [offer.get("amount") for offer in offers if isinstance(offer, dict)]
+        amounts = [amount for amount in amounts if isinstance(amount, (int, float))]
+        if amounts:
+            values["offer_amount"] = max(amounts)
+    data = entry.get("input")
+    if isinstance(data, dict):
+        for field in INPUT_METRICS:
+            values[field] = data.get(field)
+    metrics = {}
+    for metric, value in values.items():
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if math.isfinite(value):
+            metrics[metric] = value
+    return metrics
+
+
+def parse_rollup_query(args):
+    """Validated filters, grouping and metrics from request arguments;
+    raises ValueError"""
+    filters = {}
+    for key in ("user_id", "industry"):
+        value = args.get(key)
+        if value not in (None, ""):
+            filters[key] = value if key == "user_id" else _normalize(value)
+    tier = args.get("tier")
+    if tier:
+        if tier not in TIERS:
+            raise ValueError(f"tier must be one of: {', '.join(TIERS)}")
+        filters["tier"] = tier
+    for key in ("start", "end"):
+        value = args.get(key)
+        if value:
+            try:
+                filters[key] = _unix_time(value)
+            except ValueError:
+                raise ValueError(f"{key} must be an ISO 8601 timestamp")
+    group_by = args.get("group_by") or None
+    if group_by is not None and group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of: {', '.join(GROUP_BY)}")
+    metrics = [m for m in (args.get("metrics") or "").split(",") if m] or list(METRIC_BINS)
+    unknown = [m for m in metrics if m not in METRIC_BINS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}. Available: {', '.join(METRIC_BINS)}")
+    return filters, group_by, metrics
+
+
+def _iso(unix_time):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(unix_time))
+
+
+class ScoreRollups(IncrementalLogReader):
+    """Score, offer and key-input distributions of the underwriting log,
+    rolled up by tier, industry, API user and time bucket.
+
+    Each rollup cell holds a ``Distribution`` per metric for one
+    ``(bucket start, bucket length, tier, industry, user_id)``. Buckets are
+    hourly for the last ``hourly_days`` days and daily before that. Cells
+    are merged at query time, so any combination of filters and one
+    grouping is answered without reading the log again.
+    """
+
+    def __init__(self, log=underwriting_log, checkpoint_path=ROLLUPS_PATH,
+                 checkpoint_every=CHECKPOINT_EVERY, hourly_days=HOURLY_DAYS):
+        self.hourly_days = hourly_days
+        super().__init__(log, checkpoint_path, checkpoint_every)
+
+    def _reset(self):
+        # (bucket, span, tier, industry, user_id) -> {metric: Distribution}
+        self._cells = {}
+        # Hourly buckets before this have been merged into daily ones
+        self._compacted_before = 0
+        # Query results, until the log grows: (position, {query: groups})
+        self._results = (None, {})
+
+    def _state(self):
+        return {
+            "cells": [
+                [list(key), {metric: d.to_list() for metric, d in cell.items()}]
+                for key, cell in self._cells.items()
+            ],
+            "compacted_before": self._compacted_before,
+        }
+
+    def _restore(self, state):
+        cells = {}
+        for key, cell in state["cells"]:
+            bucket, span, tier, industry, user_id = key
+            cells[(int(bucket), int(span), tier, industry, user_id)] = {
+                metric: Distribution.from_list(METRIC_BINS[metric], data) for metric, data in cell.items()
+            }
+        self._cells = cells
+        self._compacted_before = int(state["compacted_before"])
+
+    def _add(self, entry, segment):
+        try:
+            unix_time = _unix_time(entry["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return
+        metrics = entry_metrics(entry)
+        if not metrics:
+            return
+        data = entry.get("input")
+        industry = _normalize(data.get("industry_type")) if isinstance(data, dict) else None
+        tier = entry.get("tier")
+        user_id = entry.get("user_id")
+        span = HOUR if unix_time >= max(self._compacted_before, self._hourly_cutoff()) else DAY
+        key = (
+            int(unix_time // span * span), span,
+            tier if tier in TIERS else None,
+            industry or None,
+            user_id if isinstance(user_id, str) else None,
+        )
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = {}
+        for metric, value in metrics.items():
+            distribution = cell.get(metric)
+            if distribution is None:
+                distribution = cell[metric] = Distribution(METRIC_BINS[metric])
+            distribution.add(value)
+
+    def _hourly_cutoff(self):
+        """Start of the first day still kept in hourly buckets"""
+        return (time.time() - self.hourly_days * DAY) // DAY * DAY
+
+    def _caught_up(self):
+        # Merge hourly buckets that aged out into daily ones
+        cutoff = self._hourly_cutoff()
+        if cutoff <= self._compacted_before:
+            return
+        days = {}
+        for key in [key for key in self._cells if key[1] == HOUR and key[0] < cutoff]:
+            day_key = (key[0] // DAY * DAY, DAY) + key[2:]
+            for metric, distribution in self._cells.pop(key).items():
+                days.setdefault(day_key, {}).setdefault(metric, []).append(distribution)
+        for day_key, metrics in days.items():
+            day_cell = self._cells.setdefault(day_key, {})
+            for metric, distributions in metrics.items():
+                if metric in day_cell:
+                    distributions.append(day_cell[metric])
+                day_cell[metric] = Distribution.merge_all(distributions)
+        self._compacted_before = cutoff
+        self._results = (None, {})
+        self._pending += 1
+
+    def query(self, filters=None, group_by=None, metrics=None, quantiles=QUANTILES):
+        """Distributions of ``metrics`` over the cells matching ``filters``
+        (``tier``, ``industry``, ``user_id``, unix ``start``/``end``), as one
+        group or one per ``group_by`` value"""
+        filters = filters or {}
+        metrics = metrics or list(METRIC_BINS)
+        self.catch_up()
+        with self._lock:
+            position, results = self._results
+            if position != self._position:
+                results = {}
+                self._results = (self._position, results)
+            query = (tuple(sorted(filters.items())), group_by, tuple(metrics), tuple(quantiles))
+            if query not in results:
+                results[query] = self._query(filters, group_by, metrics, quantiles)
+            return results[query]
+
+    def _query(self, filters, group_by, metrics, quantiles):
+        # group -> metric -> distributions to merge
+        groups = {} if group_by else {None: {}}
+        for key, cell in self._cells.items():
+            bucket, span, tier, industry, user_id = key
+            if "tier" in filters and tier != filters["tier"]:
+                continue
+            if "industry" in filters and industry != filters["industry"]:
+                continue
+            if "user_id" in filters and user_id != filters["user_id"]:
+                continue
+            # A bucket is included when it overlaps the window
+            if "start" in filters and bucket + span <= filters["start"]:
+                continue
+            if "end" in filters and bucket >= filters["end"]:
+                continue
+            group = groups.setdefault(self._group(key, group_by), {})
+            for metric in metrics:
+                if metric in cell:
+                    group.setdefault(metric, []).append(cell[metric])
+        results = []
+        for name, group in sorted(groups.items(), key=lambda item: (item[0] is None, str(item[0]))):
+            described = {}
+            for metric in metrics:
+                distributions = group.get(metric)
+                merged = Distribution.merge_all(distributions) if distributions else Distribution(METRIC_BINS[metric])
+                described[metric] = merged.describe(quantiles)
+            results.append({group_by: name, "metrics": described} if group_by else {"metrics": described})
+        return results
+
+    @staticmethod
+    def _group(key, group_by):
+        bucket, span, tier, industry, user_id = key
+        if group_by == "tier":
+            return tier
+        if group_by == "industry":
+            return industry
+        if group_by == "user_id":
+            return user_id
+        if group_by == "hour":
+            # Buckets older than the hourly window are whole days
+            return _iso(bucket)
+        if group_by == "day":
+            return _iso(bucket // DAY * DAY)
+        return None
+
+
+# Global instance
+score_rollups = ScoreRollups()
+atexit.register(score_rollups.checkpoint)
@@ -1,6 +1,10 @@
 
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 import logging
+import math
+
+from app.utils.metrics import CALL_BUCKETS, metrics
 
 # Optimized scoring lookup tables
 CREDIT_SCORE_THRESHOLDS = [(750, 1.0), (700, 0.9), (650, 0.75), (600, 0.6), (550, 0.4), (500, 0.25)]
@@ -46,74 +50,184 @@ INDUSTRY_SCORING = {
     "transportation": 0.5, "logistics": 0.5, "agriculture": 0.5
 }
 
-def score_threshold_lookup(value, thresholds, default=0.1):
-    """Generic threshold-based scoring lookup"""
-    for threshold, multiplier in thresholds:
-        if value >= threshold:
+BOOLEAN_SCORING = {
+    "yes": 0.8, "true": 0.8, "good": 0.8, "passed": 0.8,
+    "no": 0, "false": 0, "bad": 0, "failed": 0, "": 0
+}
+
+DIGITAL_PRESENCE_FIELDS = ("company_website", "facebook_presence", "linkedin_presence")
+VERIFICATION_FIELDS = ("contact_verification", "business_license_status", "tax_compliance", "professional_liability_insurance")
+
+# Ladders matched with ``value >= threshold`` (descending thresholds)
+FREQUENCY_THRESHOLDS = [(15, 1.0), (10, 0.8), (5, 0.6)]
+BUSINESS_SCORE_THRESHOLDS = [(75, 1.0), (60, 0.8), (45, 0.6), (30, 0.4)]
+YEARS_THRESHOLDS = [(3, 1.0), (2, 0.8), (1, 0.6), (0.5, 0.4)]
+ASSET_VALUE_THRESHOLDS = [(100000, 1.0), (50000, 0.8), (25000, 0.6), (10000, 0.4)]
+DEFAULT_NUMERIC_THRESHOLDS = [(80, 1.0), (60, 0.8), (40, 0.6), (20, 0.4)]
+
+# Ladders matched with ``value <= limit`` (ascending limits)
+INQUIRY_LIMITS = [(2, 1.0), (5, 0.7), (10, 0.3)]
+NEGATIVE_DAYS_LIMITS = [(2, 0.4), (5, 0.2), (10, 0.1)]
+DISTANCE_LIMITS = [(5, 1.0), (15, 0.8), (30, 0.5)]
+
+# Exact-count matches
+DEROGATORY_COUNT_SCORING = [(0, 1.0), (1, 0.5), (2, 0.2)]
+
+# Named numeric curves. "exact" values are matched first, then the "at_least"
+# or "at_most" ladder, falling back to "default".
+NUMERIC_CURVES = {
+    "credit_score": {"at_least": CREDIT_SCORE_THRESHOLDS, "default": 0.1},
+    "utilization": {"inverse_percentage": 100},
+    "inquiries": {"at_most": INQUIRY_LIMITS, "default": 0},
+    "past_due": {"exact": DEROGATORY_COUNT_SCORING, "default": 0},
+    "balance": {"at_least": BALANCE_THRESHOLDS, "default": 0.1},
+    "deposits": {"at_least": DEPOSIT_THRESHOLDS, "default": 0.05},
+    "nsf_count": {"exact": DEROGATORY_COUNT_SCORING, "default": 0},
+    "negative_days": {"exact": [(0, 1.0)], "at_most": NEGATIVE_DAYS_LIMITS, "default": 0},
+    "frequency": {"at_least": FREQUENCY_THRESHOLDS, "default": 0.3},
+    "business_score": {"at_least": BUSINESS_SCORE_THRESHOLDS, "default": 0.2},
+    "years": {"at_least": YEARS_THRESHOLDS, "default": 0.2},
+    "distance": {"at_most": DISTANCE_LIMITS, "default": 0.2},
+    "asset_value": {"at_least": ASSET_VALUE_THRESHOLDS, "default": 0.2},
+    "default": {"at_least": DEFAULT_NUMERIC_THRESHOLDS, "default": 0.2},
+}
+
+# Keys allowed in a rule's inline "breakpoints" table
+CURVE_SPEC_KEYS = {"exact", "at_least", "at_most", "default", "inverse_percentage"}
+
+CREDIT_CURVE_MARKERS = ("credit_score", "utilization", "inquiries", "past_due")
+BANK_CURVE_MARKERS = ("balance", "deposits", "nsf_count", "negative_days", "frequency")
+ASSET_VALUE_MARKERS = ("value", "amount", "capital", "collateral")
+ASSET_VALUE_FIELDS = ("real_estate_value", "equipment_value", "inventory_value", "liquid_assets", "asset_value", "business_assets")
+
+
+def compile_curve(spec):
+    """Compile a numeric curve spec into a ``value -> multiplier`` function.
+
+    Ladders are stored as sorted breakpoint lists searched with ``bisect``,
+    so a lookup is O(log k) whatever order the spec lists them in.
+    """
+    if "inverse_percentage" in spec:
+        cap = spec["inverse_percentage"]
+
+        def curve(value):
+            return max(0, 1 - min(value, cap) / cap)
+        return curve
+
+    exact = dict(spec.get("exact") or ())
+    default = spec.get("default", 0)
+
+    if "at_most" in spec:
+        # Index of the first limit >= value; past the end falls back to the default
+        limits = sorted(spec["at_most"], key=lambda pair: pair[0])
+        bounds = [limit for limit, _ in limits]
+        table = [multiplier for _, multiplier in limits] + [default]
+        search = bisect_left
+    else:
+        # Number of thresholds <= value; zero falls back to the default
+        thresholds = sorted(spec.get("at_least") or (), key=lambda pair: pair[0])
+        bounds = [threshold for threshold, _ in thresholds]
+        table = [default] + [multiplier for _, multiplier in thresholds]
+        search = bisect_right
+
+    def curve(value):
+        multiplier = exact.get(value)
+        if multiplier is not None:
             return multiplier
-    return default
-
-def score_categorical_lookup(key, value, scoring_dict, default=0):
-    """Generic categorical scoring lookup"""
-    return scoring_dict.get(key, {}).get(value.lower(), default)
-
-def score_credit_field(key, value, weight):
-    """Optimized credit field scoring"""
-    if "credit_score" in key:
-        return weight * score_threshold_lookup(value, CREDIT_SCORE_THRESHOLDS)
-    elif "utilization" in key:
-        return max(0, weight * (1 - min(value, 100) / 100))
-    elif "inquiries" in key:
-        if value <= 2: return weight
-        elif value <= 5: return weight * 0.7
-        elif value <= 10: return weight * 0.3
-        else: return 0
-    elif "past_due" in key:
-        if value == 0: return weight
-        elif value == 1: return weight * 0.5
-        elif value == 2: return weight * 0.2
-        else: return 0
-    return 0
-
-def score_bank_field(key, value, weight):
-    """Optimized bank analysis scoring"""
-    if "balance" in key or key == "daily_average_balance":
-        return weight * score_threshold_lookup(value, BALANCE_THRESHOLDS)
-    elif "deposits" in key or key == "monthly_deposits":
-        return weight * score_threshold_lookup(value, DEPOSIT_THRESHOLDS, 0.05)
-    elif "nsf_count" in key:
-        if value == 0: return weight
-        elif value == 1: return weight * 0.5
-        elif value == 2: return weight * 0.2
-        else: return 0
-    elif "negative_days" in key:
-        if value == 0: return weight
-        elif value <= 2: return weight * 0.4
-        elif value <= 5: return weight * 0.2
-        elif value <= 10: return weight * 0.1
-        else: return 0
-    elif "frequency" in key:
-        if value >= 15: return weight
-        elif value >= 10: return weight * 0.8
-        elif value >= 5: return weight * 0.6
-        else: return weight * 0.3
-    return 0
-
-def score_business_field(key, value, weight):
-    """Optimized business information scoring"""
-    if key in ["intelliscore", "stability_score"]:
-        if value >= 75: return weight
-        elif value >= 60: return weight * 0.8
-        elif value >= 45: return weight * 0.6
-        elif value >= 30: return weight * 0.4
-        else: return weight * 0.2
-    elif "years" in key:
-        if value >= 3: return weight
-        elif value >= 2: return weight * 0.8
-        elif value >= 1: return weight * 0.6
-        elif value >= 0.5: return weight * 0.4
-        else: return weight * 0.2
-    return 0
+        if value != value:
+            # NaN never satisfies a breakpoint comparison
+            return default
+        return table[search(bounds, value)]
+    return curve
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def validate_curve_spec(spec):
+    """Return ``spec`` if it is a usable numeric curve, otherwise raise ValueError"""
+    if not isinstance(spec, dict):
+        raise ValueError("Breakpoints must be an object")
+    unknown = set(spec) - CURVE_SPEC_KEYS
+    if unknown:
+        raise ValueError(f"Unknown breakpoint keys: {', '.join(sorted(unknown))}")
+    if "at_least" in spec and "at_most" in spec:
+        raise ValueError("Breakpoints cannot combine 'at_least' and 'at_most'")
+    if "inverse_percentage" in spec:
+        cap = spec["inverse_percentage"]
+        if not _is_number(cap) or cap <= 0:
+            raise ValueError("'inverse_percentage' must be a positive number")
+    if "default" in spec and not _is_number(spec["default"]):
+        raise ValueError("'default' must be a number")
+
+    for name in ("exact", "at_least", "at_most"):
+        pairs = spec.get(name) or []
+        if not isinstance(pairs, (list, tuple)):
+            raise ValueError(f"'{name}' must be a list of [value, multiplier] pairs")
+        bounds = set()
+        for pair in pairs:
+            if (not isinstance(pair, (list, tuple)) or len(pair) != 2
+                    or not all(_is_number(item) for item in pair)):
+                raise ValueError(f"'{name}' entries must be [value, multiplier] pairs")
+            if pair[0] in bounds:
+                raise ValueError(f"'{name}' lists {pair[0]} more than once")
+            bounds.add(pair[0])
+    return spec
+
+
+CURVE_FUNCTIONS = {name: compile_curve(spec) for name, spec in NUMERIC_CURVES.items()}
+
+
+def numeric_curve_name(key):
+    """Pick the named numeric curve used to score ``key``"""
+    for marker in CREDIT_CURVE_MARKERS:
+        if marker in key:
+            return marker
+    for marker in BANK_CURVE_MARKERS:
+        if marker in key:
+            return marker
+    if key in ("intelliscore", "stability_score"):
+        return "business_score"
+    if "years" in key:
+        return "years"
+    if "distance" in key:
+        return "distance"
+    if any(marker in key for marker in ASSET_VALUE_MARKERS) or key in ASSET_VALUE_FIELDS:
+        return "asset_value"
+    return "default"
+
+
+def field_curve(key, rule):
+    """Return ``(name, spec)`` of the numeric curve used to score a rule.
+
+    A rule may carry its own ``"breakpoints"`` table (``name`` is None) or
+    pick a named ``"curve"``; otherwise the curve is chosen from ``key``.
+    """
+    if rule.get("breakpoints") is not None:
+        try:
+            return None, validate_curve_spec(rule["breakpoints"])
+        except ValueError as e:
+            raise ValueError(f"Invalid breakpoints for '{key}': {e}") from e
+    name = rule.get("curve") or numeric_curve_name(key)
+    if name not in NUMERIC_CURVES:
+        raise ValueError(f"Unknown scoring curve '{name}' for '{key}'")
+    return name, NUMERIC_CURVES[name]
+
+
+def categorical_table(key):
+    """Return the ``(table, default)`` used to score string answers for ``key``"""
+    if key in CATEGORICAL_SCORING:
+        return CATEGORICAL_SCORING[key], 0
+    if key in DIGITAL_PRESENCE_FIELDS:
+        return DIGITAL_PRESENCE_SCORING, 0
+    if key in BACKGROUND_CHECK_SCORING:
+        return BACKGROUND_CHECK_SCORING[key], 0
+    if key in VERIFICATION_FIELDS:
+        return VERIFICATION_SCORING, 0
+    if key == "industry_type":
+        return INDUSTRY_SCORING, 0.3  # Default for unknown industries
+    return None, None
 
 
 def calculate_years_in_business(start_date):
@@ -128,136 +242,123 @@ def calculate_years_in_business(start_date):
         raise
 
 
-def calculate_score(input_data, rules):
-    score = 0
-    max_score = 0
-    
-    # Parse owner1 ownership percentage
+# Scorer results for fields that were not answered
+_MISSING = (0, 1)
+_NOT_COUNTED = (0, 0)
+
+
+def compile_field_scorer(key, curve=None):
+    """Bind a field's lookup tables into a ``value -> (multiplier, count)`` scorer.
+
+    ``count`` is how many times the field's weight is added to the maximum
+    possible score. ``curve`` scores numeric answers and defaults to the
+    named curve for ``key``.
+    """
+    table, default = categorical_table(key)
+    strings = dict(table or {})
+    strings.update(BOOLEAN_SCORING)
+    if curve is None:
+        curve = CURVE_FUNCTIONS[numeric_curve_name(key)]
+    missing = _NOT_COUNTED if key == "underwriter_adjustment" else _MISSING
+
+    def score_field(value):
+        if isinstance(value, str):
+            multiplier = strings.get(value.strip().lower())
+            if multiplier is not None:
+                return multiplier, 1
+            if table is not None:
+                return default, 1
+            try:
+                number = float(value)
+            except ValueError:
+                return _MISSING
+            # Numeric strings have always counted twice towards the maximum
+            return curve(number), 2
+        if value is None:
+            return missing
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return missing
+        return curve(number), 1
+
+    return score_field
+
+
+class ScoringPlan:
+    """Flat, ordered list of per-field scorers compiled from a rules dict.
+
+    Raises ValueError if a rule names an unknown curve or carries malformed
+    breakpoints.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.steps = []
+        self.vector_curves = []
+        for section, fields in rules.items():
+            for key, rule in fields.items():
+                name, spec = field_curve(key, rule)
+                if name is None:
+                    curve, vector_curve = compile_curve(spec), compile_vector_curve(spec)
+                else:
+                    curve, vector_curve = CURVE_FUNCTIONS[name], VECTOR_CURVE_FUNCTIONS[name]
+                self.steps.append((
+                    key,
+                    rule.get("weight", 0),
+                    key.startswith("owner2_"),
+                    key == "years_in_business",
+                    compile_field_scorer(key, curve),
+                ))
+                self.vector_curves.append(vector_curve)
+
+
+def validate_rules(rules):
+    """Raise ValueError unless ``rules`` is a dict of sections of rule dicts that compiles"""
+    if not isinstance(rules, dict):
+        raise ValueError("Rules must be an object of sections")
+    for section, fields in rules.items():
+        if not isinstance(fields, dict) or not all(isinstance(rule, dict) for rule in fields.values()):
+            raise ValueError(f"Section '{section}' must map field keys to rule objects")
+    ScoringPlan(rules)
+
+
+# Recently compiled plans, most recent last. A few are kept so that scoring
+# against two rule sets in turn (e.g. a backtest) does not recompile each time.
+_scoring_plans = []
+MAX_SCORING_PLANS = 4
+
+
+def get_scoring_plan(rules):
+    """Return the compiled plan for ``rules``, compiling it only for new rules"""
+    plans = _scoring_plans
+    for plan in reversed(plans):
+        if plan.rules is rules:
+            return plan
+    plan = ScoringPlan(rules)
+    plans.append(plan)
+    del plans[:-MAX_SCORING_PLANS]
+    return plan
+
+
+def include_owner2(input_data):
+    """Owner 2 fields count only when owner 1 owns under 50% and owner 2 data is provided"""
     try:
         owner1_pct = float(input_data.get("owner1_ownership_pct", 100))
     except (TypeError, ValueError):
         owner1_pct = 100
-    
-    # Check if owner2 data is provided AND owner1 owns less than 50%
+
+    # Don't count just the ownership percentage as owner 2 data
     owner2_provided = any(
         v is not None and str(v).strip() != ""
         for k, v in input_data.items()
-        if k.startswith("owner2_") and k != "owner2_ownership_pct"  # Don't count just ownership pct
+        if k.startswith("owner2_") and k != "owner2_ownership_pct"
     )
-    include_owner2 = owner1_pct < 50 and owner2_provided
+    return owner1_pct < 50 and owner2_provided
 
-    for section, fields in rules.items():
-        for key, rule in fields.items():
-            weight = rule.get("weight", 0)
-            value = input_data.get(key)
-
-            # Skip owner2 fields unless conditions are met
-            if key.startswith("owner2_") and not include_owner2:
-                continue
 
-            # Handle years in business calculation
-            if key == "years_in_business" and not value:
-                if "business_start_date" in input_data:
-                    value = calculate_years_in_business(input_data["business_start_date"])
-
-            # Convert string values to appropriate types
-            if isinstance(value, str):
-                val = value.strip().lower()
-                if val in ["yes", "true", "good", "passed"]:
-                    score += weight * 0.8
-                    max_score += weight
-                    continue
-                elif val in ["no", "false", "bad", "failed"]:
-                    score += 0
-                    max_score += weight
-                    continue
-                elif val == "":
-                    max_score += weight
-                    continue
-                
-                # Use optimized lookup tables
-                max_score += weight
-                
-                # Check categorical scoring
-                if key in CATEGORICAL_SCORING:
-                    multiplier = CATEGORICAL_SCORING[key].get(val, 0)
-                    score += weight * multiplier
-                    continue
-                elif key in ["company_website", "facebook_presence", "linkedin_presence"]:
-                    multiplier = DIGITAL_PRESENCE_SCORING.get(val, 0)
-                    score += weight * multiplier
-                    continue
-                elif key in BACKGROUND_CHECK_SCORING:
-                    multiplier = BACKGROUND_CHECK_SCORING[key].get(val, 0)
-                    score += weight * multiplier
-                    continue
-                elif key in ["contact_verification", "business_license_status", "tax_compliance", "professional_liability_insurance"]:
-                    multiplier = VERIFICATION_SCORING.get(val, 0)
-                    score += weight * multiplier
-                    continue
-                elif key == "industry_type":
-                    multiplier = INDUSTRY_SCORING.get(val, 0.3)  # Default for unknown industries
-                    score += weight * multiplier
-                    continue
-                else:
-                    # Try to convert string to number
-                    try:
-                        value = float(value)
-                    except (ValueError, TypeError):
-                        continue
-
-            # Process numeric values
-            if value is not None and value != "":
-                try:
-                    val = float(value)
-                    max_score += weight
-                    
-                    # Use optimized helper functions based on field type
-                    if any(credit_key in key for credit_key in ["credit_score", "utilization", "inquiries", "past_due"]):
-                        score += score_credit_field(key, val, weight)
-                    elif any(bank_key in key for bank_key in ["balance", "deposits", "nsf_count", "negative_days", "frequency"]):
-                        score += score_bank_field(key, val, weight)
-                    elif key in ["intelliscore", "stability_score"] or "years" in key:
-                        score += score_business_field(key, val, weight)
-                    elif "distance" in key:
-                        # Distance scoring
-                        if val <= 5: score += weight
-                        elif val <= 15: score += weight * 0.8
-                        elif val <= 30: score += weight * 0.5
-                        else: score += weight * 0.2
-                    elif any(asset_key in key for asset_key in ["value", "amount", "capital", "collateral"]) or key in ["real_estate_value", "equipment_value", "inventory_value", "liquid_assets", "asset_value", "business_assets"]:
-                        # Asset values
-                        if val >= 100000: score += weight
-                        elif val >= 50000: score += weight * 0.8
-                        elif val >= 25000: score += weight * 0.6
-                        elif val >= 10000: score += weight * 0.4
-                        else: score += weight * 0.2
-                    else:
-                        # Default numeric handling
-                        if "percentage" in key or "pct" in key:
-                            if val >= 80: score += weight
-                            elif val >= 60: score += weight * 0.8
-                            elif val >= 40: score += weight * 0.6
-                            elif val >= 20: score += weight * 0.4
-                            else: score += weight * 0.2
-                        else:
-                            if val >= 80: score += weight
-                            elif val >= 60: score += weight * 0.8
-                            elif val >= 40: score += weight * 0.6
-                            elif val >= 20: score += weight * 0.4
-                            else: score += weight * 0.2
-                except (TypeError, ValueError, AttributeError):
-                    if key != "underwriter_adjustment":
-                        max_score += weight
-                    continue
-            else:
-                # Field not provided - only count towards max possible if not underwriter_adjustment
-                if key != "underwriter_adjustment":
-                    max_score += weight
-
-    # Check for automatic decline conditions
-    monthly_deposits = 0
-    deposit_frequency = 0
+def auto_decline_reasons(input_data):
+    """Return the automatic decline reasons that apply to ``input_data``"""
     try:
         monthly_deposits = float(input_data.get('monthly_deposits', 0))
     except (TypeError, ValueError):
@@ -267,26 +368,327 @@ def calculate_score(input_data, rules):
     except (TypeError, ValueError):
         deposit_frequency = 0
 
-    # Auto-decline flags
-    auto_decline_reasons = []
+    reasons = []
     if monthly_deposits < 20000:
-        auto_decline_reasons.append("Monthly deposits below $20,000 minimum")
+        reasons.append("Monthly deposits below $20,000 minimum")
     if deposit_frequency < 5:
-        auto_decline_reasons.append("Deposit frequency below 5 per month minimum")
+        reasons.append("Deposit frequency below 5 per month minimum")
+    return reasons
+
+
+SCORE_SECONDS = metrics.histogram(
+    'calculate_score_seconds', 'Time spent scoring one application', buckets=CALL_BUCKETS)
+
+
+@SCORE_SECONDS.time()
+def calculate_score(input_data, rules):
+    plan = get_scoring_plan(rules)
+    owner2_included = include_owner2(input_data)
+    score = 0
+    max_score = 0
+
+    for key, weight, is_owner2, derives_years, score_field in plan.steps:
+        # Skip owner2 fields unless conditions are met
+        if is_owner2 and not owner2_included:
+            continue
+
+        value = input_data.get(key)
+
+        # Handle years in business calculation
+        if derives_years and not value and "business_start_date" in input_data:
+            value = calculate_years_in_business(input_data["business_start_date"])
+
+        multiplier, count = score_field(value)
+        score += weight * multiplier
+        max_score += weight * count
+
+    reasons = auto_decline_reasons(input_data)
 
     normalized = round((score / max_score) * 100, 2) if max_score else 0
-    
+
     # If auto-decline conditions are met, force score to 0
-    if auto_decline_reasons:
+    if reasons:
         normalized = 0
 
     return {
         "total_score": normalized,
         "raw_score": round(score, 2),
         "max_possible": max_score,
-        "auto_decline": len(auto_decline_reasons) > 0,
-        "decline_reasons": auto_decline_reasons
+        "auto_decline": len(reasons) > 0,
+        "decline_reasons": reasons
+    }
+
+
+def field_contributions(input_data, rules):
+    """Per-field ``{key: (points, possible)}`` behind :func:`calculate_score`"""
+    plan = get_scoring_plan(rules)
+    owner2_included = include_owner2(input_data)
+    contributions = {}
+
+    for key, weight, is_owner2, derives_years, score_field in plan.steps:
+        if is_owner2 and not owner2_included:
+            continue
+
+        value = input_data.get(key)
+        if derives_years and not value and "business_start_date" in input_data:
+            value = calculate_years_in_business(input_data["business_start_date"])
+
+        multiplier, count = score_field(value)
+        points, possible = contributions.get(key, (0, 0))
+        contributions[key] = (points + weight * multiplier, possible + weight * count)
+    return contributions
+
+
+# Vectorized batch scoring
+
+_ABSENT = object()  # Marks a key missing from one application in a list of dicts
+
+
+def compile_vector_curve(spec):
+    """Compile a numeric curve spec into a float64 array -> multiplier array function.
+
+    The lookup tables are built, and NumPy imported, on the first call, so
+    plans that only score single applications never load NumPy.
+    """
+    compiled = None
+
+    def curve(values):
+        nonlocal compiled
+        if compiled is None:
+            compiled = _compile_vector_curve(spec)
+        return compiled(values)
+    return curve
+
+
+def _compile_vector_curve(spec):
+    import numpy as np
+
+    if "inverse_percentage" in spec:
+        cap = spec["inverse_percentage"]
+
+        def curve(values):
+            remaining = 1 - np.minimum(values, cap) / cap
+            return np.where(remaining > 0, remaining, 0.0)
+        return curve
+
+    exact = list(spec.get("exact") or ())
+    default = spec.get("default", 0)
+
+    if "at_most" in spec:
+        # Index of the first limit >= value; past the end falls back to the default
+        limits = sorted(spec["at_most"], key=lambda pair: pair[0])
+        bounds = np.array([limit for limit, _ in limits], dtype=float)
+        table = np.array([multiplier for _, multiplier in limits] + [default], dtype=float)
+        side = "left"
+    else:
+        # Number of thresholds <= value; zero falls back to the default
+        thresholds = sorted(spec.get("at_least") or (), key=lambda pair: pair[0])
+        bounds = np.array([threshold for threshold, _ in thresholds], dtype=float)
+        table = np.array([default] + [multiplier for _, multiplier in thresholds], dtype=float)
+        side = "right"
+
+    def curve(values):
+        result = table[np.searchsorted(bounds, values, side=side)]
+        result = np.where(np.isnan(values), default, result)
+        for match, multiplier in reversed(exact):
+            result = np.where(values == match, multiplier, result)
+        return result
+    return curve
+
+
+VECTOR_CURVE_FUNCTIONS = {name: compile_vector_curve(spec) for name, spec in NUMERIC_CURVES.items()}
+
+
+def to_columns(applications):
+    """Normalize a list of dicts or a dict of columns into ``(columns, n)``.
+
+    Scoring the same list against several rule sets is cheaper when it is
+    converted once and the columns are passed to :func:`calculate_score_batch`.
+    """
+    if isinstance(applications, dict):
+        columns = dict(applications)
+        lengths = {len(column) for column in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("All application columns must have the same length")
+        return columns, lengths.pop() if lengths else 0
+
+    rows = list(applications)
+    keys = set()
+    for row in rows:
+        keys.update(row)
+    columns = {key: [row.get(key, _ABSENT) for row in rows] for key in keys}
+    return columns, len(rows)
+
+
+def _is_numeric_array(column):
+    import numpy as np
+    return isinstance(column, np.ndarray) and column.dtype.kind in "biuf"
+
+
+def _float_column(column, n, fallback):
+    """``float(value)`` for every row, using ``fallback`` where that fails"""
+    import numpy as np
+    if column is None:
+        return np.full(n, float(fallback))
+    if _is_numeric_array(column):
+        return column.astype(float)
+    values = np.empty(n)
+    for i, value in enumerate(column):
+        if value is _ABSENT:
+            value = fallback
+        try:
+            values[i] = float(value)
+        except (TypeError, ValueError):
+            values[i] = fallback
+    return values
+
+
+def _provided_mask(column, n):
+    """Rows where the value is present and not blank"""
+    import numpy as np
+    if _is_numeric_array(column):
+        return np.ones(n, dtype=bool)
+    if isinstance(column, np.ndarray) and column.dtype.kind in "US":
+        return np.char.strip(column) != ""
+    return np.fromiter(
+        (v is not None and v is not _ABSENT and str(v).strip() != "" for v in column),
+        dtype=bool, count=n
+    )
+
+
+def _score_column(column, n, score_field, vector_curve):
+    """Return the ``(multiplier, count)`` arrays for one field's column"""
+    import numpy as np
+    if column is None:
+        multiplier, count = score_field(None)
+        return np.full(n, float(multiplier)), np.full(n, float(count))
+
+    if _is_numeric_array(column):
+        return vector_curve(column.astype(float)), np.ones(n)
+
+    if isinstance(column, np.ndarray) and column.dtype.kind in "US":
+        uniques, codes = np.unique(column, return_inverse=True)
+        numbers = None
+        is_number = None
+    else:
+        # Plain numbers go through the vector curve; everything else is
+        # integer-coded so each distinct answer is scored only once
+        numbers = np.zeros(n)
+        is_number = np.zeros(n, dtype=bool)
+        codes = np.zeros(n, dtype=np.intp)
+        index = {}
+        for i, value in enumerate(column):
+            value_type = type(value)
+            if value_type is float or value_type is int:
+                numbers[i] = value
+                is_number[i] = True
+                continue
+            if value is _ABSENT:
+                value = None
+            try:
+                codes[i] = index.setdefault(value, len(index))
+            except TypeError:
+                # Unhashable answers score like a missing value
+                codes[i] = index.setdefault(None, len(index))
+        uniques = list(index)
+
+    scored = [score_field(value) for value in uniques] or [(0, 0)]
+    unique_multipliers = np.array([multiplier for multiplier, _ in scored], dtype=float)
+    unique_counts = np.array([count for _, count in scored], dtype=float)
+    multipliers = unique_multipliers[codes]
+    counts = unique_counts[codes]
+
+    if is_number is not None and is_number.any():
+        multipliers = np.where(is_number, vector_curve(numbers), multipliers)
+        counts = np.where(is_number, 1.0, counts)
+    return multipliers, counts
+
+
+def _derive_years_column(column, start_column, n):
+    """Fill blank years in business from the start date, row by row"""
+    import numpy as np
+    values = column.tolist() if isinstance(column, np.ndarray) else list(column or [None] * n)
+    for i, value in enumerate(values):
+        if value is _ABSENT:
+            value = None
+        start = start_column[i]
+        if not value and start is not _ABSENT:
+            value = calculate_years_in_business(start)
+        values[i] = value
+    return values
+
+
+def calculate_score_batch(applications, rules, contributions=False):
+    """Score many applications at once with NumPy array operations.
+
+    ``applications`` is either a list of input dicts or a dict mapping field
+    names to equal-length columns (NumPy arrays or lists). Returns a dict of
+    arrays holding ``total_score``, ``raw_score``, ``max_possible`` and
+    ``auto_decline`` for each application, matching :func:`calculate_score`.
+    With ``contributions`` it also returns ``field_points``,
+    ``field_multipliers`` and ``field_counts``, mapping each field to its
+    arrays of raw points, multipliers and maximum-score counts (zero where
+    the field does not apply).
+    """
+    import numpy as np
+
+    plan = get_scoring_plan(rules)
+    columns, n = to_columns(applications)
+
+    owner1_pct = _float_column(columns.get("owner1_ownership_pct"), n, 100)
+    owner2_provided = np.zeros(n, dtype=bool)
+    for key, column in columns.items():
+        if key.startswith("owner2_") and key != "owner2_ownership_pct":
+            owner2_provided |= _provided_mask(column, n)
+    owner2_included = (owner1_pct < 50) & owner2_provided
+
+    score = np.zeros(n)
+    max_score = np.zeros(n)
+    field_points = {} if contributions else None
+    field_multipliers = {}
+    field_counts = {}
+    start_column = columns.get("business_start_date")
+
+    for step, vector_curve in zip(plan.steps, plan.vector_curves):
+        key, weight, is_owner2, derives_years, score_field = step
+        column = columns.get(key)
+        if derives_years and start_column is not None:
+            column = _derive_years_column(column, start_column, n)
+
+        multipliers, counts = _score_column(column, n, score_field, vector_curve)
+        if is_owner2:
+            multipliers = np.where(owner2_included, multipliers, 0.0)
+            counts = np.where(owner2_included, counts, 0.0)
+        points = weight * multipliers
+        score += points
+        max_score += weight * counts
+        if field_points is not None:
+            field_points[key] = field_points[key] + points if key in field_points else points
+            field_multipliers[key] = multipliers
+            field_counts[key] = counts
+
+    monthly_deposits = _float_column(columns.get("monthly_deposits"), n, 0)
+    deposit_frequency = _float_column(columns.get("deposit_frequency"), n, 0)
+    auto_decline = (monthly_deposits < 20000) | (deposit_frequency < 5)
+
+    # Round with Python's round() so results match the scalar path exactly
+    total_score = np.array([
+        0 if declined or not possible else round((raw / possible) * 100, 2)
+        for raw, possible, declined in zip(score.tolist(), max_score.tolist(), auto_decline.tolist())
+    ], dtype=float)
+    raw_score = np.array([round(raw, 2) for raw in score.tolist()], dtype=float)
+
+    result = {
+        "total_score": total_score,
+        "raw_score": raw_score,
+        "max_possible": max_score,
+        "auto_decline": auto_decline
     }
+    if field_points is not None:
+        result["field_points"] = field_points
+        result["field_multipliers"] = field_multipliers
+        result["field_counts"] = field_counts
+    return result
 
 
 def classify_risk(score: float) -> str:
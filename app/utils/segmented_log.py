@@ -0,0 +1,456 @@
+import fcntl
+import json
+import os
+import struct
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Index records: (entry number, byte offset, unix time) of a line start
+INDEX_RECORD = struct.Struct('<QQd')
+SEGMENT_SUFFIX = '.jsonl'
+INDEX_SUFFIX = '.idx'
+FIELDS_SUFFIX = '.fields'
+
+MAX_SEGMENT_BYTES = 64 * 1024 * 1024
+# Bytes of log between two index records; bounds how far any seek has to scan
+INDEX_INTERVAL_BYTES = 256 * 1024
+# Entries are timestamped before they are queued and written, so an entry
+# can be older than the index record before it. Time-range reads widen
+# their window by this many seconds and then filter on the entry timestamp.
+CLOCK_SLACK = 120
+READ_BLOCK_BYTES = 64 * 1024
+
+
+def _utc_day(unix_time):
+    return datetime.fromtimestamp(unix_time, timezone.utc).date()
+
+
+def _unix_time(timestamp):
+    """Unix time of a naive UTC ISO timestamp, as written in log entries"""
+    return datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class Segment:
+    """One log file plus its sparse index, named after its first entry number"""
+
+    def __init__(self, directory, base):
+        self.base = base
+        self.path = os.path.join(directory, f"{base:020d}{SEGMENT_SUFFIX}")
+        self.index_path = os.path.join(directory, f"{base:020d}{INDEX_SUFFIX}")
+        self.fields_path = os.path.join(directory, f"{base:020d}{FIELDS_SUFFIX}")
+
+    def read_index(self):
+        """``[(entry, offset, time), ...]`` in file order"""
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        # Ignore a record cut short by a crash
+        return list(INDEX_RECORD.iter_unpack(data[:len(data) - len(data) % INDEX_RECORD.size]))
+
+    def last_index_record(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                size = f.seek(0, os.SEEK_END)
+                size -= size % INDEX_RECORD.size
+                if not size:
+                    return None
+                f.seek(size - INDEX_RECORD.size)
+                return INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))
+        except FileNotFoundError:
+            return None
+
+    def read_at(self, offsets):
+        """The entries whose lines start at ``offsets``, in that order"""
+        entries = []
+        with open(self.path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                entries.append(_decode(f.readline()))
+        return entries
+
+
+def _count_lines(fd, start, end):
+    lines = 0
+    while start < end:
+        block = os.pread(fd, min(READ_BLOCK_BYTES * 16, end - start), start)
+        if not block:
+            break
+        lines += block.count(b'\n')
+        start += len(block)
+    return lines
+
+
+def _iter_lines(path, offset=0):
+    """Complete lines of ``path`` from byte ``offset``, as ``(offset, line)``"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                return  # A write still in progress
+            yield offset, line
+            offset += len(line)
+
+
+def _decode(line):
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    return entry if isinstance(entry, dict) else None
+
+
+class SegmentedLog:
+    """Append-only JSONL log split into rotated segments with sparse indexes.
+
+    A new segment starts when the current one would exceed
+    ``max_segment_bytes`` or, with ``rotate_daily``, on the first write of a
+    new UTC day. Every ``index_interval`` bytes a segment's ``.idx`` sidecar
+    records the entry number, byte offset and time of a line start, so tail,
+    time-range and entry-number reads seek instead of scanning. Appends from
+    several processes are serialized with a ``flock`` on the directory's
+    lock file.
+
+    With ``fields``, every entry also gets a fixed-size record in the
+    segment's ``.fields`` sidecar: its byte offset followed by
+    ``fields.summarize(entry)``, packed with the ``fields.record`` struct.
+    Queries filter those records instead of decoding the log.
+    """
+
+    def __init__(self, directory, max_segment_bytes=MAX_SEGMENT_BYTES, rotate_daily=True,
+                 index_interval=INDEX_INTERVAL_BYTES, legacy_path=None, fields=None):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.rotate_daily = rotate_daily
+        self.index_interval = index_interval
+        # A single-file log from before segmentation, adopted as the first segment
+        self.legacy_path = legacy_path
+        self.fields = fields
+        self._segment = None
+        self._fd = None
+        self._index_fd = None
+        self._fields_fd = None
+        self._size = 0
+        self._next_entry = 0
+        self._last_indexed = None
+        self._day = None
+        self._lock_fd = None
+        self._lock_pid = None
+
+    # Writing. Callers serialize appends within a process.
+
+    @contextmanager
+    def _locked(self):
+        if self._lock_pid != os.getpid():
+            # flock belongs to the open file, which a forked child shares
+            os.makedirs(self.directory, exist_ok=True)
+            self._lock_fd = os.open(os.path.join(self.directory, '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+            self._lock_pid = os.getpid()
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def append(self, data, count, summaries=None):
+        """Append ``count`` encoded lines, rotating and indexing as needed.
+
+        ``summaries`` are the entries' ``fields.summarize`` results, when the
+        caller still has the entries; otherwise the lines are decoded here.
+        """
+        if self.fields and summaries is None:
+            summaries = [self._summarize_line(line) for line in data.split(b'\n')[:-1]]
+        with self._locked():
+            self._catch_up()
+            now = time.time()
+            if self._size and (self._size + len(data) > self.max_segment_bytes
+                               or (self.rotate_daily and self._day != _utc_day(now))):
+                self._open_segment(Segment(self.directory, self._next_entry), now)
+
+            points = self._index_points(data, now)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view):]
+            if points:
+                os.write(self._index_fd, b''.join(INDEX_RECORD.pack(*point) for point in points))
+            if self.fields:
+                os.write(self._fields_fd, self._field_records(data, summaries))
+            self._size += len(data)
+            self._next_entry += count
+
+    def _summarize_line(self, line):
+        return self.fields.summarize(_decode(line) or {})
+
+    def _field_records(self, data, summaries):
+        records = []
+        pos = 0
+        for summary in summaries:
+            records.append(self.fields.record.pack(self._size + pos, *summary))
+            pos = data.index(b'\n', pos) + 1
+        return b''.join(records)
+
+    def _index_points(self, data, now):
+        """Index records due within ``data``, at line starts"""
+        points = []
+        entry, pos = self._next_entry, 0
+        while pos < len(data):
+            if self._last_indexed is not None:
+                due = self._last_indexed + self.index_interval - self._size
+                if due > pos:
+                    newline = data.find(b'\n', due - 1)
+                    if newline < 0 or newline + 1 >= len(data):
+                        break
+                    entry += data.count(b'\n', pos, newline + 1)
+                    pos = newline + 1
+            points.append((entry, self._size + pos, now))
+            self._last_indexed = self._size + pos
+        return points
+
+    def _catch_up(self):
+        """Sync the writer state with the newest segment, which another
+        process may have created or appended to"""
+        segments = self._list_segments()
+        if not segments:
+            self._adopt_legacy()
+            segments = self._list_segments() or [Segment(self.directory, 0)]
+        if self._segment is None or segments[-1].base != self._segment.base:
+            self._open_segment(segments[-1], time.time())
+        elif os.fstat(self._fd).st_size != self._size:
+            self._resume()
+
+    def _open_segment(self, segment, now):
+        if self._fd is not None:
+            self.fsync()
+            self._close_fds()
+        os.makedirs(self.directory, exist_ok=True)
+        self._segment = segment
+        self._fd = os.open(segment.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self._index_fd = os.open(segment.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if self.fields:
+            self._fields_fd = os.open(segment.fields_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        record = segment.read_index()[:1]
+        self._day = _utc_day(record[0][2] if record else now)
+        self._resume()
+
+    def _resume(self):
+        """Recompute the next entry number from the last index record and
+        the lines written after it"""
+        record = self._segment.last_index_record()
+        if record is None:
+            entry, offset, self._last_indexed = self._segment.base, 0, None
+        else:
+            entry, offset, _ = record
+            self._last_indexed = offset
+        self._size = os.fstat(self._fd).st_size
+        self._next_entry = entry + _count_lines(self._fd, offset, self._size)
+        if self.fields:
+            self._repair_fields()
+
+    def _repair_fields(self):
+        """Add the field records of lines a crash left without them"""
+        record = self.fields.record
+        size = os.fstat(self._fields_fd).st_size
+        have = size // record.size
+        if self._segment.base + have >= self._next_entry:
+            return
+        os.ftruncate(self._fields_fd, have * record.size)
+        offset, skip = 0, 0
+        if have:
+            offset = record.unpack(os.pread(self._fields_fd, record.size, (have - 1) * record.size))[0]
+            skip = 1
+        records = []
+        for line_offset, line in _iter_lines(self._segment.path, offset):
+            if skip:
+                skip -= 1
+                continue
+            records.append(record.pack(line_offset, *self._summarize_line(line)))
+        os.write(self._fields_fd, b''.join(records))
+
+    def _adopt_legacy(self):
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        segment = Segment(self.directory, 0)
+        os.makedirs(self.directory, exist_ok=True)
+        os.replace(self.legacy_path, segment.path)
+        self.build_index(segment)
+        if self.fields:
+            self.build_fields(segment)
+
+    def build_index(self, segment):
+        """(Re)write ``segment``'s index from its content, timed by entry timestamps"""
+        points = []
+        next_due = 0
+        for number, (offset, line) in enumerate(_iter_lines(segment.path), segment.base):
+            if offset < next_due:
+                continue
+            entry = _decode(line) or {}
+            try:
+                unix_time = _unix_time(entry["timestamp"])
+            except (KeyError, TypeError, ValueError):
+                unix_time = points[-1][2] if points else 0.0
+            points.append((number, offset, unix_time))
+            next_due = offset + self.index_interval
+        with open(segment.index_path, 'wb') as f:
+            f.write(b''.join(INDEX_RECORD.pack(*point) for point in points))
+
+    def build_fields(self, segment):
+        """(Re)write ``segment``'s field records from its content"""
+        with open(segment.fields_path, 'wb') as f:
+            f.write(b''.join(self.fields.record.pack(offset, *self._summarize_line(line))
+                             for offset, line in _iter_lines(segment.path)))
+
+    def ensure_fields(self, segments):
+        """Build the field records of segments written before ``fields`` was set"""
+        missing = [segment for segment in segments if not os.path.exists(segment.fields_path)]
+        if missing:
+            with self._locked():
+                for segment in missing:
+                    if not os.path.exists(segment.fields_path):
+                        self.build_fields(segment)
+
+    def fsync(self):
+        if self._fd is not None:
+            os.fsync(self._fd)
+            os.fsync(self._index_fd)
+            if self._fields_fd is not None:
+                os.fsync(self._fields_fd)
+
+    def _close_fds(self):
+        for fd in (self._fd, self._index_fd, self._fields_fd):
+            if fd is not None:
+                os.close(fd)
+        self._fd = self._index_fd = self._fields_fd = None
+
+    def close(self):
+        if self._fd is not None:
+            self._close_fds()
+            self._segment = None
+
+    # Reading
+
+    def _list_segments(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        bases = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)]) for name in names
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+        return [Segment(self.directory, base) for base in bases]
+
+    def segments(self):
+        """Segments in entry order"""
+        segments = self._list_segments()
+        if not segments and self.legacy_path and os.path.exists(self.legacy_path):
+            with self._locked():
+                if not self._list_segments():
+                    self._adopt_legacy()
+            segments = self._list_segments()
+        return segments
+
+    def segment_paths(self):
+        return [segment.path for segment in self.segments()]
+
+    def tail(self, n):
+        """The last ``n`` entries, oldest first, reading backwards from the end"""
+        lines = []
+        for segment in reversed(self.segments()):
+            lines = self._last_lines(segment.path, n - len(lines)) + lines
+            if len(lines) >= n:
+                break
+        entries = (_decode(line) for line in lines)
+        return [entry for entry in entries if entry is not None]
+
+    @staticmethod
+    def _last_lines(path, n):
+        if n <= 0:
+            return []
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return []
+        with f:
+            end = f.seek(0, os.SEEK_END)
+            data = b''
+            while end > 0 and data.count(b'\n') <= n:
+                start = max(0, end - READ_BLOCK_BYTES)
+                f.seek(start)
+                data = f.read(end - start) + data
+                end = start
+        # Drop a partially written last line
+        complete = data[:data.rfind(b'\n') + 1]
+        return complete.splitlines()[-n:]
+
+    def iter_entries(self):
+        """Every entry, oldest first; malformed lines are skipped"""
+        for segment in self.segments():
+            for _, line in _iter_lines(segment.path):
+                entry = _decode(line)
+                if entry is not None:
+                    yield entry
+
+    def iter_from(self, entry_number):
+        """``(number, entry)`` for every entry from ``entry_number`` on"""
+        segments = self.segments()
+        position = bisect_right([segment.base for segment in segments], entry_number) - 1
+        for segment in segments[max(position, 0):]:
+            number, offset = segment.base, 0
+            if segment.base <= entry_number:
+                index = segment.read_index()
+                point = bisect_right([record[0] for record in index], entry_number) - 1
+                if point >= 0:
+                    number, offset, _ = index[point]
+            for _, line in _iter_lines(segment.path, offset):
+                if number >= entry_number:
+                    entry = _decode(line)
+                    if entry is not None:
+                        yield number, entry
+                number += 1
+
+    def iter_range(self, start=None, end=None):
+        """Entries whose ``timestamp`` is in ``[start, end)``, oldest first.
+
+        ``start`` and ``end`` are naive UTC datetimes or ISO strings.
+        """
+        start, end = _iso(start), _iso(end)
+        start_time = _unix_time(start) - CLOCK_SLACK if start else None
+        stop_time = _unix_time(end) + CLOCK_SLACK if end else None
+
+        segments = self.segments()
+        indexes = [segment.read_index() for segment in segments]
+        for position, (segment, index) in enumerate(zip(segments, indexes)):
+            following = next((i for i in indexes[position + 1:] if i), None)
+            if start_time is not None and following and following[0][2] < start_time:
+                continue  # The whole segment was written before the window
+            if stop_time is not None and index and index[0][2] > stop_time:
+                return
+
+            offset = 0
+            if start_time is not None and index:
+                point = bisect_right([record[2] for record in index], start_time) - 1
+                if point >= 0:
+                    offset = index[point][1]
+            # Offsets past which everything was written after the window
+            stop_offset = None
+            if stop_time is not None:
+                stop_offset = next((record[1] for record in index if record[2] > stop_time), None)
+
+            for line_offset, line in _iter_lines(segment.path, offset):
+                if stop_offset is not None and line_offset >= stop_offset:
+                    return
+                entry = _decode(line)
+                if entry is None:
+                    continue
+                timestamp = entry.get("timestamp")
+                if not isinstance(timestamp, str):
+                    continue
+                if (start is None or timestamp >= start) and (end is None or timestamp < end):
+                    yield entry
@@ -0,0 +1,171 @@
+"""Per-request stage timings: a ``Server-Timing`` header on every response,
+and a sampled fraction of requests written to ``logs/traces.jsonl``.
+
+Code marks a stage with ``with span("name"):``. Outside a traced request,
+or with both ``SERVER_TIMING=0`` and ``TRACE_SAMPLE_RATE=0``, ``span``
+returns a shared no-op context manager.
+
+    python -m app.utils.tracing fold logs/traces.jsonl > stacks.txt
+
+prints the sampled traces as folded stacks (self time in microseconds per
+``endpoint;stage;substage`` path), the input of flamegraph.pl and speedscope.
+"""
+import json
+import os
+import random
+import secrets
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime
+
+# Fraction of requests whose spans are written to the trace log
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0))
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '1') != '0'
+# Spans recorded individually per request; later ones only add to the
+# per-stage totals (a batch request can run thousands)
+MAX_SPANS = 256
+
+_current = ContextVar('trace', default=None)
+
+
+class Trace:
+    """The spans of one request; also the context manager of each span,
+    so that opening one allocates no object"""
+
+    __slots__ = ('started', 'sampled', 'spans', 'totals', 'parent', 'opening', 'stack')
+
+    def __init__(self, sampled):
+        self.started = time.perf_counter()
+        self.sampled = sampled
+        # [name, parent index or -1, start, end] in order of entry
+        self.spans = []
+        # name -> seconds, in order of first entry
+        self.totals = {}
+        self.parent = -1
+        self.opening = None
+        # (name, start, parent, index) of each open span
+        self.stack = []
+
+    def __enter__(self):
+        start = time.perf_counter()
+        spans = self.spans
+        index = len(spans)
+        if index < MAX_SPANS:
+            spans.append([self.opening, self.parent, start, None])
+        else:
+            index = None
+        self.stack.append((self.opening, start, self.parent, index))
+        if index is not None:
+            self.parent = index
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        name, start, self.parent, index = self.stack.pop()
+        totals = self.totals
+        totals[name] = totals.get(name, 0.0) + end - start
+        if index is not None:
+            self.spans[index][3] = end
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """Context manager timing one stage of the current request"""
+    trace = _current.get()
+    if trace is None:
+        return NO_SPAN
+    trace.opening = name
+    return trace
+
+
+def start_trace():
+    """Begin tracing the current request, if anything will use it"""
+    sampled = TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+    if SERVER_TIMING or sampled:
+        _current.set(Trace(sampled))
+
+
+def finish_trace(response, method, endpoint):
+    """Stop tracing; add the Server-Timing header and log a sampled trace"""
+    trace = _current.get()
+    if trace is None:
+        return response
+    _current.set(None)
+    total = time.perf_counter() - trace.started
+    if SERVER_TIMING:
+        metrics = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in trace.totals.items()]
+        metrics.append(f"total;dur={total * 1000:.3f}")
+        response.headers['Server-Timing'] = ', '.join(metrics)
+    if trace.sampled:
+        from app.utils.log_writer import log_writer, TRACE_LOG
+        started = trace.started
+        log_writer.write(TRACE_LOG, {
+            "timestamp": datetime.utcnow().isoformat(),
+            "trace_id": secrets.token_hex(8),
+            "method": method,
+            "endpoint": endpoint,
+            "status": response.status_code,
+            "duration_ms": round(total * 1000, 3),
+            "spans": [
+                {
+                    "name": name,
+                    "parent": parent,
+                    "start_ms": round((start - started) * 1000, 3),
+                    "duration_ms": round(((end if end is not None else started + total) - start) * 1000, 3),
+                }
+                for name, parent, start, end in trace.spans
+            ],
+        })
+    return response
+
+
+def clear_trace():
+    _current.set(None)
+
+
+def fold(lines):
+    """``{stack: self time in microseconds}`` over trace log lines"""
+    stacks = {}
+    for line in lines:
+        try:
+            trace = json.loads(line)
+            root = f"{trace['method']} {trace['endpoint']}"
+            spans = trace["spans"]
+        except (ValueError, KeyError, TypeError):
+            continue
+        paths = []
+        children = [0.0] * len(spans)
+        top_level = 0.0
+        for item in spans:
+            parent = item["parent"]
+            paths.append((paths[parent] if parent >= 0 else root) + ';' + item["name"])
+            if parent >= 0:
+                children[parent] += item["duration_ms"]
+            else:
+                top_level += item["duration_ms"]
+        for index, item in enumerate(spans):
+            stacks[paths[index]] = stacks.get(paths[index], 0.0) + item["duration_ms"] - children[index]
+        stacks[root] = stacks.get(root, 0.0) + trace["duration_ms"] - top_level
+    return {stack: max(0, round(ms * 1000)) for stack, ms in stacks.items()}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "fold":
+        sys.exit("usage: python -m app.utils.tracing fold <traces.jsonl>")
+    with open(sys.argv[2]) as f:
+        for stack, micros in sorted(fold(f).items()):
+            print(f"{stack} {micros}")
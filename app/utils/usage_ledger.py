@@ -0,0 +1,152 @@
+import atexit
+import json
+import logging
+import os
+import threading
+from datetime import date
+
+from app.utils.log_writer import DATA_DIR, LEGACY_USAGE_PATH, USAGE_LOG_PATH, adopt_legacy_json
+
+ROLLUP_PATH = os.path.join(DATA_DIR, 'api_usage_rollup.json')
+# Save the rollups after this many new ledger records
+CHECKPOINT_EVERY = 1000
+READ_BLOCK_BYTES = 1024 * 1024
+
+
+def parse_period(args):
+    """``(start, end)`` days from optional ``start``/``end`` request
+    arguments, as ``YYYY-MM-DD`` strings; raises ValueError"""
+    return tuple(
+        date.fromisoformat(args[key]).isoformat() if args.get(key) else None
+        for key in ('start', 'end')
+    )
+
+
+class UsageLedger:
+    """Per-user, per-day usage rollups over the append-only usage ledger.
+
+    Every worker appends billing records to the ledger through the log
+    writer. The rollups fold in the records appended since the last read,
+    from any worker, and are checkpointed with the ledger offset they cover,
+    so a restart resumes from there instead of rescanning the ledger.
+    """
+
+    def __init__(self, path=USAGE_LOG_PATH, checkpoint_path=ROLLUP_PATH,
+                 checkpoint_every=CHECKPOINT_EVERY, legacy_path=LEGACY_USAGE_PATH):
+        self.path = path
+        # Billing records from before the ledger, imported on first read
+        self.legacy_path = legacy_path
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        # user_id -> day -> {"calls", "cost", "endpoints": {endpoint: calls}}
+        self._days = {}
+        self._offset = 0
+        self._loaded = False
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        self._loaded = True
+        if self.legacy_path:
+            adopt_legacy_json(self.path, self.legacy_path)
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            self._offset = checkpoint["offset"]
+            self._days = checkpoint["days"]
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError):
+            logging.warning("Ignoring unreadable usage rollup checkpoint %s", self.checkpoint_path)
+            self._offset, self._days = 0, {}
+
+    def _add(self, record):
+        user_id = record.get("user_id")
+        timestamp = record.get("timestamp")
+        if not user_id or not isinstance(timestamp, str):
+            return
+        day = self._days.setdefault(str(user_id), {}).setdefault(
+            timestamp[:10], {"calls": 0, "cost": 0.0, "endpoints": {}})
+        calls = record.get("calls", 1)
+        day["calls"] += calls
+        day["cost"] += record.get("cost", 0)
+        endpoint = record.get("endpoint", "unknown")
+        day["endpoints"][endpoint] = day["endpoints"].get(endpoint, 0) + calls
+
+    def catch_up(self):
+        """Fold in the records appended to the ledger since the last read"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            try:
+                size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                size = 0
+            if size < self._offset:
+                # The ledger was replaced; rebuild from its start
+                self._offset, self._days = 0, {}
+            if size == self._offset:
+                return
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                while self._offset < size:
+                    block = f.read(min(READ_BLOCK_BYTES, size - self._offset))
+                    complete = block.rfind(b'\n') + 1
+                    if not complete:
+                        break  # A record still being written
+                    for line in block[:complete].splitlines():
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        if isinstance(record, dict):
+                            self._add(record)
+                            self._pending += 1
+                    self._offset += complete
+                    f.seek(self._offset)
+            if self._pending >= self.checkpoint_every:
+                self._checkpoint()
+
+    def _checkpoint(self):
+        temp_path = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        with open(temp_path, 'w') as f:
+            json.dump({"offset": self._offset, "days": self._days}, f)
+        os.replace(temp_path, self.checkpoint_path)
+        self._pending = 0
+
+    def checkpoint(self):
+        with self._lock:
+            if self._pending:
+                self._checkpoint()
+
+    def usage(self, user_id, start=None, end=None):
+        """Calls and cost of ``user_id`` per day in ``[start, end]``, both
+        inclusive ``YYYY-MM-DD`` days, and totalled over the period"""
+        self.catch_up()
+        with self._lock:
+            days = {
+                day: rollup for day, rollup in self._days.get(str(user_id), {}).items()
+                if (start is None or day >= start) and (end is None or day <= end)
+            }
+            endpoints = {}
+            for rollup in days.values():
+                for endpoint, calls in rollup["endpoints"].items():
+                    endpoints[endpoint] = endpoints.get(endpoint, 0) + calls
+            return {
+                "user_id": user_id,
+                "start": start,
+                "end": end,
+                "calls": sum(rollup["calls"] for rollup in days.values()),
+                "cost": round(sum(rollup["cost"] for rollup in days.values()), 2),
+                "endpoints": endpoints,
+                "days": [
+                    {"date": day, "calls": days[day]["calls"], "cost": round(days[day]["cost"], 2)}
+                    for day in sorted(days)
+                ]
+            }
+
+
+# Global instance
+usage_ledger = UsageLedger()
+atexit.register(usage_ledger.checkpoint)
@@ -0,0 +1,58 @@
+"""Timing helpers and the scoring and offer micro-benchmarks"""
+import time
+
+from app.utils.offers import generate_loan_offers
+from app.utils.scoring import calculate_score, classify_risk
+
+
+def time_calls(func, args_list, rounds=1):
+    """Call ``func(*args)`` for every entry of ``args_list``, ``rounds`` times.
+
+    Returns ``(latencies_ns, wall_seconds)``.
+    """
+    latencies = []
+    clock = time.perf_counter_ns
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for args in args_list:
+            start = clock()
+            func(*args)
+            latencies.append(clock() - start)
+    return latencies, time.perf_counter() - started
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, wall_seconds):
+    """Throughput and latency percentiles (in microseconds) of one benchmark"""
+    ordered = sorted(latencies)
+    return {
+        "calls": len(ordered),
+        "ops_per_sec": round(len(ordered) / wall_seconds, 1) if wall_seconds else 0,
+        "p50_us": round(percentile(ordered, 0.50) / 1000, 2),
+        "p99_us": round(percentile(ordered, 0.99) / 1000, 2),
+        "max_us": round(ordered[-1] / 1000, 2),
+    }
+
+
+def run_core_benchmarks(applications, rules, rounds=3):
+    """Time the scoring, tiering and offer functions over ``applications``"""
+    # Warm the compiled scoring plan so the first call is not measured cold
+    calculate_score(applications[0], rules)
+
+    scores = [calculate_score(application, rules)["total_score"] for application in applications]
+    results = {}
+
+    latencies, wall = time_calls(calculate_score, [(application, rules) for application in applications], rounds)
+    results["calculate_score"] = summarize(latencies, wall)
+
+    latencies, wall = time_calls(classify_risk, [(score,) for score in scores], rounds)
+    results["classify_risk"] = summarize(latencies, wall)
+
+    latencies, wall = time_calls(generate_loan_offers, list(zip(scores, applications)), rounds)
+    results["generate_loan_offers"] = summarize(latencies, wall)
+    return results
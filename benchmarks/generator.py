@@ -0,0 +1,131 @@
+"""Seeded generator of realistic finance applications for the benchmarks"""
+import json
+import os
+import random
+from datetime import date, timedelta
+
+from app.utils.scoring import numeric_curve_name
+
+RULES_PATH = os.path.join(os.path.dirname(__file__), '..', 'app', 'rules', 'finance.json')
+
+# (low, high, integer, higher_is_better) for each named numeric curve
+NUMERIC_RANGES = {
+    "credit_score": (480, 830, True, True),
+    "utilization": (0, 100, False, False),
+    "inquiries": (0, 12, True, False),
+    "past_due": (0, 4, True, False),
+    "balance": (500, 90000, False, True),
+    "deposits": (20000, 220000, False, True),
+    "nsf_count": (0, 5, True, False),
+    "negative_days": (0, 15, True, False),
+    "frequency": (5, 40, True, True),
+    "business_score": (10, 99, True, True),
+    "years": (0.1, 25, False, True),
+    "distance": (0, 60, False, False),
+    "asset_value": (0, 250000, False, True),
+    "default": (0, 100, False, True),
+}
+
+# Share of applications in each profile
+OWNER2_SHARE = 0.3
+DECLINE_SHARE = 0.15
+# Share of form answers that arrive as strings, as an HTML form posts them
+NUMERIC_STRING_SHARE = 0.05
+# Share of select answers in unusual case or padding, or not a listed option
+CATEGORICAL_NOISE_SHARE = 0.1
+
+
+def load_rules(path=RULES_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _skewed(rng, quality):
+    """A 0-1 draw centred on ``quality``, so answers of one application agree"""
+    return min(1.0, max(0.0, rng.gauss(quality, 0.2)))
+
+
+def _number(rng, key, quality):
+    low, high, integer, higher_is_better = NUMERIC_RANGES[numeric_curve_name(key)]
+    position = _skewed(rng, quality)
+    if not higher_is_better:
+        position = 1 - position
+    value = low + (high - low) * position
+    return round(value) if integer else round(value, 2)
+
+
+def _categorical(rng, options, quality):
+    # Options are listed best first
+    index = min(len(options) - 1, int((1 - _skewed(rng, quality)) * len(options)))
+    value = options[index]
+    if rng.random() < CATEGORICAL_NOISE_SHARE:
+        return rng.choice([value.upper(), f"  {value.lower()} ", "Unknown"])
+    return value
+
+
+def _date(rng):
+    return (date(2026, 1, 1) - timedelta(days=rng.randint(30, 25 * 365))).isoformat()
+
+
+def generate_application(rng, rules, numeric=False):
+    """One application answering every field in ``rules``.
+
+    Returns ``(application, profile)`` where ``profile`` is one of
+    ``"single_owner"``, ``"owner2"`` or ``"auto_decline"``. With
+    ``numeric=True`` every answer is a number, as ``/api/assess`` requires:
+    selects become a 0-100 rating and dates a number of years.
+    """
+    quality = rng.betavariate(5, 2)
+    roll = rng.random()
+    profile = "owner2" if roll < OWNER2_SHARE else "auto_decline" if roll < OWNER2_SHARE + DECLINE_SHARE else "single_owner"
+
+    application = {}
+    for fields in rules.values():
+        for key, rule in fields.items():
+            if key.startswith("owner2_") and profile != "owner2":
+                continue
+            options = rule.get("options")
+            data_type = rule.get("data_type")
+            if numeric:
+                if options:
+                    value = round(_skewed(rng, quality) * 100, 1)
+                elif data_type == "date":
+                    value = round(rng.uniform(0.1, 25), 1)
+                else:
+                    value = _number(rng, key, quality)
+            elif options:
+                value = _categorical(rng, options, quality)
+            elif data_type == "date":
+                value = _date(rng)
+            else:
+                value = _number(rng, key, quality)
+                if rng.random() < NUMERIC_STRING_SHARE:
+                    value = str(value)
+            application[key] = value
+
+    if profile == "owner2":
+        application["owner1_ownership_pct"] = rng.randint(10, 49)
+        application["owner2_ownership_pct"] = 100 - application["owner1_ownership_pct"]
+    else:
+        application["owner1_ownership_pct"] = rng.randint(50, 100)
+    if profile == "auto_decline":
+        if rng.random() < 0.5:
+            application["monthly_deposits"] = round(rng.uniform(1000, 19999), 2)
+        else:
+            application["deposit_frequency"] = rng.randint(0, 4)
+    if not numeric and rng.random() < 0.5:
+        # Let the scorer derive years in business from the start date
+        application.pop("years_in_business", None)
+    return application, profile
+
+
+def generate_applications(count, seed=0, numeric=False, rules=None):
+    """``count`` applications and their profiles, identical for the same seed"""
+    rng = random.Random(seed)
+    rules = rules if rules is not None else load_rules()
+    applications, profiles = [], []
+    for _ in range(count):
+        application, profile = generate_application(rng, rules, numeric)
+        applications.append(application)
+        profiles.append(profile)
+    return applications, profiles
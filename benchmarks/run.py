@@ -0,0 +1,153 @@
+"""Run the scoring and offer benchmarks and compare them against a stored baseline.
+
+    python -m benchmarks.run                  # run and compare with baseline.json
+    python -m benchmarks.run --save-baseline  # run and record a new baseline
+    python -m benchmarks.run --skip-web       # functions only, no Flask requests
+    python -m benchmarks.run --skip-startup   # no import-time and cold-start rounds
+
+Exits with status 1 if any benchmark regressed beyond ``--tolerance`` or a
+startup benchmark is over its budget.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+
+from benchmarks.core import run_core_benchmarks
+from benchmarks.generator import generate_applications, load_rules
+from benchmarks.startup import over_budget
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Left out of the scratch copy the web benchmarks run in
+SCRATCH_IGNORE = shutil.ignore_patterns('.git', 'data', 'logs', '__pycache__', 'attached_assets', '*.jsonl')
+
+
+def run_in_scratch(module, *args):
+    """Run ``python -m module *args <output>`` in a throwaway copy of the
+    tree and return the JSON it writes to ``<output>``.
+
+    Users, billing records, contribution rows and logs the requests create
+    land in the copy, never in this checkout's data/ or logs/.
+    """
+    with tempfile.TemporaryDirectory(prefix='bench-') as scratch:
+        tree = os.path.join(scratch, 'tree')
+        shutil.copytree(ROOT, tree, ignore=SCRATCH_IGNORE)
+        output_path = os.path.join(scratch, 'results.json')
+        subprocess.run(
+            [sys.executable, '-m', module, *map(str, args), output_path],
+            cwd=tree, check=True, stdout=subprocess.DEVNULL
+        )
+        with open(output_path) as f:
+            return json.load(f)
+
+
+def run_web_in_scratch(count, seed):
+    return run_in_scratch('benchmarks.web', count, seed)
+
+
+def run_startup_in_scratch(rounds, seed):
+    return run_in_scratch('benchmarks.startup', 'run', rounds, seed)
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of ``results`` against ``baseline``, as printable lines"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current["p50_us"] > previous["p50_us"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {previous['p50_us']}us -> {current['p50_us']}us")
+        if current["ops_per_sec"] * (1 + tolerance) < previous["ops_per_sec"]:
+            regressions.append(f"{name}: throughput {previous['ops_per_sec']}/s -> {current['ops_per_sec']}/s")
+    return regressions
+
+
+def print_report(results, baseline):
+    print(f"{'benchmark':<24}{'ops/s':>12}{'p50 us':>10}{'p99 us':>10}{'base p50':>10}{'change':>9}")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        base_p50 = change = ""
+        if previous and previous["p50_us"]:
+            base_p50 = previous["p50_us"]
+            change = f"{(result['p50_us'] / previous['p50_us'] - 1) * 100:+.1f}%"
+        print(f"{name:<24}{result['ops_per_sec']:>12}{result['p50_us']:>10}{result['p99_us']:>10}"
+              f"{base_p50:>10}{change:>9}")
+        if "statuses" in result and set(result["statuses"]) != {"200"}:
+            print(f"{'':<24}responses: {result['statuses']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=2000, help='applications per benchmark')
+    parser.add_argument('--web-count', type=int, default=300, help='requests per endpoint benchmark')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--rounds', type=int, default=3, help='passes over the applications per function')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown before a benchmark counts as regressed (0.25 = 25%%)')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--skip-web', action='store_true')
+    parser.add_argument('--startup-rounds', type=int, default=5, help='fresh interpreter starts timed')
+    parser.add_argument('--skip-startup', action='store_true')
+    args = parser.parse_args(argv)
+
+    rules = load_rules()
+    applications, profiles = generate_applications(args.count, args.seed, rules=rules)
+    mix = Counter(profiles)
+    print(f"{args.count} applications (seed {args.seed}): "
+          + ", ".join(f"{count} {profile}" for profile, count in sorted(mix.items())))
+
+    results = run_core_benchmarks(applications, rules, args.rounds)
+    if not args.skip_web:
+        results.update(run_web_in_scratch(args.web_count, args.seed))
+    if not args.skip_startup:
+        results.update(run_startup_in_scratch(args.startup_rounds, args.seed))
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+
+    print_report(results, baseline.get("results", {}))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                "environment": {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "cpus": os.cpu_count()
+                },
+                "parameters": {"count": args.count, "web_count": args.web_count,
+                               "seed": args.seed, "rounds": args.rounds,
+                               "startup_rounds": args.startup_rounds},
+                "results": results
+            }, f, indent=2)
+            f.write('\n')
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline.get("results", {}), args.tolerance)
+    if regressions:
+        print("\nRegressions beyond {:.0%}:".format(args.tolerance))
+        for line in regressions:
+            print(f"  {line}")
+    budget_overruns = over_budget(results)
+    if budget_overruns:
+        print("\nOver the startup budget:")
+        for line in budget_overruns:
+            print(f"  {line}")
+    return 1 if regressions or budget_overruns else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
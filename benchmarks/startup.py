@@ -0,0 +1,132 @@
+"""Import-time and cold-start benchmarks of the web app.
+
+Each round starts a fresh interpreter, as a recycled or newly scaled
+worker does, and times ``import main`` and the first requests it serves.
+Like web.py it writes users and logs next to the code, so ``run.py`` runs
+it in a scratch copy of the tree.
+
+    python -m benchmarks.startup run <rounds> <seed> <output.json>
+    python -m benchmarks.startup setup <state.json> <seed>  # the API user and request payloads
+    python -m benchmarks.startup measure <state.json>       # one timed start, JSON on stdout
+
+Nothing of the app may be imported at module level here: ``measure``
+runs before the clock starts.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+BENCH_USER = "startup"
+
+# Budgets for the p50 of each startup benchmark, in milliseconds
+STARTUP_BUDGET_MS = {
+    "import_main": 350,
+    "cold_start": 450,
+}
+
+
+def setup(state_path, seed):
+    """Create the benchmark user and the payloads of the first requests.
+
+    This first start also creates the databases and runs the one-time
+    migrations, so the measured starts are restarts of a deployed app.
+    """
+    from main import app
+    from app.models.user import user_manager
+    from benchmarks.generator import generate_applications, load_rules
+
+    user_manager.create_user(BENCH_USER, BENCH_USER, "startup@example.com")
+    user_manager.update_subscription(BENCH_USER, "premium")
+    credentials = user_manager.generate_api_credentials(BENCH_USER)
+    rules = load_rules()
+    api_payloads, _ = generate_applications(1, seed, numeric=True, rules=rules)
+    form_payloads, _ = generate_applications(1, seed, rules=rules)
+    # One request through the app so every lazily created file exists
+    app.test_client().get("/api/health")
+    with open(state_path, 'w') as f:
+        json.dump({
+            "headers": {
+                "X-API-Key": credentials["api_key"],
+                "X-API-Token": credentials["api_token"],
+                "X-User-ID": BENCH_USER,
+            },
+            "api_payload": api_payloads[0],
+            "form_payload": form_payloads[0],
+        }, f)
+
+
+def measure(state_path):
+    """Time ``import main`` and the first requests of this interpreter.
+
+    Nothing of the app is imported before the clock starts.
+    """
+    with open(state_path) as f:
+        state = json.load(f)
+    start = time.perf_counter_ns()
+    from main import app
+    imported = time.perf_counter_ns()
+    client = app.test_client()
+    statuses = [
+        client.get("/api/health").status_code,
+        client.post("/api/assess", json=state["api_payload"], headers=state["headers"]).status_code,
+        client.post("/score/finance", json=state["form_payload"]).status_code,
+    ]
+    served = time.perf_counter_ns()
+    return {
+        "import_main": imported - start,
+        "cold_start": served - start,
+        "statuses": statuses,
+    }
+
+
+def run_startup_benchmarks(rounds, seed, state_path):
+    """Time ``rounds`` fresh starts; results as in benchmarks.core.summarize"""
+    from benchmarks.core import summarize
+
+    subprocess.run([sys.executable, '-m', 'benchmarks.startup', 'setup', state_path, str(seed)],
+                   check=True, stdout=subprocess.DEVNULL)
+    latencies = {name: [] for name in STARTUP_BUDGET_MS}
+    statuses = {}
+    started = time.perf_counter()
+    for _ in range(rounds):
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.startup', 'measure', state_path],
+                                check=True, capture_output=True, text=True).stdout
+        timings = json.loads(output.splitlines()[-1])
+        for name in latencies:
+            latencies[name].append(timings[name])
+        for code in timings["statuses"]:
+            statuses[str(code)] = statuses.get(str(code), 0) + 1
+    wall = time.perf_counter() - started
+    results = {}
+    for name, values in latencies.items():
+        results[name] = summarize(values, wall)
+        results[name]["budget_ms"] = STARTUP_BUDGET_MS[name]
+    results["cold_start"]["statuses"] = dict(sorted(statuses.items()))
+    return results
+
+
+def over_budget(results):
+    """Startup benchmarks whose p50 exceeds their budget, as printable lines"""
+    return [
+        f"{name}: p50 {result['p50_us'] / 1000:.1f}ms over its {result['budget_ms']}ms budget"
+        for name, result in results.items()
+        if "budget_ms" in result and result["p50_us"] > result["budget_ms"] * 1000
+    ]
+
+
+if __name__ == "__main__":
+    command = sys.argv[1]
+    if command == "setup":
+        setup(sys.argv[2], int(sys.argv[3]))
+    elif command == "measure":
+        print(json.dumps(measure(sys.argv[2])))
+    elif command == "run":
+        rounds, seed, output_path = int(sys.argv[2]), int(sys.argv[3]), sys.argv[4]
+        state_path = os.path.join(os.path.dirname(os.path.abspath(output_path)), 'startup-state.json')
+        results = run_startup_benchmarks(rounds, seed, state_path)
+        with open(output_path, 'w') as f:
+            json.dump(results, f)
+    else:
+        sys.exit(f"Unknown command {command!r}")
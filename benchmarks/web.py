@@ -0,0 +1,75 @@
+"""End-to-end benchmarks of /api/assess and /score/finance through the Flask test client.
+
+Requests write users, billing records and logs next to the code, so
+``run.py`` runs this module in a scratch copy of the tree and reads the
+JSON report it writes. It is not meant to be run against a working checkout.
+"""
+import json
+import sys
+import time
+
+from benchmarks.core import summarize
+from benchmarks.generator import generate_applications, load_rules
+
+BENCH_USER = "benchmark"
+
+
+def _remote_addr(index):
+    # One address per request keeps the per-IP rate limit out of the measurement
+    return f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}"
+
+
+def _post(client, path, payloads, headers=None):
+    latencies, statuses = [], {}
+    started = time.perf_counter()
+    for index, payload in enumerate(payloads):
+        start = time.perf_counter_ns()
+        response = client.post(path, json=payload, headers=headers,
+                               environ_base={"REMOTE_ADDR": _remote_addr(index)})
+        latencies.append(time.perf_counter_ns() - start)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    result = summarize(latencies, time.perf_counter() - started)
+    result["statuses"] = {str(code): count for code, count in sorted(statuses.items())}
+    return result
+
+
+def run_web_benchmarks(count, seed):
+    from main import app
+    from app.models.user import user_manager
+    from app.security.rate_limiting import rate_limiter
+
+    # The benchmark key's quota would throttle the measurement, as the
+    # per-IP limit would without one address per request
+    rate_limiter.quotas.tiers = {
+        tier: dict(quota, rate=1e9, burst=1e9, monthly=1e12)
+        for tier, quota in rate_limiter.quotas.tiers.items()
+    }
+
+    user_manager.create_user(BENCH_USER, BENCH_USER, "benchmark@example.com")
+    user_manager.update_subscription(BENCH_USER, "premium")
+    credentials = user_manager.generate_api_credentials(BENCH_USER)
+    headers = {
+        "X-API-Key": credentials["api_key"],
+        "X-API-Token": credentials["api_token"],
+        "X-User-ID": BENCH_USER,
+    }
+    client = app.test_client()
+    rules = load_rules()
+    api_payloads, _ = generate_applications(count, seed, numeric=True, rules=rules)
+    form_payloads, _ = generate_applications(count, seed, rules=rules)
+
+    # Warm up routing, templates and the rules registry outside the measurement
+    client.post("/score/finance", json=form_payloads[0])
+
+    results = {}
+    results["api_assess"] = _post(client, "/api/assess", api_payloads, headers)
+    # The same payloads again are identical retries, answered from the result cache
+    results["api_assess_cached"] = _post(client, "/api/assess", api_payloads, headers)
+    results["score_finance"] = _post(client, "/score/finance", form_payloads)
+    return results
+
+
+if __name__ == "__main__":
+    count, seed, output_path = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3]
+    with open(output_path, 'w') as f:
+        json.dump(run_web_benchmarks(count, seed), f)
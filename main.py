@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, g
 from app.routes.scorecard import scorecard_bp
 from app.routes.underwriting_insights import insights_bp
 from app.routes.admin import admin_bp
@@ -8,54 +8,21 @@ from app.routes.api import api_bp
 from app.routes.user_management import user_bp
 from app.security.rate_limiting import rate_limiter
 from app.security.audit_log import audit_logger
+from app.utils.rules_registry import rules_registry
+from app.utils.log_writer import log_writer, underwriting_log
+from app.utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
+from app.utils.tracing import clear_trace, finish_trace, span, start_trace
 import secrets
 import os
 import json
+import logging
+import time
 from datetime import datetime
 import random
-from collections import deque
-import threading
-import time
-
-# Buffered logging setup
-_log_buffer = deque()
-_log_buffer_lock = threading.Lock()
-_log_buffer_size = 10  # Buffer size before flushing
-
-def flush_log_buffer():
-    """Flush the log buffer to file"""
-    with _log_buffer_lock:
-        if not _log_buffer:
-            return
-            
-        log_path = os.path.join('logs', 'underwriting_data.jsonl')
-        os.makedirs(os.path.dirname(log_path), exist_ok=True)
-        
-        try:
-            with open(log_path, 'a') as f:
-                while _log_buffer:
-                    f.write(_log_buffer.popleft() + '\n')
-        except Exception as e:
-            print(f"Error flushing logs: {e}")
-
-def add_to_log_buffer(log_entry):
-    """Add entry to buffer and flush if needed"""
-    with _log_buffer_lock:
-        _log_buffer.append(json.dumps(log_entry))
-        if len(_log_buffer) >= _log_buffer_size:
-            flush_log_buffer()
-
-# Background thread to periodically flush logs
-def periodic_flush():
-    while True:
-        time.sleep(30)  # Flush every 30 seconds
-        flush_log_buffer()
-
-# Start background flush thread
-flush_thread = threading.Thread(target=periodic_flush, daemon=True)
-flush_thread.start()
 
 app = Flask(__name__)
+# Every worker's snapshot feeds /metrics; importing the library writes none
+metrics.enable_persistence()
 
 # Performance optimizations
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 31536000  # 1 year cache for static files
@@ -66,87 +33,22 @@ app.config['TEMPLATES_AUTO_RELOAD'] = False  # Disable in production
 def to_json_filter(obj):
     return json.dumps(obj)
 
-def analyze_historical_patterns(logs_path):
-    """Analyze historical underwriting data to identify patterns using streaming"""
-    patterns = {
-        'high_risk_indicators': [],
-        'low_risk_indicators': [],
-        'missing_data_points': [],
-        'score_correlations': {}
-    }
-    
+def analyze_historical_patterns(window_days=None):
+    """Top risk indicators and frequently missing fields from the
+    underwriting log: all of history, or the last ``window_days`` days"""
+    from app.utils.pattern_miner import pattern_miner
+
     try:
-        if not os.path.exists(logs_path):
-            return patterns
-            
-        # Stream processing - maintain aggregates only
-        total_entries = 0
-        high_score_count = 0
-        low_score_count = 0
-        all_fields = set()
-        field_missing_counts = {}
-        high_score_patterns = {}
-        low_score_patterns = {}
-        
-        with open(logs_path, 'r') as f:
-            for line_count, line in enumerate(f):
-                if line_count >= 500:  # Process last 500 entries max
-                    break
-                    
-                if line.strip():
-                    try:
-                        entry = json.loads(line.strip())
-                        total_entries += 1
-                        
-                        score = entry.get('score', {}).get('total_score', 0)
-                        input_data = entry.get('input', {})
-                        
-                        # Track all fields
-                        all_fields.update(input_data.keys())
-                        
-                        # Count missing fields
-                        for field in input_data.keys():
-                            if not input_data.get(field):
-                                field_missing_counts[field] = field_missing_counts.get(field, 0) + 1
-                        
-                        # Analyze score-based patterns (keep only aggregates)
-                        if score >= 70:
-                            high_score_count += 1
-                            for field, value in input_data.items():
-                                if value and isinstance(value, (str, int, float)):
-                                    key = f"{field}:{str(value)}"
-                                    high_score_patterns[key] = high_score_patterns.get(key, 0) + 1
-                        elif score < 50:
-                            low_score_count += 1
-                            for field, value in input_data.items():
-                                if value and isinstance(value, (str, int, float)):
-                                    key = f"{field}:{str(value)}"
-                                    low_score_patterns[key] = low_score_patterns.get(key, 0) + 1
-                                    
-                    except Exception:
-                        continue
-        
-        # Extract top patterns (most frequent)
-        if high_score_count > 0:
-            top_high_patterns = sorted(high_score_patterns.items(), key=lambda x: x[1], reverse=True)[:5]
-            patterns['low_risk_indicators'] = [pattern[0] for pattern in top_high_patterns]
-            
-        if low_score_count > 0:
-            top_low_patterns = sorted(low_score_patterns.items(), key=lambda x: x[1], reverse=True)[:5]
-            patterns['high_risk_indicators'] = [pattern[0] for pattern in top_low_patterns]
-        
-        # Identify frequently missing fields (>30% missing)
-        if total_entries > 0:
-            threshold = total_entries * 0.3
-            patterns['missing_data_points'] = [
-                field for field, count in field_missing_counts.items() 
-                if count > threshold
-            ]
-        
+        return pattern_miner.patterns(window_days)
     except Exception:
-        pass
-        
-    return patterns
+        logging.exception("Pattern analysis failed")
+        return {
+            'high_risk_indicators': [],
+            'low_risk_indicators': [],
+            'missing_data_points': [],
+            'score_correlations': {},
+            'entries': 0
+        }
 
 def extract_common_patterns(entries):
     """Extract common patterns from a set of entries"""
@@ -598,6 +500,24 @@ app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = 1800  # 30 minutes
 
+def request_route():
+    """The matched URL rule, which keeps metric labels few"""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+# Stage tracing: registered first, so the trace starts before the other
+# before_request hooks and its after_request hook runs after theirs
+@app.before_request
+def start_request_trace():
+    start_trace()
+
+@app.after_request
+def add_server_timing(response):
+    return finish_trace(response, request.method, request_route())
+
+@app.teardown_request
+def end_request_trace(error=None):
+    clear_trace()
+
 # Security headers middleware with caching optimization
 @app.after_request
 def add_security_headers(response):
@@ -613,11 +533,42 @@ def add_security_headers(response):
     
     return response
 
+@app.after_request
+def add_rate_limit_headers(response):
+    for name, value in g.get('rate_limit_headers', {}).items():
+        response.headers[name] = value
+    return response
+
+REQUEST_SECONDS = metrics.histogram(
+    'http_request_duration_seconds', 'Request latency by method, route and status',
+    ('method', 'endpoint', 'status'))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started, method=request.method,
+            endpoint=request_route(), status=response.status_code)
+    metrics.maybe_flush()
+    return response
+
 # Rate limiting middleware
 @app.before_request
 def check_rate_limit():
     if request.endpoint and request.endpoint.startswith('api.'):
-        if rate_limiter.is_rate_limited(request.remote_addr, 'api'):
+        # Views with their own @rate_limit are counted there, once; a failed
+        # authentication in front of one is counted by require_api_auth
+        if getattr(app.view_functions.get(request.endpoint), 'rate_limit_type', None):
+            return
+        with span('rate_limit'):
+            state = rate_limiter.check(request.remote_addr, 'api')
+            g.rate_limit_headers = rate_limiter.headers(state)
+        if not state.allowed:
             from app.security.audit_log import audit_logger
             audit_logger.log_security_violation('RATE_LIMIT_EXCEEDED', {
                 'ip': request.remote_addr,
@@ -649,50 +600,19 @@ def questionnaire():
     rules = get_cached_rules()
     return render_template('questionnaire.html', rules=rules)
 
-# Cache for rules to avoid repeated file reads
-_rules_cache = None
-_rules_cache_time = None
-
 def get_cached_rules():
-    global _rules_cache, _rules_cache_time
-    rules_path = os.path.join('app', 'rules', 'finance.json')
-    
-    # Check if we need to reload (cache for 10 minutes)
-    if (_rules_cache is None or 
-        _rules_cache_time is None or 
-        (datetime.now() - _rules_cache_time).seconds > 600):
-        
-        try:
-            with open(rules_path, 'r') as f:
-                _rules_cache = json.load(f)
-                _rules_cache_time = datetime.now()
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"Error loading rules: {e}")
-            # Use minimal fallback rules if file is corrupted/missing
-            _rules_cache = {
-                "Personal Credit Information": {},
-                "Business Information": {},
-                "Bank Analysis": {},
-                "Background & Verification": {},
-                "Online Presence & Digital Footprint": {},
-                "Collateral & Assets": {}
-            }
-            _rules_cache_time = datetime.now()
-        except Exception as e:
-            print(f"Unexpected error loading rules: {e}")
-            _rules_cache = {}
-            _rules_cache_time = datetime.now()
-    
-    return _rules_cache
+    """Rules dict of the currently published rule set"""
+    return rules_registry.current().rules
 
 @app.route('/builder')
 def builder():
     """Risk Assessment Builder - allows dynamic question management"""
+    from app.utils.scoring import NUMERIC_CURVES
     try:
         rules = get_cached_rules()
-        return render_template('builder.html', rules=rules)
+        return render_template('builder.html', rules=rules, curves=NUMERIC_CURVES)
     except Exception as e:
-        return render_template('builder.html', rules={})
+        return render_template('builder.html', rules={}, curves=NUMERIC_CURVES)
 
 @app.route('/builder/save', methods=['POST'])
 def save_builder_rules():
@@ -708,15 +628,71 @@ def save_builder_rules():
         if not isinstance(rules, dict):
             return "Invalid rules format", 400
 
-        # Save to file
-        rules_path = os.path.join('app', 'rules', 'finance.json')
-        with open(rules_path, 'w') as f:
-            json.dump(rules, f, indent=2)
+        # Publish atomically; other workers pick up the new version on their next check
+        try:
+            ruleset = rules_registry.publish(rules)
+        except ValueError as e:
+            return f"Invalid scoring rules: {str(e)}", 400
 
-        return "Rules saved successfully", 200
+        return f"Rules saved successfully as {ruleset.label}", 200
     except Exception as e:
         return f"Error saving rules: {str(e)}", 500
 
+@app.route('/builder/backtest', methods=['POST'])
+def backtest_builder_rules():
+    """Replay the underwriting log under candidate rules and compare with the published rules"""
+    from app.utils.backtest import run_backtest
+    from app.utils.scoring import validate_rules
+
+    payload = request.get_json(silent=True) or {}
+    candidate = payload.get('rules')
+    try:
+        validate_rules(candidate)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid scoring rules: {str(e)}"}), 400
+
+    try:
+        ruleset = rules_registry.current()
+        # Include assessments still queued for the log
+        log_writer.flush()
+        report = run_backtest(candidate, ruleset.rules)
+        report["baseline_rules_version"] = ruleset.label
+        return jsonify(report)
+    except Exception as e:
+        return jsonify({"error": f"Error running backtest: {str(e)}"}), 500
+
+@app.route('/builder/weight-impact', methods=['POST'])
+def builder_weight_impact():
+    """Re-weight every stored assessment under the proposed rules' weights"""
+    from app.utils.contributions import contribution_store
+    from app.utils.scoring import validate_rules
+
+    payload = request.get_json(silent=True) or {}
+    proposed = payload.get('rules')
+    try:
+        validate_rules(proposed)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid scoring rules: {str(e)}"}), 400
+
+    try:
+        return jsonify(contribution_store.weight_impact(get_cached_rules(), proposed))
+    except Exception as e:
+        return jsonify({"error": f"Error computing weight impact: {str(e)}"}), 500
+
+@app.route('/builder/weight-impact/rebuild', methods=['POST'])
+def rebuild_weight_impact_store():
+    """Rebuild the stored per-field contributions from the underwriting log"""
+    from app.utils.contributions import contribution_store
+
+    log_writer.flush()
+    if not underwriting_log.segments():
+        return jsonify({"error": "No underwriting log found"}), 404
+    try:
+        written = contribution_store.rebuild_from_log(underwriting_log, get_cached_rules())
+        return jsonify({"status": "success", "applications": written})
+    except Exception as e:
+        return jsonify({"error": f"Error rebuilding contributions: {str(e)}"}), 500
+
 @app.route('/builder/test', methods=['POST'])
 def test_builder_scoring():
     """Test scoring with current rules"""
@@ -767,16 +743,21 @@ def get_ai_question_suggestions():
         category = request_data.get('category', 'general')
         existing_questions = request_data.get('existing_questions', [])
         
-        # Quick response with basic suggestions if complex processing is needed
-        basic_suggestions = get_basic_question_suggestions(category)
+        existing_questions = [
+            question for question in existing_questions
+            if isinstance(question, dict) and isinstance(question.get('text'), str)
+        ] if isinstance(existing_questions, list) else []
         
-        # For now, return basic suggestions immediately to avoid blocking
-        # In production, you could use threading.Thread or a task queue here
+        # Sketches over the log's recent days; reads only what was appended
+        # since the last request
+        from app.utils.pattern_miner import RECENT_DAYS
+        data_patterns = analyze_historical_patterns(RECENT_DAYS)
+        suggestions = generate_smart_questions(category, existing_questions, data_patterns)
         
         return jsonify({
-            "suggestions": basic_suggestions,
+            "suggestions": suggestions or get_basic_question_suggestions(category),
             "market_insights": get_current_market_insights(),
-            "data_patterns": {"note": "Streaming analysis enabled"}
+            "data_patterns": data_patterns
         })
         
     except Exception as e:
@@ -819,13 +800,8 @@ def not_found(error):
 
 @app.route('/admin')
 def admin_dashboard():
-    import os, json
-    log_path = os.path.join(os.path.dirname(__file__), 'logs', 'underwriting_data.jsonl')
-    logs = []
     try:
-        if os.path.exists(log_path):
-            with open(log_path, 'r') as f:
-                logs = [json.loads(line.strip()) for line in f.readlines() if line.strip()][-10:]  # Last 10, skip empty lines
+        logs = underwriting_log.tail(10)
     except Exception as e:
         print(f"Error loading admin logs: {e}")
         logs = []
@@ -837,11 +813,15 @@ def health_check():
     """Health check endpoint to monitor application status"""
     try:
         # Basic health checks
-        rules = get_cached_rules()
+        from app.utils.result_cache import assessment_cache
+        ruleset = rules_registry.current()
         return jsonify({
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
-            "rules_loaded": len(rules) > 0
+            "rules_loaded": len(ruleset.rules) > 0,
+            "rules_version": ruleset.describe(),
+            "assessment_cache": assessment_cache.stats(),
+            "log_writer": log_writer.stats()
         }), 200
     except Exception as e:
         return jsonify({
@@ -850,6 +830,11 @@ def health_check():
             "timestamp": datetime.now().isoformat()
         }), 500
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Metrics of every worker in the Prometheus text format"""
+    return app.response_class(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
 if __name__ == '__main__':
     # Reduce debug logging in production to prevent memory leaks
     import logging
@@ -0,0 +1,59 @@
+import json
+import os
+import random
+
+import pytest
+
+RULES_PATH = os.path.join(os.path.dirname(__file__), '..', 'app', 'rules', 'finance.json')
+
+
+@pytest.fixture(scope="session")
+def rules():
+    with open(RULES_PATH) as f:
+        return json.load(f)
+
+
+def _value(rng, options):
+    """An answer of any shape a client has sent: numbers, numeric strings,
+    listed and unlisted options, booleans, blanks and junk"""
+    choice = rng.random()
+    if choice < 0.1:
+        return None
+    if choice < 0.15:
+        return ""
+    if choice < 0.2:
+        return rng.choice(["yes", "No", "passed", "garbage", "  Good ", "nan", "inf"])
+    if options and choice < 0.6:
+        return rng.choice(options + ["Not Rated", "A+"])
+    if choice < 0.7:
+        return str(rng.choice([0, 1, 2, 3, -1, 0.5, rng.uniform(-10, 200000)]))
+    if choice < 0.72:
+        return [1]
+    return rng.choice([0, 1, 2, 3, 5, 10, 11, -1, 0.5, 2.5, True,
+                       rng.uniform(0, 100), rng.uniform(0, 300000)])
+
+
+@pytest.fixture(scope="session")
+def make_applications(rules):
+    """``make_applications(count, seed)``: seeded applications covering the
+    odd inputs scoring has to treat exactly as before"""
+    options = {key: rule.get("options") for fields in rules.values() for key, rule in fields.items()}
+
+    def make(count, seed=0):
+        rng = random.Random(seed)
+        applications = []
+        for _ in range(count):
+            application = {key: _value(rng, options[key]) for key in options if rng.random() < 0.85}
+            if rng.random() < 0.5:
+                application["owner1_ownership_pct"] = rng.choice([30, "40", 60, None, "x"])
+            if rng.random() < 0.3:
+                application["business_start_date"] = rng.choice(["2019-01-01", "2024-06-30", "bad"])
+                application["years_in_business"] = rng.choice([None, 0, ""])
+            if rng.random() < 0.5:
+                # Clear of the auto-decline thresholds, so scores are not all zero
+                application["monthly_deposits"] = rng.uniform(20000, 200000)
+                application["deposit_frequency"] = rng.randint(5, 30)
+            applications.append(application)
+        return applications
+
+    return make
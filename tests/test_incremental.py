@@ -0,0 +1,106 @@
+import copy
+import random
+import threading
+
+import pytest
+
+from app.utils.incremental import RevisionConflict, ScoringState, ScoringStateStore
+from app.utils.scoring import calculate_score
+
+
+def scorable(application):
+    """calculate_score raises, as it always has, on a business start date
+    that is not a string; edits between two applications must not meet one"""
+    return isinstance(application.get("business_start_date", ""), (str, type(None)))
+
+
+def test_edits_match_a_full_rescore(rules, make_applications):
+    rng = random.Random(7)
+    state = ScoringState(rules)
+    for target in make_applications(300, seed=8):
+        if not scorable(target):
+            continue
+        # Edit towards the next application a few fields at a time,
+        # removing the fields it does not have
+        keys = list(set(state.inputs) | set(target))
+        rng.shuffle(keys)
+        for start in range(0, len(keys), 9):
+            changes = {key: target.get(key) for key in keys[start:start + 9]}
+            update = state.update(changes, rules)
+            assert update.inputs == state.inputs
+            assert update.result == calculate_score(state.inputs, rules)
+        assert state.inputs == {key: value for key, value in target.items() if value is not None}
+
+
+def test_owner2_and_decline_triggers(rules):
+    state = ScoringState(rules)
+    base = {"monthly_deposits": 50000, "deposit_frequency": 10, "owner1_credit_score": 720,
+            "owner2_credit_score": 500}
+    assert state.update(base, rules).result == calculate_score(base, rules)
+
+    # Owner 2 fields start to count once owner 1 owns under half
+    inputs = dict(base, owner1_ownership_pct=40)
+    assert state.update({"owner1_ownership_pct": 40}, rules).result == calculate_score(inputs, rules)
+    inputs["deposit_frequency"] = 2
+    result = state.update({"deposit_frequency": 2}, rules).result
+    assert result == calculate_score(inputs, rules)
+    assert result["auto_decline"]
+
+
+def test_rules_change_rebuilds_the_state(rules):
+    state = ScoringState(rules)
+    inputs = {"owner1_credit_score": 700, "intelliscore": 80, "monthly_deposits": 30000, "deposit_frequency": 9}
+    state.update(inputs, rules)
+
+    reweighted = copy.deepcopy(rules)
+    for fields in reweighted.values():
+        for rule in fields.values():
+            rule["weight"] = rule.get("weight", 0) * 2 + 1
+    assert state.update({"intelliscore": 60}, reweighted).result == \
+        calculate_score(dict(inputs, intelliscore=60), reweighted)
+
+
+def test_update_on_a_stale_revision_conflicts(rules):
+    state = ScoringState(rules)
+    first = state.update({"owner1_credit_score": 700}, rules, revision=0)
+    assert first.revision == 1
+    with pytest.raises(RevisionConflict):
+        state.update({"owner1_credit_score": 500}, rules, revision=0)
+    assert state.inputs == {"owner1_credit_score": 700}
+    assert state.revision == 1
+
+
+def test_concurrent_updates_on_one_revision_apply_once(rules):
+    for _ in range(20):
+        state = ScoringState(rules)
+        barrier = threading.Barrier(2)
+        outcomes = []
+
+        def edit(value):
+            barrier.wait()
+            try:
+                outcomes.append(state.update({"intelliscore": value}, rules, revision=0).revision)
+            except RevisionConflict:
+                outcomes.append("conflict")
+
+        threads = [threading.Thread(target=edit, args=(value,)) for value in (40, 90)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(outcomes, key=str) == [1, "conflict"]
+        assert state.revision == 1
+
+
+def test_store_expires_and_bounds_states(rules, monkeypatch):
+    store = ScoringStateStore(max_states=2, ttl=60)
+    first, _ = store.create(rules)
+    second, _ = store.create(rules)
+    third, _ = store.create(rules)
+    assert store.get(first) is None
+    assert store.get(second) is not None
+
+    import app.utils.incremental as incremental
+    now = incremental.time.time()
+    monkeypatch.setattr(incremental.time, "time", lambda: now + 61)
+    assert store.get(third) is None
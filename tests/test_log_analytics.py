@@ -0,0 +1,91 @@
+import json
+import math
+import statistics
+
+import pytest
+
+from app.utils.log_analytics import LogAnalytics
+from app.utils.segmented_log import SegmentedLog
+
+
+def make_entry(number):
+    return {
+        "score": {"total_score": (number * 37) % 101},
+        "input": {
+            "industry_type": ["Retail", " ", "Trucking"][number % 3],
+            "monthly_deposits": number * 1000,
+            "owner1_credit_score": 600 + number % 200,
+        },
+        "pad": "x" * (number % 150),
+    }
+
+
+def append(log, entries):
+    log.append(''.join(json.dumps(entry) + '\n' for entry in entries).encode(), len(entries))
+
+
+def expected(entries):
+    scores = [entry["score"]["total_score"] for entry in entries]
+    return {
+        "entries": len(entries),
+        "average_score": pytest.approx(statistics.fmean(scores)),
+        "score_std_dev": pytest.approx(statistics.pstdev(scores)),
+        "score_min": min(scores),
+        "score_max": max(scores),
+        "field_frequency": {"industry_type": sum(1 for n in range(len(entries)) if n % 3 != 1)},
+        "field_averages": {
+            "monthly_deposits": pytest.approx(statistics.fmean(n * 1000 for n in range(len(entries)))),
+            "owner1_credit_score": pytest.approx(statistics.fmean(600 + n % 200 for n in range(len(entries)))),
+        },
+    }
+
+
+@pytest.fixture
+def log(tmp_path):
+    return SegmentedLog(str(tmp_path / "log"), max_segment_bytes=10_000, rotate_daily=False)
+
+
+def test_statistics_follow_the_log_across_segments(log, tmp_path):
+    analytics = LogAnalytics(log, str(tmp_path / "analytics.json"))
+    entries = [make_entry(n) for n in range(500)]
+    for start in range(0, 500, 50):
+        append(log, entries[start:start + 50])
+        assert analytics.snapshot() == expected(entries[:start + 50])
+    assert len(log.segments()) > 3
+
+
+def test_checkpoints_resume_where_they_stopped(log, tmp_path):
+    path = str(tmp_path / "analytics.json")
+    entries = [make_entry(n) for n in range(300)]
+    append(log, entries[:200])
+    analytics = LogAnalytics(log, path, checkpoint_every=50)
+    analytics.snapshot()
+    with open(path) as f:
+        assert json.load(f)["stats"]["entries"] == 200
+
+    append(log, entries[200:])
+    resumed = LogAnalytics(log, path)
+    assert resumed.snapshot() == expected(entries)
+
+
+def test_unreadable_checkpoints_and_replaced_logs_rebuild(log, tmp_path):
+    path = tmp_path / "analytics.json"
+    entries = [make_entry(n) for n in range(100)]
+    append(log, entries)
+    path.write_text('{"position": [0, 10], "stats": {"entries": 5}}')
+    assert LogAnalytics(log, str(path)).snapshot() == expected(entries)
+
+    analytics = LogAnalytics(log, str(path))
+    analytics.snapshot()
+    replaced = SegmentedLog(str(tmp_path / "other"), rotate_daily=False)
+    append(replaced, entries[:10])
+    analytics.log = replaced
+    assert analytics.snapshot() == expected(entries[:10])
+
+
+def test_odd_entries_count_without_breaking_the_statistics(log, tmp_path):
+    append(log, [{"score": {"total_score": math.inf}}, {"score": "high", "input": "none"},
+                 {"input": {"industry_type": "Retail", "flag": True}}])
+    snapshot = LogAnalytics(log, str(tmp_path / "analytics.json")).snapshot()
+    assert (snapshot["entries"], snapshot["average_score"], snapshot["score_max"]) == (3, 0, 0)
+    assert snapshot["field_frequency"] == {"industry_type": 1}
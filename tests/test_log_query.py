@@ -0,0 +1,116 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.utils.log_query import decode_cursor, encode_cursor, parse_filters, query_log, underwriting_fields
+from app.utils.segmented_log import SegmentedLog
+
+START = datetime(2026, 10, 1)
+TIERS = ["low", "moderate", "high", "super_high", None]
+INDUSTRIES = ["Retail", " retail ", "Trucking", None]
+
+
+def make_entry(number):
+    entry = {
+        "timestamp": (START + timedelta(minutes=number)).isoformat(),
+        "n": number,
+        "tier": TIERS[number % len(TIERS)],
+        "score": {"total_score": number % 101},
+        "input": {"industry_type": INDUSTRIES[number % len(INDUSTRIES)]},
+    }
+    if number % 3:
+        entry["source"] = "api"
+        entry["user_id"] = f"u{number % 2}"
+    return entry
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = SegmentedLog(str(tmp_path / "log"), max_segment_bytes=8_000, index_interval=1024,
+                       fields=underwriting_fields)
+    entries = [make_entry(n) for n in range(400)]
+    for start in range(0, len(entries), 13):
+        batch = entries[start:start + 13]
+        log.append(''.join(json.dumps(entry) + '\n' for entry in batch).encode(), len(batch))
+    assert len(log.segments()) > 3
+    return log
+
+
+def all_pages(log, filters, limit):
+    numbers, cursor, pages = [], None, 0
+    while True:
+        page = query_log(log, filters, cursor, limit)
+        assert page["count"] == len(page["entries"]) <= limit
+        numbers.extend(entry["log_id"] for entry in page["entries"])
+        assert all(entry["log_id"] == entry["n"] for entry in page["entries"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return numbers, pages
+
+
+def matches(entry, args):
+    if "user_id" in args and entry.get("user_id") != args["user_id"]:
+        return False
+    if "source" in args and (entry.get("source") or "scorecard") != args["source"]:
+        return False
+    industry = entry["input"]["industry_type"]
+    if "industry" in args and (industry or "").strip().lower() != args["industry"].lower():
+        return False
+    if "tier" in args and entry["tier"] != args["tier"]:
+        return False
+    if "min_score" in args and entry["score"]["total_score"] < float(args["min_score"]):
+        return False
+    if "start" in args and entry["timestamp"] < args["start"]:
+        return False
+    if "end" in args and entry["timestamp"] >= args["end"]:
+        return False
+    return True
+
+
+@pytest.mark.parametrize("args", [
+    {},
+    {"user_id": "u1"},
+    {"source": "scorecard"},
+    {"industry": "RETAIL", "tier": "low"},
+    {"min_score": "50", "source": "api"},
+    {"start": (START + timedelta(minutes=90)).isoformat(), "end": (START + timedelta(minutes=310)).isoformat()},
+])
+@pytest.mark.parametrize("limit", [1, 7, 50, 500])
+def test_cursor_pages_cover_every_match_once(log, args, limit):
+    filters = parse_filters(args)
+    expected = [n for n in reversed(range(400)) if matches(make_entry(n), args)]
+    numbers, pages = all_pages(log, filters, limit)
+    assert numbers == expected
+    assert pages == max(1, -(-len(expected) // limit))
+
+
+def test_cursor_survives_appends(log):
+    filters = parse_filters({"user_id": "u0"})
+    first = query_log(log, filters, limit=10)
+    entries = [make_entry(n) for n in range(400, 420)]
+    log.append(''.join(json.dumps(entry) + '\n' for entry in entries).encode(), len(entries))
+
+    second = query_log(log, filters, first["next_cursor"], limit=10)
+    assert second["entries"][0]["log_id"] < first["entries"][-1]["log_id"]
+    assert query_log(log, filters, limit=1)["entries"][0]["log_id"] >= 400
+
+
+def test_cursor_round_trip():
+    filters = parse_filters({"tier": "high", "min_score": "10"})
+    assert decode_cursor(encode_cursor(1234, filters), filters) == 1234
+
+
+def test_cursor_rejects_other_filters_and_garbage():
+    cursor = encode_cursor(10, parse_filters({"tier": "high"}))
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, parse_filters({"tier": "low"}))
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor", {})
+
+
+@pytest.mark.parametrize("args", [{"tier": "medium"}, {"min_score": "abc"}, {"start": "yesterday"}])
+def test_parse_filters_rejects_bad_values(args):
+    with pytest.raises(ValueError):
+        parse_filters(args)
@@ -0,0 +1,174 @@
+import json
+import threading
+
+import pytest
+
+from app.utils.log_writer import (
+    DROP, FSYNC_BATCH, FSYNC_INTERVAL, FSYNC_NONE, WRITE_THROUGH, LogSink, LogWriter, adopt_legacy_json
+)
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def writer():
+    writer = LogWriter(fsync_interval=3600)
+    yield writer
+    writer.close()
+
+
+def test_flush_writes_everything_queued(writer, tmp_path):
+    path = str(tmp_path / "a.jsonl")
+    writer.register("a", path)
+    for index in range(100):
+        writer.write("a", {"n": index})
+    writer.write_many("a", [{"n": 100}, {"n": 101}])
+    assert writer.flush()
+    assert [entry["n"] for entry in read_lines(path)] == list(range(102))
+    assert writer.stats()["sinks"]["a"]["written"] == 102
+
+
+def test_fsync_policies(writer, tmp_path):
+    sinks = {policy: writer.register(policy, str(tmp_path / f"{policy}.jsonl"), policy)
+             for policy in (FSYNC_NONE, FSYNC_INTERVAL, FSYNC_BATCH)}
+    for _ in range(3):
+        for policy in sinks:
+            writer.write(policy, {"policy": policy})
+        writer.flush()
+
+    assert sinks[FSYNC_BATCH].fsyncs == sinks[FSYNC_BATCH].batches >= 1
+    # The interval has not passed, and "none" never syncs
+    assert sinks[FSYNC_INTERVAL].fsyncs == 0
+    assert sinks[FSYNC_NONE].fsyncs == 0
+
+    writer.close()
+    assert sinks[FSYNC_INTERVAL].fsyncs == 1
+    assert sinks[FSYNC_NONE].fsyncs == 0
+
+
+def test_interval_sinks_sync_when_due(tmp_path):
+    writer = LogWriter(fsync_interval=0)
+    sink = writer.register("a", str(tmp_path / "a.jsonl"), FSYNC_INTERVAL)
+    writer.write("a", {})
+    writer.flush()
+    assert sink.fsyncs == 1
+    writer.close()
+
+
+class FailingSink(LogSink):
+    def __init__(self, *args, error=RuntimeError, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.error = error
+
+    def _write(self, data, count, summaries):
+        error, self.error = self.error, None
+        if error:
+            raise error("disk on fire")
+        super()._write(data, count, summaries)
+
+
+def test_writer_survives_any_exception(writer, tmp_path):
+    path = str(tmp_path / "a.jsonl")
+    sink = writer._sinks["a"] = FailingSink("a", path)
+    writer.write("a", {"n": 1})
+    assert writer.flush()
+    assert sink.errors == 1
+
+    writer.write("a", {"n": 2})
+    assert writer.flush()
+    assert writer.stats()["running"]
+    assert read_lines(path) == [{"n": 2}]
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_dead_writer_thread_is_restarted(writer, tmp_path, monkeypatch):
+    path = str(tmp_path / "a.jsonl")
+    writer.register("a", path)
+    writer.write("a", {"n": 1})
+    writer.flush()
+
+    # Kill the thread the way nothing it catches could
+    def die(batch):
+        raise SystemExit
+    monkeypatch.setattr(writer, "_commit", die)
+    writer.write("a", {"n": 2})
+    writer._thread.join(5)
+    assert not writer.stats()["running"]
+    monkeypatch.undo()
+
+    writer.write("a", {"n": 3})
+    assert writer.flush()
+    assert writer.stats()["running"]
+    assert read_lines(path) == [{"n": 1}, {"n": 3}]
+
+
+def test_global_fsync_override_never_weakens_a_sink(writer, tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_FSYNC_POLICY", FSYNC_NONE)
+    assert writer.register("usage", str(tmp_path / "u.jsonl"), FSYNC_BATCH).fsync == FSYNC_BATCH
+    assert writer.register("audit", str(tmp_path / "a.jsonl"), FSYNC_INTERVAL).fsync == FSYNC_INTERVAL
+
+    monkeypatch.setenv("LOG_FSYNC_POLICY", FSYNC_BATCH)
+    assert writer.register("audit", str(tmp_path / "a.jsonl"), FSYNC_INTERVAL).fsync == FSYNC_BATCH
+
+    monkeypatch.setenv("LOG_FSYNC_POLICY_AUDIT", FSYNC_NONE)
+    assert writer.register("audit", str(tmp_path / "a.jsonl"), FSYNC_INTERVAL).fsync == FSYNC_NONE
+    assert writer.register("usage", str(tmp_path / "u.jsonl"), FSYNC_BATCH).fsync == FSYNC_BATCH
+
+    monkeypatch.setenv("LOG_FSYNC_POLICY", "sometimes")
+    with pytest.raises(ValueError):
+        writer.register("traces", str(tmp_path / "t.jsonl"), FSYNC_NONE)
+
+
+class BlockingSink(LogSink):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def _write(self, data, count, summaries):
+        self.entered.set()
+        self.release.wait(5)
+        super()._write(data, count, summaries)
+
+
+def test_full_queue_drops_or_writes_through(tmp_path):
+    writer = LogWriter(max_queue=1, fsync_interval=3600)
+    blocker = writer._sinks["blocker"] = BlockingSink("blocker", str(tmp_path / "blocker.jsonl"))
+    dropping = writer.register("dropping", str(tmp_path / "dropping.jsonl"), on_full=DROP)
+    through = writer.register("through", str(tmp_path / "through.jsonl"), on_full=WRITE_THROUGH)
+
+    writer.write("blocker", {})
+    assert blocker.entered.wait(5)
+    writer.write("blocker", {})  # Fills the queue
+    writer.write("dropping", {"n": 1})
+    writer.write("through", {"n": 1})
+    assert (dropping.dropped, through.written_through) == (1, 1)
+    assert read_lines(str(tmp_path / "through.jsonl")) == [{"n": 1}]
+
+    blocker.release.set()
+    writer.close()
+    assert blocker.written == 2
+
+
+def test_legacy_json_is_adopted_once(writer, tmp_path):
+    path = str(tmp_path / "usage.jsonl")
+    legacy = tmp_path / "usage.json"
+    legacy.write_text(json.dumps([{"n": 1}, "junk", {"n": 2}]))
+    writer.register("usage", path, FSYNC_BATCH, WRITE_THROUGH, legacy_path=str(legacy))
+    writer.write("usage", {"n": 3})
+    writer.flush()
+
+    assert read_lines(path) == [{"n": 1}, {"n": 2}, {"n": 3}]
+    assert not legacy.exists()
+    assert (tmp_path / "usage.json.migrated").exists()
+    assert adopt_legacy_json(path, str(legacy)) == 0
+
+
+def test_unreadable_legacy_json_is_left_alone(tmp_path):
+    legacy = tmp_path / "usage.json"
+    legacy.write_text("{not json")
+    assert adopt_legacy_json(str(tmp_path / "usage.jsonl"), str(legacy)) == 0
+    assert legacy.exists()
@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.utils.metrics import MetricsRegistry, parse_text
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+
+def test_importing_instrumented_modules_writes_nothing(tmp_path):
+    directory = tmp_path / "metrics"
+    code = ("import app.utils.scoring, app.routes.api\n"
+            "from app.utils.metrics import metrics\n"
+            "metrics.counter('imported_total', 'x').inc()\n"
+            "metrics.maybe_flush()\n"
+            "metrics.render()\n")
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True,
+                   env={**os.environ, "METRICS_DIR": str(directory)})
+    assert not directory.exists()
+
+
+def test_without_persistence_render_shows_this_process(tmp_path):
+    registry = MetricsRegistry(str(tmp_path / "metrics"))
+    registry.counter("calls_total", "Calls", ("kind",)).inc(2, kind="a")
+    registry.histogram("call_seconds", "Call time", buckets=(0.1, 1.0)).observe(0.5)
+    registry.flush()
+    registry.close()
+
+    samples = parse_text(registry.render())
+    assert samples[("calls_total", '{kind="a"}')] == 2
+    assert samples[("call_seconds_bucket", '{le="1"}')] == 1
+    assert not (tmp_path / "metrics").exists()
+
+
+def test_persistent_registries_merge_across_processes(tmp_path):
+    directory = tmp_path / "metrics"
+    registry = MetricsRegistry(str(directory))
+    registry.enable_persistence()
+    registry.counter("calls_total", "Calls").inc(3)
+    registry.gauge("depth", "Queue depth").set(4)
+    registry.flush()
+    assert len(list(directory.glob("*.json"))) == 1
+
+    # A worker that has exited: its counter is kept, its gauge is not
+    exited = {"pid": 2 ** 22 + 1, "metrics": {
+        "calls_total": {"type": "counter", "help": "Calls", "labels": [], "samples": [[[], 5]]},
+        "depth": {"type": "gauge", "help": "Queue depth", "labels": [], "samples": [[[], 9]]},
+    }}
+    (directory / "exited.json").write_text(json.dumps(exited))
+
+    samples = parse_text(registry.render())
+    assert samples[("calls_total", "")] == 8
+    assert samples[("depth", "")] == 4
+    assert not (directory / "exited.json").exists()
+    # Folded into the archive, so counted once on every later render
+    assert parse_text(registry.render())[("calls_total", "")] == 8
+
+
+def test_metric_kinds_cannot_be_redefined(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    assert registry.counter("calls_total", "Calls") is registry.counter("calls_total", "Calls")
+    with pytest.raises(ValueError):
+        registry.gauge("calls_total", "Calls")
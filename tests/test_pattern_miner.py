@@ -0,0 +1,61 @@
+import random
+from collections import Counter
+
+from app.utils.pattern_miner import SpaceSaving
+
+
+def zipf_stream(size, items, seed):
+    rng = random.Random(seed)
+    weights = [1 / rank ** 1.2 for rank in range(1, items + 1)]
+    return rng.choices([f"item{rank}" for rank in range(items)], weights, k=size)
+
+
+def check_guarantees(summary, exact):
+    total = sum(exact.values())
+    assert summary.total == total
+    assert len(summary.counters) <= summary.capacity
+    for item, (count, error) in summary.counters.items():
+        # Counts are upper bounds at most ``error`` too high
+        assert count - error <= exact[item] <= count
+    for item, count in exact.items():
+        if count > total / summary.capacity:
+            assert item in summary.counters
+
+
+def test_space_saving_bounds_and_heavy_hitters():
+    stream = zipf_stream(20_000, 5_000, seed=1)
+    summary = SpaceSaving(64)
+    for item in stream:
+        summary.add(item)
+
+    exact = Counter(stream)
+    check_guarantees(summary, exact)
+    assert [item for item, _ in summary.top(5)] == [item for item, _ in exact.most_common(5)]
+
+
+def test_space_saving_merge_keeps_guarantees():
+    streams = [zipf_stream(8_000, 3_000, seed) for seed in range(4)]
+    summaries = []
+    for stream in streams:
+        summary = SpaceSaving(64)
+        for item in stream:
+            summary.add(item)
+        summaries.append(summary)
+
+    merged = summaries[0]
+    for summary in summaries[1:]:
+        merged = merged.merge(summary)
+    exact = Counter(item for stream in streams for item in stream)
+    check_guarantees(merged, exact)
+    assert [item for item, _ in merged.top(3)] == [item for item, _ in exact.most_common(3)]
+
+
+def test_space_saving_round_trips():
+    summary = SpaceSaving(8)
+    for item in zipf_stream(500, 50, seed=2):
+        summary.add(item)
+    restored = SpaceSaving.from_dict(summary.to_dict())
+    assert restored.counters == summary.counters
+    assert restored.total == summary.total
+    restored.add("new")
+    assert restored.total == summary.total + 1
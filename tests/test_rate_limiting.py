@@ -0,0 +1,164 @@
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask, g
+
+import app.auth.middleware as middleware
+from app.auth.middleware import require_api_auth
+from app.security.rate_limiting import QuotaManager, SlidingWindowCounter, rate_limiter
+from app.storage.sqlite import SQLiteStorage
+
+
+@pytest.fixture
+def counters(tmp_path):
+    store = SQLiteStorage(str(tmp_path / "limits.db"))
+    yield store
+    store.close()
+
+
+def test_window_allows_up_to_the_limit(counters):
+    counter = SlidingWindowCounter(counters)
+    states = [counter.hit("k", 5, 60, now=1000 + second) for second in range(7)]
+    assert [state.allowed for state in states] == [True] * 5 + [False] * 2
+    assert states[4].count == 5
+    assert states[0].reset == 1020 - 1000
+    # Other keys have their own counts
+    assert counter.hit("other", 5, 60, now=1006).allowed
+
+
+def test_previous_window_is_weighted_by_its_overlap(counters):
+    counter = SlidingWindowCounter(counters)
+    for _ in range(10):
+        counter.hit("k", 10, 60, now=60)
+    # A quarter into the next window, three quarters of the last one still count
+    state = counter.hit("k", 10, 60, now=135)
+    assert state.allowed and state.count == pytest.approx(10 * 0.75 + 1)
+    # Allowed while the count before it is under the limit
+    assert [counter.hit("k", 10, 60, now=135).allowed for _ in range(3)] == [True, True, False]
+    # Two windows later nothing is left
+    assert counter.hit("k", 10, 60, now=250).count == 1
+
+
+def test_idle_counters_are_evicted(counters):
+    counter = SlidingWindowCounter(counters, evict_interval=0)
+    counter.hit("idle", 10, 60, now=0)
+    counter.hit("busy", 10, 60, now=100)
+    counter.hit("busy", 10, 60, now=120)
+    rows = counters.connection().execute("SELECT key FROM rate_limits").fetchall()
+    assert rows == [("busy",)]
+
+
+@pytest.fixture
+def api_client(counters, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "counter", SlidingWindowCounter(counters))
+    monkeypatch.setattr(rate_limiter, "blocked_ips", set())
+    monkeypatch.setattr(middleware, "user_manager", SimpleNamespace(validate_api_credentials=lambda key, token: None))
+    violations = []
+    monkeypatch.setattr(middleware, "audit_logger", SimpleNamespace(
+        log_security_violation=lambda kind, details: violations.append(kind)))
+
+    app = Flask(__name__)
+
+    @app.route("/assess", methods=["POST"])
+    @require_api_auth
+    @rate_limiter.rate_limit("api")
+    def assess():
+        return {"status": "success"}
+
+    @app.after_request
+    def add_rate_limit_headers(response):
+        for name, value in g.get("rate_limit_headers", {}).items():
+            response.headers[name] = value
+        return response
+
+    client = app.test_client()
+    client.violations = violations
+    return client
+
+
+def test_invalid_credentials_are_rate_limited_per_ip(api_client):
+    limit = rate_limiter.rate_limits["api"]["calls"]
+    headers = {"X-API-Key": "bogus", "X-API-Token": "bogus"}
+    statuses = [api_client.post("/assess", headers=headers).status_code for _ in range(limit)]
+    assert statuses == [401] * limit
+
+    response = api_client.post("/assess", headers=headers)
+    assert response.status_code == 429
+    assert response.get_json()["status"] == "rate_limited"
+    assert int(response.headers["Retry-After"]) > 0
+    assert response.headers["X-RateLimit-Remaining"] == "0"
+    # Leaving the credentials out altogether does not get round it
+    assert api_client.post("/assess").status_code == 429
+    assert api_client.violations == ["RATE_LIMIT_EXCEEDED"] * 2
+
+    other = api_client.post("/assess", headers=headers, environ_base={"REMOTE_ADDR": "10.0.0.2"})
+    assert other.status_code == 401
+
+
+TIERS = {
+    'free': {'rate': 1.0, 'burst': 3, 'monthly': 10},
+    'premium': {'rate': 10.0, 'burst': 20, 'monthly': 1000},
+}
+# 2026-10-13 12:00 UTC; the month ends at 1793491200
+MID_MONTH = 1791892800
+
+
+def quotas(store, **kwargs):
+    return QuotaManager(store, tiers=TIERS, workers=1, **kwargs)
+
+
+def test_bucket_allows_bursts_and_refills(counters):
+    manager = quotas(counters)
+    states = [manager.check("key", "free", now=MID_MONTH) for _ in range(4)]
+    assert [state.allowed for state in states] == [True, True, True, False]
+    assert states[3].retry_after == pytest.approx(1.0)
+    assert states[2].monthly_remaining == 7
+
+    assert not manager.check("key", "free", now=MID_MONTH + 0.5).allowed
+    assert manager.check("key", "free", now=MID_MONTH + 1.5).allowed
+    # Buckets are per key, and an unknown tier gets the free quota
+    assert manager.check("other", "gold", now=MID_MONTH).limit == 3
+
+
+def test_monthly_ceiling_and_reset(counters):
+    manager = quotas(counters)
+    allowed = sum(manager.check("key", "free", now=MID_MONTH + second).allowed for second in range(20))
+    assert allowed == 10
+    state = manager.check("key", "free", now=MID_MONTH + 30)
+    assert not state.allowed and state.monthly_remaining == 0
+    # The rest of the month
+    assert state.retry_after == pytest.approx(1793491200 - MID_MONTH - 30)
+    assert manager.check("key", "free", now=1793491200 + 1).allowed
+
+
+def test_record_counts_extra_calls_toward_the_month(counters):
+    manager = quotas(counters)
+    manager.check("key", "free", now=MID_MONTH)
+    manager.record("key", 8, now=MID_MONTH)
+    manager.record("key", 0, now=MID_MONTH)
+    assert manager.check("key", "free", now=MID_MONTH + 5).monthly_remaining == 0
+    assert not manager.check("key", "free", now=MID_MONTH + 10).allowed
+
+
+def test_workers_share_monthly_counts_through_flushes(counters):
+    first, second = quotas(counters, flush_interval=3600), quotas(counters, flush_interval=3600)
+    for second_offset in range(6):
+        first.check("key", "premium", now=MID_MONTH + second_offset)
+    first.record("key", 4, now=MID_MONTH)
+    assert second.check("key", "premium", now=MID_MONTH).monthly_remaining == 999
+
+    first.flush(now=MID_MONTH + 10)
+    second.flush(now=MID_MONTH + 10)
+    assert second.check("key", "premium", now=MID_MONTH + 11).monthly_remaining == 1000 - 12
+    # Flushing twice does not count anything twice
+    first.flush(now=MID_MONTH + 20)
+    second.flush(now=MID_MONTH + 20)
+    row = counters.connection().execute("SELECT calls FROM quota_usage WHERE api_key = 'key'").fetchone()
+    assert row == (12,)
+
+
+def test_rate_is_split_between_workers(counters):
+    manager = QuotaManager(counters, tiers=TIERS, workers=2)
+    states = [manager.check("key", "premium", now=MID_MONTH) for _ in range(11)]
+    assert [state.allowed for state in states].count(True) == 10
+    assert states[-1].retry_after == pytest.approx(1 / 5)
@@ -0,0 +1,150 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+import app.auth.middleware as middleware
+import app.routes.api as api
+from app.security.rate_limiting import QuotaManager, rate_limiter
+from app.storage.sqlite import SQLiteStorage
+from app.utils.result_cache import AssessmentCache
+from app.utils.rules_registry import RuleSet
+
+
+def test_concurrent_identical_requests_compute_once():
+    cache = AssessmentCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return {"score": 1}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("key", compute)))
+               for _ in range(8)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    while cache.stats()["coalesced"] < 7:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(cached for _, cached in results) == [False] + [True] * 7
+    assert all(value == {"score": 1} for value, _ in results)
+    assert cache.stats()["misses"] == 1
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    cache = AssessmentCache()
+
+    def fail():
+        raise ValueError("bad")
+
+    with pytest.raises(ValueError):
+        cache.get_or_compute("key", fail)
+    assert cache.get_or_compute("key", lambda: 2) == (2, False)
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    import app.utils.result_cache as result_cache
+    cache = AssessmentCache(ttl=300)
+    now = time.time()
+    monkeypatch.setattr(result_cache.time, "time", lambda: now)
+    cache.get_or_compute("key", lambda: 1)
+    assert cache.get_or_compute("key", lambda: 2) == (1, True)
+    monkeypatch.setattr(result_cache.time, "time", lambda: now + 301)
+    assert cache.get_or_compute("key", lambda: 2) == (2, False)
+    assert cache.stats()["entries"] == 1
+
+
+def test_least_recently_used_entries_are_evicted_by_count_and_size():
+    cache = AssessmentCache(max_entries=2)
+    for key in ("a", "b"):
+        cache.get_or_compute(key, lambda: key)
+    cache.get_or_compute("a", lambda: None)  # "b" is now the oldest
+    cache.get_or_compute("c", lambda: "c")
+    assert cache.get_or_compute("a", lambda: "new") == ("a", True)
+    assert cache.get_or_compute("b", lambda: "new") == ("new", False)
+
+    cache = AssessmentCache(max_bytes=100)
+    for key in range(10):
+        cache.get_or_compute(key, lambda: "x" * 30)
+    stats = cache.stats()
+    assert stats["bytes"] <= 100 and stats["entries"] == 3
+    assert cache.get_or_compute("big", lambda: "x" * 200) == ("x" * 200, False)
+    assert cache.stats()["entries"] == 3
+
+
+def test_keys_distinguish_values_rules_and_users():
+    key = AssessmentCache.make_key({"a": 1, "b": 2}, "v1", "u1")
+    assert key == AssessmentCache.make_key({"b": 2, "a": 1}, "v1", "u1")
+    assert key != AssessmentCache.make_key({"a": "1", "b": 2}, "v1", "u1")
+    assert key != AssessmentCache.make_key({"a": 1, "b": 2}, "v2", "u1")
+    assert key != AssessmentCache.make_key({"a": 1, "b": 2}, "v1", "u2")
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.records = []
+
+    def write(self, name, record):
+        self.records.append((name, record))
+
+    def write_many(self, name, records):
+        self.records.extend((name, record) for record in records)
+
+
+@pytest.fixture
+def assess_client(rules, tmp_path, monkeypatch):
+    user = SimpleNamespace(id="u1", api_key="key1", subscription_tier="premium")
+    monkeypatch.setattr(middleware, "user_manager",
+                        SimpleNamespace(validate_api_credentials=lambda key, token: user))
+    monkeypatch.setattr(rate_limiter, "quotas", QuotaManager(SQLiteStorage(str(tmp_path / "limits.db"))))
+    monkeypatch.setattr(api, "assessment_cache", AssessmentCache())
+    monkeypatch.setattr(api, "log_writer", RecordingWriter())
+    monkeypatch.setattr(api, "audit_logger", SimpleNamespace(
+        log_request=lambda *args: None, log_request_error=lambda *args: None, log_error=lambda *args: None))
+    ruleset = RuleSet(rules, 1, "0" * 64)
+    monkeypatch.setattr(api, "rules_registry", SimpleNamespace(current=lambda: ruleset))
+    assessed = []
+
+    def assess_application(data, user_id, ruleset):
+        assessed.append(data)
+        return {"score": {"total_score": 50}, "offers": [], "risk_tier": "B", "rules_version": ruleset.label}
+
+    monkeypatch.setattr(api, "assess_application", assess_application)
+
+    app = Flask(__name__)
+    app.register_blueprint(api.api_bp, url_prefix="/api")
+    client = app.test_client()
+    client.assessed = assessed
+    return client
+
+
+def test_replays_are_not_billed_or_logged_again(assess_client):
+    headers = {"X-API-Key": "key1", "X-API-Token": "token", "X-User-ID": "u1"}
+    first = assess_client.post("/api/assess", json={"owner1_credit_score": 700}, headers=headers)
+    replay = assess_client.post("/api/assess", json={"owner1_credit_score": 700}, headers=headers)
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert replay.headers["X-Cache"] == "HIT"
+    assert replay.get_json()["billing"] == first.get_json()["billing"]
+    assert len(assess_client.assessed) == 1
+    # One underwriting log entry and one billing record, for the first call only
+    assert sorted(name for name, _ in api.log_writer.records) == sorted([api.UNDERWRITING_LOG, api.USAGE_LOG])
+    # Both calls still count against the key's quota
+    assert rate_limiter.quotas._pending == {("key1", time.strftime("%Y-%m", time.gmtime())): 2}
+
+    other = assess_client.post("/api/assess", json={"owner1_credit_score": 701}, headers=headers)
+    assert other.headers["X-Cache"] == "MISS"
+    assert len(api.log_writer.records) == 4
@@ -0,0 +1,71 @@
+import copy
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from app.utils.rules_registry import RulesRegistry
+
+
+def publish_many(rules_path, rules, count, queue):
+    registry = RulesRegistry(rules_path)
+    for index in range(count):
+        published = copy.deepcopy(rules)
+        published["Personal Credit Information"]["owner1_credit_score"]["weight"] = index
+        queue.put(registry.publish(published).version)
+
+
+@pytest.fixture
+def rules_path(rules, tmp_path):
+    path = tmp_path / "finance.json"
+    path.write_text(json.dumps(rules))
+    return str(path)
+
+
+def test_concurrent_publishes_get_distinct_versions(rules, rules_path):
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    workers = [context.Process(target=publish_many, args=(rules_path, rules, 10, queue)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+
+    versions = sorted(queue.get() for _ in range(40))
+    assert versions == list(range(1, 41))
+    current = RulesRegistry(rules_path).current()
+    assert current.version == 40
+    with open(rules_path, "rb") as f:
+        assert current.rules == json.loads(f.read())
+    assert not [name for name in os.listdir(os.path.dirname(rules_path)) if name.startswith(".tmp-")]
+
+
+def test_current_picks_up_another_workers_publish(rules, rules_path):
+    reader = RulesRegistry(rules_path, check_interval=0)
+    first = reader.current()
+    assert first.version == 0  # Never published: identified by its hash only
+
+    published = RulesRegistry(rules_path).publish(rules)
+    assert published.version == 1
+    current = reader.current()
+    assert (current.version, current.hash) == (1, published.hash)
+    assert reader.current() is current
+
+
+def test_invalid_rules_are_not_published(rules, rules_path):
+    registry = RulesRegistry(rules_path)
+    registry.publish(rules)
+    with pytest.raises(ValueError):
+        registry.publish({"Section": {"owner1_credit_score": {"weight": 5, "curve": "no_such_curve"}}})
+    assert registry.current().version == 1
+    assert RulesRegistry(rules_path).current().version == 1
+
+
+def test_unreadable_rules_keep_the_last_version(rules, rules_path):
+    registry = RulesRegistry(rules_path, check_interval=0)
+    published = registry.publish(rules)
+    with open(rules_path, "w") as f:
+        f.write("{not json")
+    assert registry.current() is published
@@ -0,0 +1,62 @@
+import bisect
+import random
+
+import pytest
+
+from app.utils.score_rollups import TDigest
+
+
+def rank_error(values, estimate, q):
+    """Distance in rank between ``estimate`` and quantile ``q`` of sorted ``values``"""
+    low = bisect.bisect_left(values, estimate)
+    high = bisect.bisect_right(values, estimate)
+    target = q * len(values)
+    if low <= target <= high:
+        return 0.0
+    return min(abs(low - target), abs(high - target)) / len(values)
+
+
+@pytest.mark.parametrize("distribution", ["uniform", "lognormal", "bimodal"])
+def test_tdigest_quantiles_within_one_percent_rank(distribution):
+    rng = random.Random(3)
+    draw = {
+        "uniform": lambda: rng.uniform(0, 100),
+        "lognormal": lambda: rng.lognormvariate(10, 1),
+        "bimodal": lambda: rng.gauss(30, 5) if rng.random() < 0.7 else rng.gauss(80, 3),
+    }[distribution]
+    values = [draw() for _ in range(20_000)]
+
+    # Built in parts and merged, as the rollups do
+    parts = []
+    for start in range(0, len(values), 1_000):
+        digest = TDigest()
+        for value in values[start:start + 1_000]:
+            digest.add(value)
+        parts.append(digest)
+    merged = TDigest.merge_all(parts)
+
+    values.sort()
+    assert merged.count == len(values)
+    for q in (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99):
+        assert rank_error(values, merged.quantile(q), q) <= 0.01
+    assert merged.quantile(0) == pytest.approx(values[0])
+    assert merged.quantile(1) == pytest.approx(values[-1])
+    assert len(merged.centroids) < 2 * merged.compression
+
+
+def test_tdigest_keeps_small_inputs_exact():
+    digest = TDigest()
+    for value in [5, 1, 4, 2, 3]:
+        digest.add(value)
+    assert digest.quantile(0.5) == 3
+    assert TDigest().quantile(0.5) is None
+
+
+def test_tdigest_round_trips():
+    digest = TDigest()
+    for value in range(1_000):
+        digest.add(value)
+    restored = TDigest.from_list(digest.to_list())
+    assert restored.count == digest.count
+    assert restored.quantile(0.5) == digest.quantile(0.5)
+    assert (restored.min, restored.max) == (0, 999)
@@ -0,0 +1,49 @@
+import copy
+
+import pytest
+
+import reference_scoring
+from app.utils.scoring import ScoringPlan, calculate_score, get_scoring_plan, validate_rules
+
+
+def outcome(score, application, rules):
+    try:
+        return score(application, rules)
+    except Exception as e:
+        return type(e).__name__
+
+
+def test_compiled_plan_matches_reference(rules, make_applications):
+    for application in make_applications(3000, seed=1):
+        assert outcome(calculate_score, application, rules) == \
+            outcome(reference_scoring.calculate_score, application, rules), application
+
+
+def test_compiled_plan_matches_reference_under_other_weights(rules, make_applications):
+    reweighted = copy.deepcopy(rules)
+    for index, rule in enumerate(rule for fields in reweighted.values() for rule in fields.values()):
+        rule["weight"] = index % 7
+    for application in make_applications(500, seed=2):
+        assert outcome(calculate_score, application, reweighted) == \
+            outcome(reference_scoring.calculate_score, application, reweighted)
+
+
+def test_plan_is_compiled_once_per_rules_object(rules):
+    plan = get_scoring_plan(rules)
+    assert get_scoring_plan(rules) is plan
+    assert get_scoring_plan(copy.deepcopy(rules)) is not plan
+
+
+def test_plan_orders_steps_as_the_rules(rules):
+    keys = [key for fields in rules.values() for key in fields]
+    assert [step[0] for step in ScoringPlan(rules).steps] == keys
+
+
+@pytest.mark.parametrize("bad", [
+    [],
+    {"Section": []},
+    {"Section": {"owner1_credit_score": {"weight": 5, "curve": "no_such_curve"}}},
+])
+def test_validate_rules_rejects_malformed_rules(bad):
+    with pytest.raises(ValueError):
+        validate_rules(bad)
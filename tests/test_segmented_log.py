@@ -0,0 +1,167 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import segmented_log
+from app.utils.log_query import underwriting_fields
+from app.utils.segmented_log import SegmentedLog
+
+START = datetime(2026, 10, 1, 12, 0, 0)
+
+
+def make_entry(number, moment=START):
+    return {
+        "timestamp": (moment + timedelta(seconds=number)).isoformat(),
+        "n": number,
+        "tier": "low",
+        "score": {"total_score": number % 100},
+        "pad": "x" * (50 + number % 200),
+    }
+
+
+def append(log, entries):
+    log.append(''.join(json.dumps(entry) + '\n' for entry in entries).encode(), len(entries))
+
+
+def make_log(directory, **kwargs):
+    kwargs.setdefault("max_segment_bytes", 20_000)
+    kwargs.setdefault("index_interval", 2048)
+    return SegmentedLog(str(directory), **kwargs)
+
+
+def check_consistent(log):
+    """Every segment starts at the entry number after the previous one's
+    last line, and every index record points at the line it names"""
+    numbers = []
+    for segment in log.segments():
+        with open(segment.path, 'rb') as f:
+            lines = f.read().splitlines(keepends=True)
+        assert segment.base == len(numbers)
+        offsets = [sum(len(line) for line in lines[:i]) for i in range(len(lines))]
+        for entry, offset, _ in segment.read_index():
+            assert offsets[entry - segment.base] == offset
+        if log.fields:
+            records = list(log.fields.record.iter_unpack(open(segment.fields_path, 'rb').read()))
+            assert [record[0] for record in records] == offsets
+        numbers.extend(json.loads(line)["n"] for line in lines)
+    return numbers
+
+
+def test_rotates_by_size(tmp_path):
+    log = make_log(tmp_path / "log")
+    for start in range(0, 600, 20):
+        append(log, [make_entry(n) for n in range(start, start + 20)])
+
+    segments = log.segments()
+    assert len(segments) > 3
+    assert all(os.path.getsize(segment.path) <= 20_000 for segment in segments)
+    assert check_consistent(log) == list(range(600))
+    assert [entry["n"] for entry in log.iter_entries()] == list(range(600))
+    assert [number for number, _ in log.iter_from(437)] == list(range(437, 600))
+    assert [entry["n"] for entry in log.tail(5)] == list(range(595, 600))
+
+
+def test_rotates_daily(tmp_path, monkeypatch):
+    now = [datetime(2026, 10, 1, 23, 0, tzinfo=timezone.utc).timestamp()]
+    monkeypatch.setattr(segmented_log, "time", SimpleNamespace(time=lambda: now[0]))
+    log = make_log(tmp_path / "log", max_segment_bytes=10 ** 9)
+
+    append(log, [make_entry(n) for n in range(10)])
+    append(log, [make_entry(n) for n in range(10, 20)])
+    assert len(log.segments()) == 1
+
+    now[0] += 2 * 3600  # Past midnight UTC
+    append(log, [make_entry(n) for n in range(20, 30)])
+    assert [segment.base for segment in log.segments()] == [0, 20]
+    assert check_consistent(log) == list(range(30))
+
+
+def test_catches_up_with_other_writers(tmp_path):
+    first = make_log(tmp_path / "log", fields=underwriting_fields)
+    second = make_log(tmp_path / "log", fields=underwriting_fields)
+    number = 0
+    for round_ in range(40):
+        writer = first if round_ % 3 else second
+        append(writer, [make_entry(n) for n in range(number, number + 7)])
+        number += 7
+
+    assert len(first.segments()) > 1
+    assert check_consistent(first) == list(range(number))
+
+
+def test_repairs_field_records_lost_in_a_crash(tmp_path):
+    log = make_log(tmp_path / "log", fields=underwriting_fields, max_segment_bytes=10 ** 9)
+    append(log, [make_entry(n) for n in range(50)])
+    log.close()
+
+    # The log line was written but its field records were not, and the
+    # last one was cut short
+    segment = log.segments()[-1]
+    record_size = underwriting_fields.record.size
+    with open(segment.fields_path, 'r+b') as f:
+        f.truncate(record_size * 40 + 5)
+
+    restarted = make_log(tmp_path / "log", fields=underwriting_fields, max_segment_bytes=10 ** 9)
+    append(restarted, [make_entry(n) for n in range(50, 60)])
+
+    assert check_consistent(restarted) == list(range(60))
+    records = list(underwriting_fields.record.iter_unpack(open(segment.fields_path, 'rb').read()))
+    assert [record[2] for record in records] == [float(n % 100) for n in range(60)]
+
+
+def test_recounts_lines_written_after_the_last_index_record(tmp_path):
+    log = make_log(tmp_path / "log", max_segment_bytes=10 ** 9)
+    append(log, [make_entry(n) for n in range(30)])
+    log.close()
+
+    # A crash lost the index records of the last lines written
+    segment = log.segments()[-1]
+    index = segment.read_index()
+    assert len(index) > 2
+    with open(segment.index_path, 'r+b') as f:
+        f.truncate(segmented_log.INDEX_RECORD.size * (len(index) - 2))
+
+    restarted = make_log(tmp_path / "log", max_segment_bytes=10 ** 9)
+    append(restarted, [make_entry(n) for n in range(30, 40)])
+    assert check_consistent(restarted) == list(range(40))
+    assert [number for number, _ in restarted.iter_from(35)] == list(range(35, 40))
+
+
+def test_ignores_a_partly_written_line(tmp_path):
+    log = make_log(tmp_path / "log", max_segment_bytes=10 ** 9)
+    append(log, [make_entry(n) for n in range(5)])
+    with open(log.segments()[-1].path, 'ab') as f:
+        f.write(b'{"n": 5, "timest')
+
+    assert [entry["n"] for entry in log.iter_entries()] == list(range(5))
+    assert [entry["n"] for entry in log.tail(10)] == list(range(5))
+
+
+def test_adopts_legacy_log(tmp_path):
+    legacy = tmp_path / "underwriting_data.jsonl"
+    legacy.write_text(''.join(json.dumps(make_entry(n)) + '\n' for n in range(25)))
+    log = make_log(tmp_path / "log", legacy_path=str(legacy), fields=underwriting_fields)
+
+    assert [segment.base for segment in log.segments()] == [0]
+    assert not legacy.exists()
+    append(log, [make_entry(n) for n in range(25, 30)])
+    assert check_consistent(log) == list(range(30))
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    (START + timedelta(seconds=100), START + timedelta(seconds=110), list(range(100, 110))),
+    (None, START + timedelta(seconds=3), [0, 1, 2]),
+    (START + timedelta(seconds=297), None, [297, 298, 299]),
+])
+def test_iter_range(tmp_path, monkeypatch, start, end, expected):
+    # Index records carry the write time; write each batch when it is stamped
+    now = [0.0]
+    monkeypatch.setattr(segmented_log, "time", SimpleNamespace(time=lambda: now[0]))
+    log = make_log(tmp_path / "log")
+    for first in range(0, 300, 25):
+        now[0] = (START + timedelta(seconds=first + 24)).replace(tzinfo=timezone.utc).timestamp()
+        append(log, [make_entry(n) for n in range(first, first + 25)])
+    assert [entry["n"] for entry in log.iter_range(start, end)] == expected
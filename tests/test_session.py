@@ -0,0 +1,86 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.security.session import SessionCache
+from app.storage.sqlite import SQLiteStorage
+
+
+def session_data(minutes):
+    """A session expiring ``minutes`` from now"""
+    now = datetime.utcnow()
+    return {"user_id": "u1", "token": "t", "last_activity": now.isoformat(),
+            "expires_at": (now + timedelta(minutes=minutes)).isoformat()}
+
+
+@pytest.fixture
+def store(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "sessions.db"))
+    sessions = storage.collection("sessions", "session_id", indexes=("user_id", "expires_at"))
+    yield sessions
+    storage.close()
+
+
+def worker(store):
+    cache = SessionCache(store, store.storage, flush_interval=5.0, sweep_grace=30.0)
+    # Pretend the background thread runs; tests flush and sweep by hand
+    cache._pid = os.getpid()
+    return cache
+
+
+def test_activity_is_written_once_per_flush(store):
+    cache = worker(store)
+    cache.put("s1", session_data(1))
+    for minutes in (10, 20, 30):
+        cache.touch("s1", session_data(minutes))
+    assert store.get("s1")["expires_at"] < session_data(2)["expires_at"]
+    cache.flush()
+    assert store.get("s1")["expires_at"] > session_data(29)["expires_at"]
+    assert cache._dirty == set()
+
+
+def test_flush_does_not_bring_back_a_destroyed_session(store):
+    first, second = worker(store), worker(store)
+    first.put("s1", session_data(10))
+    second.get("s1")
+    second.touch("s1", session_data(30))
+    first.remove("s1")
+    second.flush()
+    assert store.get("s1") is None
+    assert second.get("s1", refresh=True) is None
+
+
+def test_unflushed_activity_survives_a_refresh(store):
+    cache = worker(store)
+    cache.put("s1", session_data(10))
+    cache.touch("s1", session_data(30))
+    assert cache.get("s1", refresh=True)["expires_at"] > session_data(29)["expires_at"]
+
+
+def test_sweep_keeps_sessions_another_worker_has_not_flushed(store):
+    first, second = worker(store), worker(store)
+    # Expired in storage a moment ago, but just extended by the second worker
+    first.put("s1", session_data(-0.1))
+    second.get("s1")
+    second.touch("s1", session_data(30))
+
+    first.sweep()
+    assert len(first) == 0
+    assert store.get("s1") is not None
+
+    second.flush()
+    assert store.get("s1")["expires_at"] > session_data(29)["expires_at"]
+    second.sweep()
+    assert len(second) == 1
+
+
+def test_sweep_removes_sessions_expired_past_the_grace(store):
+    cache = worker(store)
+    cache.put("old", session_data(-1))
+    cache.put("live", session_data(10))
+    store.put({**session_data(-5), "session_id": "elsewhere"})
+
+    cache.sweep()
+    assert len(cache) == 1
+    assert [doc["session_id"] for doc in store.all()] == ["live"]
@@ -0,0 +1,142 @@
+import json
+import multiprocessing
+import threading
+
+import pytest
+
+from app.storage import create_storage
+from app.storage.base import Collection, Storage
+from app.storage.sqlite import SQLiteStorage
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteStorage(str(tmp_path / "store.db"))
+    yield store
+    store.close()
+
+
+def test_backends_must_implement_every_abstract_method():
+    class Partial(Collection):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial("docs", "id")
+    with pytest.raises(TypeError):
+        Storage()
+
+
+def test_collection_operations(store):
+    users = store.collection("users", "id", indexes=("email", "expires"))
+    users.put({"id": 1, "email": "a@x", "expires": 10})
+    users.put({"id": 2, "email": "b@x", "expires": 20})
+    assert not users.insert({"id": 1, "email": "c@x", "expires": 0})
+    assert users.insert({"id": 3, "email": "a@x", "expires": 30})
+
+    assert users.get(1) == {"id": 1, "email": "a@x", "expires": 10}
+    assert users.get("1") == users.get(1)
+    assert [doc["id"] for doc in users.find("email", "a@x")] == [1, 3]
+    assert users.find_one("email", "b@x")["id"] == 2
+    assert users.find_one("email", "none") is None
+    assert users.count() == 3
+
+    users.put({"id": 1, "email": "z@x", "expires": 10})
+    assert users.find("email", "a@x") == [{"id": 3, "email": "a@x", "expires": 30}]
+    assert [doc["id"] for doc in users.all()] == [1, 2, 3]
+
+    assert users.delete_below("expires", 25) == 2
+    assert users.delete_where("email", "a@x") == 1
+    assert not users.delete(3)
+    assert users.count() == 0
+
+
+def test_update_applies_a_change_atomically(store):
+    counters = store.collection("counters", "id")
+    counters.put({"id": "c", "n": 0})
+
+    def increment(doc):
+        doc["n"] += 1
+
+    threads = [threading.Thread(target=lambda: [counters.update("c", increment) for _ in range(50)])
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counters.get("c")["n"] == 200
+    assert counters.update("c", lambda doc: False)["n"] == 200
+    assert counters.update("missing", increment) is None
+
+
+def test_transactions_roll_back_on_error(store):
+    docs = store.collection("docs", "id")
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            docs.put({"id": 1})
+            with store.transaction():
+                docs.put({"id": 2})
+            raise RuntimeError
+    assert docs.count() == 0
+
+
+def add_docs(path, start):
+    store = SQLiteStorage(path)
+    docs = store.collection("docs", "id")
+    for number in range(start, start + 100):
+        docs.put({"id": number})
+
+
+def test_processes_share_a_collection(tmp_path):
+    path = str(tmp_path / "shared.db")
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=add_docs, args=(path, start)) for start in (0, 100, 200)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert SQLiteStorage(path).collection("docs", "id").count() == 300
+
+
+def test_legacy_json_is_imported_once(store, tmp_path):
+    legacy = tmp_path / "users.json"
+    legacy.write_text(json.dumps({"users": {"1": {"id": 1}, "2": {"id": 2}}}))
+
+    def records(data):
+        return data["users"].values()
+
+    users = store.collection("users", "id", legacy_path=str(legacy), legacy_records=records)
+    assert users.count() == 2
+    assert legacy.exists()
+
+    users.delete(1)
+    again = SQLiteStorage(store.path).collection("users", "id", legacy_path=str(legacy), legacy_records=records)
+    assert again.count() == 1
+
+
+def test_unreadable_legacy_json_imports_nothing(store, tmp_path):
+    legacy = tmp_path / "users.json"
+    legacy.write_text("{not json")
+    assert store.collection("users", "id", legacy_path=str(legacy)).count() == 0
+
+
+def test_changes_report_writes_to_tracked_collections(store):
+    tracked = store.collection("tracked", "id", track_changes=True)
+    untracked = store.collection("untracked", "id")
+    start = store.last_change()
+    tracked.put({"id": 1})
+    untracked.put({"id": 1})
+    tracked.delete(1)
+    last, changed = store.changes(start)
+    assert last == store.last_change()
+    assert changed == [("tracked", "1"), ("tracked", "1")]
+    assert store.changes(last) == (last, [])
+
+
+def test_storage_urls(tmp_path):
+    assert isinstance(create_storage(f"sqlite:///{tmp_path / 'a.db'}"), SQLiteStorage)
+    for url in ("sqlite:/a.db", "mongo:///db"):
+        with pytest.raises(ValueError):
+            create_storage(url)
+    with pytest.raises(ValueError):
+        SQLiteStorage(str(tmp_path / "b.db")).collection("bad name", "id")
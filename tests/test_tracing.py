@@ -0,0 +1,98 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import app.utils.log_writer as log_writer_module
+from app.utils import tracing
+from app.utils.tracing import NO_SPAN, clear_trace, finish_trace, fold, span, start_trace
+
+
+@pytest.fixture(autouse=True)
+def no_trace_left():
+    yield
+    clear_trace()
+
+
+def response():
+    return SimpleNamespace(headers={}, status_code=200)
+
+
+def server_timing(header):
+    return {name: float(duration[len("dur="):])
+            for name, duration in (metric.split(";") for metric in header.split(", "))}
+
+
+def test_spans_outside_a_request_cost_nothing():
+    assert span("score") is NO_SPAN
+    with span("score"):
+        pass
+    assert finish_trace(response(), "GET", "/").headers == {}
+
+
+def test_server_timing_totals_each_stage(monkeypatch):
+    monkeypatch.setattr(tracing, "SERVER_TIMING", True)
+    start_trace()
+    with span("auth"):
+        time.sleep(0.002)
+    for _ in range(3):
+        with span("score"):
+            with span("plan"):
+                time.sleep(0.001)
+    result = finish_trace(response(), "POST", "/api/assess")
+
+    timings = server_timing(result.headers["Server-Timing"])
+    assert list(timings) == ["auth", "plan", "score", "total"]
+    assert timings["auth"] >= 2 and timings["plan"] >= 3
+    assert timings["score"] >= timings["plan"]
+    assert timings["total"] >= timings["auth"] + timings["score"]
+    assert span("score") is NO_SPAN
+
+
+def test_sampled_traces_are_logged_with_their_tree(monkeypatch):
+    monkeypatch.setattr(tracing, "SERVER_TIMING", False)
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "MAX_SPANS", 3)
+    written = []
+    monkeypatch.setattr(log_writer_module.log_writer, "write", lambda name, entry: written.append((name, entry)))
+
+    start_trace()
+    with span("parse"):
+        pass
+    with span("score"):
+        for _ in range(5):
+            with span("field"):
+                pass
+    result = finish_trace(response(), "POST", "/api/assess")
+
+    assert "Server-Timing" not in result.headers
+    [(name, entry)] = written
+    assert name == log_writer_module.TRACE_LOG
+    assert (entry["method"], entry["endpoint"], entry["status"]) == ("POST", "/api/assess", 200)
+    # Spans past MAX_SPANS are left out
+    assert [(item["name"], item["parent"]) for item in entry["spans"]] == [
+        ("parse", -1), ("score", -1), ("field", 1)]
+    assert all(item["duration_ms"] >= 0 for item in entry["spans"])
+
+
+def test_nothing_is_traced_when_both_outputs_are_off(monkeypatch):
+    monkeypatch.setattr(tracing, "SERVER_TIMING", False)
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0)
+    start_trace()
+    assert span("score") is NO_SPAN
+
+
+def test_fold_gives_self_time_per_stack():
+    trace = {"method": "POST", "endpoint": "/api/assess", "duration_ms": 10.0, "spans": [
+        {"name": "auth", "parent": -1, "duration_ms": 2.0},
+        {"name": "score", "parent": -1, "duration_ms": 5.0},
+        {"name": "plan", "parent": 1, "duration_ms": 3.0},
+    ]}
+    lines = [json.dumps(trace), json.dumps(trace), "not json", json.dumps({"method": "GET"})]
+    assert fold(lines) == {
+        "POST /api/assess": 6000,
+        "POST /api/assess;auth": 4000,
+        "POST /api/assess;score": 4000,
+        "POST /api/assess;score;plan": 6000,
+    }
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from app.utils.usage_ledger import UsageLedger, parse_period
+
+
+def record(user_id, timestamp, endpoint="/assess", cost=1.25, calls=1):
+    return {"user_id": user_id, "endpoint": endpoint, "calls": calls, "cost": cost, "timestamp": timestamp}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "usage.jsonl"), str(tmp_path / "rollup.json")
+
+
+def append(path, *records, partial=b""):
+    with open(path, "ab") as f:
+        f.write("".join(json.dumps(r) + "\n" for r in records).encode() + partial)
+
+
+def test_rollups_per_user_and_day(paths):
+    path, checkpoint = paths
+    append(path,
+           record("u1", "2026-10-01T09:00:00"),
+           record("u1", "2026-10-01T10:00:00", "/assess/batch", 5.0, calls=4),
+           record("u1", "2026-10-02T09:00:00"),
+           record("u2", "2026-10-01T09:00:00"))
+    ledger = UsageLedger(path, checkpoint, legacy_path=None)
+
+    usage = ledger.usage("u1")
+    assert (usage["calls"], usage["cost"]) == (6, 7.5)
+    assert usage["endpoints"] == {"/assess": 2, "/assess/batch": 4}
+    assert usage["days"] == [{"date": "2026-10-01", "calls": 5, "cost": 6.25},
+                             {"date": "2026-10-02", "calls": 1, "cost": 1.25}]
+    assert ledger.usage("u1", start="2026-10-02")["calls"] == 1
+    assert ledger.usage("u1", end="2026-10-01")["calls"] == 5
+    assert ledger.usage("nobody")["calls"] == 0
+
+
+def test_appends_and_partial_lines_are_folded_in_once(paths):
+    path, checkpoint = paths
+    append(path, record("u1", "2026-10-01T09:00:00"), partial=b'{"user_id": "u1", "ti')
+    ledger = UsageLedger(path, checkpoint, legacy_path=None)
+    assert ledger.usage("u1")["calls"] == 1
+
+    with open(path, "ab") as f:
+        f.write(b'mestamp": "2026-10-01T09:30:00", "calls": 2}\nnot json\n')
+    append(path, record("u1", "2026-10-01T10:00:00"))
+    assert ledger.usage("u1")["calls"] == 4
+    assert ledger.usage("u1")["calls"] == 4
+
+
+def test_checkpoints_resume_and_replaced_ledgers_rebuild(paths):
+    path, checkpoint = paths
+    append(path, *[record("u1", "2026-10-01T09:00:00") for _ in range(5)])
+    ledger = UsageLedger(path, checkpoint, checkpoint_every=3, legacy_path=None)
+    ledger.usage("u1")
+    with open(checkpoint) as f:
+        assert json.load(f)["offset"] > 0
+
+    # A new process resumes from the checkpoint without rereading
+    append(path, record("u1", "2026-10-01T10:00:00"))
+    assert UsageLedger(path, checkpoint, legacy_path=None).usage("u1")["calls"] == 6
+
+    with open(path, "w") as f:
+        f.write(json.dumps(record("u1", "2026-10-03T09:00:00")) + "\n")
+    assert UsageLedger(path, checkpoint, legacy_path=None).usage("u1")["days"] == [
+        {"date": "2026-10-03", "calls": 1, "cost": 1.25}]
+
+
+def test_legacy_records_are_counted(paths, tmp_path):
+    path, checkpoint = paths
+    legacy = tmp_path / "usage.json"
+    legacy.write_text(json.dumps([{"user_id": "u1", "endpoint": "/assess", "cost": 1.25,
+                                   "timestamp": "2025-01-01T00:00:00"}]))
+    ledger = UsageLedger(path, checkpoint, legacy_path=str(legacy))
+    assert ledger.usage("u1")["calls"] == 1
+
+
+def test_parse_period():
+    assert parse_period({"start": "2026-10-01"}) == ("2026-10-01", None)
+    assert parse_period({}) == (None, None)
+    with pytest.raises(ValueError):
+        parse_period({"end": "October"})
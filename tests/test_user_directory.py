@@ -0,0 +1,93 @@
+import pytest
+
+import app.models.user as user_module
+from app.models.user import UserDirectory, UserManager
+from app.storage.sqlite import SQLiteStorage
+
+
+def open_store(path):
+    """One worker's view of the shared user database"""
+    store = SQLiteStorage(path)
+    users = store.collection("users", "user_id", indexes=("username",), track_changes=True)
+    api_keys = store.collection("api_keys", "api_key", indexes=("user_id",), track_changes=True)
+    return store, users, api_keys
+
+
+@pytest.fixture
+def workers(tmp_path):
+    path = str(tmp_path / "users.db")
+    here, there = open_store(path), open_store(path)
+    yield here, there
+    here[0].close()
+    there[0].close()
+
+
+def record(user_id, username, **fields):
+    return {"user_id": user_id, "username": username, **fields}
+
+
+def test_lookups_are_cached_until_another_worker_writes(workers):
+    (store, users, api_keys), (_, other_users, other_keys) = workers
+    directory = UserDirectory(users, api_keys, store, sync_interval=3600)
+    users.put(record("u1", "alice", tier="free"))
+    api_keys.put({"api_key": "k1", "user_id": "u1"})
+
+    assert directory.by_api_key("k1")["tier"] == "free"
+    assert directory.by_username("alice")["user_id"] == "u1"
+    other_users.put(record("u1", "alice", tier="premium"))
+    # Not checked for changes yet
+    assert directory.get("u1")["tier"] == "free"
+
+    directory.sync(force=True)
+    assert directory.by_api_key("k1")["tier"] == "premium"
+    assert directory.stats() == {"users": 1, "api_keys": 1, "unknown_api_keys": 0}
+
+    other_keys.delete("k1")
+    other_users.put(record("u1", "bob"))
+    directory.sync(force=True)
+    assert directory.by_api_key("k1") is None
+    assert directory.by_username("alice") is None
+    assert directory.by_username("bob")["user_id"] == "u1"
+
+
+def test_unknown_keys_are_remembered_and_bounded(workers):
+    (store, users, api_keys), (_, _, other_keys) = workers
+    directory = UserDirectory(users, api_keys, store, sync_interval=3600, unknown_keys_size=2)
+    users.put(record("u1", "alice"))
+    for key in ("bad1", "bad2", "bad3"):
+        assert directory.by_api_key(key) is None
+    assert list(directory._unknown_keys) == ["bad2", "bad3"]
+
+    # Created elsewhere after being looked up here
+    other_keys.put({"api_key": "bad3", "user_id": "u1"})
+    assert directory.by_api_key("bad3") is None
+    directory.sync(force=True)
+    assert directory.by_api_key("bad3")["user_id"] == "u1"
+
+
+def test_pruned_change_feed_drops_everything(workers, monkeypatch):
+    (store, users, api_keys), _ = workers
+    directory = UserDirectory(users, api_keys, store, sync_interval=3600)
+    users.put(record("u1", "alice"))
+    directory.get("u1")
+    monkeypatch.setattr(store, "changes", lambda since: (since + 1, None))
+    directory.sync(force=True)
+    assert directory.stats()["users"] == 0
+
+
+def test_api_credentials(tmp_path, monkeypatch):
+    monkeypatch.setattr(user_module, "storage", SQLiteStorage(str(tmp_path / "users.db")))
+    manager = UserManager()
+    manager.create_user("u1", "alice", "alice@example.com")
+    assert manager.generate_api_credentials("u1") is None  # Free tier
+
+    manager.update_subscription("u1", "premium")
+    credentials = manager.generate_api_credentials("u1")
+    user = manager.validate_api_credentials(credentials["api_key"], credentials["api_token"])
+    assert user.user_id == "u1" and user.subscription_tier == "premium"
+    assert manager.validate_api_credentials(credentials["api_key"], "wrong") is None
+
+    manager.toggle_api_access("u1", False)
+    assert manager.validate_api_credentials(credentials["api_key"], credentials["api_token"]) is None
+    assert manager.delete_user("u1")
+    assert manager.get_user("u1") is None
@@ -1,58 +1,31 @@
-import json
-import os
-from collections import defaultdict
-from pathlib import Path
-
-LOG_PATH = os.path.join(os.path.dirname(__file__), 'logs', 'underwriting_data.jsonl')
-
-# Ensure logs directory exists
-os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+from app.utils.log_analytics import log_analytics
+from app.utils.log_writer import underwriting_log
 
 
 def analyze_logs():
-    scores = []
-    field_frequency = defaultdict(int)
-    field_totals = defaultdict(float)
-    field_counts = defaultdict(int)
-
-    try:
-        with open(LOG_PATH, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line:  # Skip empty lines
-                    try:
-                        entry = json.loads(line)
-                        input_data = entry.get("input", {})
-                        score = entry.get("score", {}).get("total_score", 0)
-                        scores.append(score)
-
-                        for key, val in input_data.items():
-                            if isinstance(val, (int, float)):
-                                field_totals[key] += float(val)
-                                field_counts[key] += 1
-                            elif isinstance(val, str) and val.strip():
-                                field_frequency[key] += 1
-                    except json.JSONDecodeError:
-                        continue  # Skip malformed lines
-    except FileNotFoundError:
+    if not underwriting_log.segments():
         return "No log data found."
 
+    # Folds in only the entries logged since the last report
+    stats = log_analytics.snapshot()
+
     output = []
     output.append("📊 UNDERWRITING ASSISTANT REPORT")
     output.append("-" * 40)
-    output.append(f"Total Entries: {len(scores)}")
+    output.append(f"Total Entries: {stats['entries']}")
     output.append(
-        f"Average Score: {round(sum(scores)/len(scores), 2) if scores else 0}")
+        f"Average Score: {round(stats['average_score'], 2)}")
+    if stats['entries']:
+        output.append(f"Score Std Dev: {round(stats['score_std_dev'], 2)}")
+        output.append(f"Score Range: {round(stats['score_min'], 2)} - {round(stats['score_max'], 2)}")
     output.append("\nMost Active Fields (String):")
-    for field, count in sorted(field_frequency.items(),
+    for field, count in sorted(stats['field_frequency'].items(),
                                key=lambda x: x[1],
                                reverse=True)[:10]:
         output.append(f"- {field}: {count} times")
 
     output.append("\nAverage Values (Numeric):")
-    for field, total in field_totals.items():
-        count = field_counts[field]
-        average = total / count if count else 0
+    for field, average in stats['field_averages'].items():
         output.append(f"- {field}: {round(average, 2)}")
 
     return "\n".join(output)
\ No newline at end of file